@@ -1,20 +1,27 @@
-from langchain_ollama import ChatOllama
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import ToolNode, tools_condition
 
 from app.agent.nodes.chat import chat
+from app.agent.nodes.context import compact_context
 from app.agent.nodes.memory_read import memory_read
 from app.agent.nodes.memory_write import memory_write
 from app.agent.nodes.route import route
+from app.agent.nodes.turn_planner import turn_planner
 from app.agent.state import State
 from app.llm.client import get_chat_model
+from app.llm.scheduler import PRIORITY_BACKGROUND, PRIORITY_CHAT, with_priority
 from app.tools.time_tools import now
 
-from app.core import get_logger
+from app.core import TURN_PLANNER_ENABLED, get_logger
 
 logger = get_logger(__name__)
 
 
+def join(state: State) -> dict:
+    # точка сборки параллельных веток: всё уже смержено редьюсерами State
+    return {}
+
+
 def build_graph(checkpointer=None):
     tools = [now]
 
@@ -26,20 +33,42 @@ def build_graph(checkpointer=None):
 
     llm_warm = get_chat_model(profile="warm")
 
+    # ответ пользователю — вперёд планировщика и записи памяти в очереди к Ollama
+    llm_chat = with_priority(llm_warm, PRIORITY_CHAT)
+    llm_chat_tools = with_priority(llm_cold_tools, PRIORITY_CHAT)
+    llm_writer = with_priority(llm_cold, PRIORITY_BACKGROUND)
+
     tool_node = ToolNode(tools)
 
     builder = StateGraph(State)
 
-    builder.add_node("route", route(llm_faster_cold_tools))
-    builder.add_node("memory_read", memory_read(llm_cold))
-    builder.add_node("chat", chat(llm_warm))
-    builder.add_node("chat_tools", chat(llm_cold_tools))
+    if TURN_PLANNER_ENABLED:
+        builder.add_node("turn_planner", turn_planner(llm_cold, tools))
+    else:
+        builder.add_node("route", route(llm_faster_cold_tools))
+        builder.add_node("memory_read", memory_read(llm_cold))
+    builder.add_node("join", join)
+    builder.add_node("chat", chat(llm_chat))
+    builder.add_node("chat_tools", chat(llm_chat_tools))
     builder.add_node("tools", tool_node)
-    builder.add_node("memory_write", memory_write(llm_cold))
-
-    builder.add_edge(START, "memory_read")
-    builder.add_edge("memory_read", "route")
-    builder.add_conditional_edges("route", lambda s: s["route_to"], {"chat":"chat", "tools":"chat_tools"})
+    builder.add_node("memory_write", memory_write(llm_writer))
+    # summary нужен до ответа, поэтому приоритет планировщика, а не фоновый
+    builder.add_node("compact_context", compact_context(llm_cold))
+
+    # история сворачивается в summary в начале хода, параллельно с остальным; LLM зовётся
+    # только при превышении бюджета, обычно это чистая проверка без вызовов
+    builder.add_edge(START, "compact_context")
+    if TURN_PLANNER_ENABLED:
+        # route и запрос к памяти — один структурированный LLM-вызов
+        builder.add_edge(START, "turn_planner")
+        builder.add_edge(["turn_planner", "compact_context"], "join")
+    else:
+        # memory_read и route независимы (роутер смотрит только на сообщение) —
+        # запускаем параллельно и ждём оба перед ответом
+        builder.add_edge(START, "memory_read")
+        builder.add_edge(START, "route")
+        builder.add_edge(["memory_read", "route", "compact_context"], "join")
+    builder.add_conditional_edges("join", lambda s: s["route_to"], {"chat":"chat", "tools":"chat_tools"})
     builder.add_edge("chat", "memory_write")
     builder.add_conditional_edges("chat_tools", tools_condition, {"tools": "tools", "__end__": "memory_write"},)
     builder.add_edge("tools", "chat")
@@ -2,6 +2,7 @@ from langchain_core.messages import HumanMessage
 
 from app.agent.state import State
 from app.llm.prompt import build_messages
+from app.services.blob_store import resolve_blob_refs
 
 from app.core import get_logger
 
@@ -14,8 +15,11 @@ def chat(llm_tools):
             state.get("messages", []),
             core_facts=state.get("core_facts", []),
             extended_facts=state.get("extended_facts", []),
-            episodic_facts=state.get("episodic_facts", [])
+            episodic_facts=state.get("episodic_facts", []),
+            summary=state.get("summary"),
         )
+        # картинки хранятся в blob store, в state — только ссылки
+        messages = await resolve_blob_refs(messages)
 
         ai_msg = await llm_tools.ainvoke(messages)
 
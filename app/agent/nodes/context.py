@@ -0,0 +1,192 @@
+from typing import Any
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, RemoveMessage, ToolMessage
+
+from app.agent.state import State
+from app.llm.prompt import build_summary_messages
+
+from app.core import (
+    CONTEXT_KEEP_IMAGE_TURNS,
+    CONTEXT_MAX_TOKENS,
+    CONTEXT_MAX_TURNS,
+    CONTEXT_MIN_TURNS,
+    CONTEXT_TARGET_RATIO,
+    get_logger,
+)
+
+logger = get_logger(__name__)
+
+# грубая оценка без токенайзера: ~3 символа на токен (русский текст), картинка — фиксированно
+_CHARS_PER_TOKEN = 3
+_IMAGE_TOKENS = 768
+# сколько текста старых ходов отдаём в одно обновление summary; остальное — на следующих ходах
+_SUMMARY_INPUT_CHARS = 12000
+_MESSAGE_CHARS = 2000
+
+IMAGE_PLACEHOLDER = "[изображение]"
+
+
+def _is_image_part(part: Any) -> bool:
+    return isinstance(part, dict) and part.get("type") in ("image_url", "image")
+
+
+def _text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    parts = []
+    for part in content or []:
+        if _is_image_part(part):
+            parts.append(IMAGE_PLACEHOLDER)
+        elif isinstance(part, dict):
+            parts.append(str(part.get("text", "")))
+        else:
+            parts.append(str(part))
+    return " ".join(p for p in parts if p)
+
+
+def estimate_tokens(message: BaseMessage) -> int:
+    content = message.content
+    images = sum(1 for part in content if _is_image_part(part)) if isinstance(content, list) else 0
+    chars = len(_text(message)) - images * len(IMAGE_PLACEHOLDER)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        chars += len(str(message.tool_calls))
+    return chars // _CHARS_PER_TOKEN + images * _IMAGE_TOKENS + 4
+
+
+def split_turns(messages: list[BaseMessage]) -> list[list[BaseMessage]]:
+    """Ход = HumanMessage + всё до следующей HumanMessage (ответы, tool calls, результаты tools)."""
+    turns: list[list[BaseMessage]] = []
+    for m in messages:
+        if isinstance(m, HumanMessage) or not turns:
+            turns.append([m])
+        else:
+            turns[-1].append(m)
+    return turns
+
+
+def _turn_tokens(turn: list[BaseMessage]) -> int:
+    return sum(estimate_tokens(m) for m in turn)
+
+
+def over_budget(turns: list[list[BaseMessage]], *, max_tokens: int, min_turns: int, max_turns: int) -> bool:
+    """Порог срабатывания: ходов больше max_turns или сверх min_turns история не влезает в max_tokens."""
+    if len(turns) <= min_turns:
+        return False
+    return len(turns) > max_turns or sum(_turn_tokens(t) for t in turns) > max_tokens
+
+
+def _split_point(turns: list[list[BaseMessage]], *, max_tokens: int, min_turns: int, max_turns: int) -> int:
+    """Индекс первого хода, который остаётся дословно: с конца, пока влезает в бюджет."""
+    keep, used = 0, 0
+    for turn in reversed(turns):
+        cost = _turn_tokens(turn)
+        if keep >= min_turns and (keep >= max_turns or used + cost > max_tokens):
+            break
+        keep += 1
+        used += cost
+    return len(turns) - keep
+
+
+def _strip_images(message: BaseMessage) -> BaseMessage:
+    content = [
+        {"type": "text", "text": IMAGE_PLACEHOLDER} if _is_image_part(part) else part
+        for part in message.content
+    ]
+    # тот же id — add_messages заменит сообщение на месте
+    return message.model_copy(update={"content": content})
+
+
+def _render(turns: list[list[BaseMessage]]) -> str:
+    lines = []
+    for turn in turns:
+        for m in turn:
+            text = _text(m).strip()[:_MESSAGE_CHARS]
+            if isinstance(m, HumanMessage):
+                lines.append(f"Пользователь: {text}")
+            elif isinstance(m, ToolMessage):
+                lines.append(f"Инструмент {m.name or ''}: {text}")
+            elif isinstance(m, AIMessage) and m.tool_calls and not text:
+                lines.append(f"Ассистент вызвал инструменты: {', '.join(c['name'] for c in m.tool_calls)}")
+            elif text:
+                lines.append(f"Ассистент: {text}")
+    return "\n".join(lines)
+
+
+def compact_context(llm):
+    """
+    Держит историю темы в рамках CONTEXT_MAX_TOKENS. Стоит в начале хода, параллельно с
+    route / memory_read, и зовёт LLM только когда история вышла за бюджет: тогда сжимает её
+    до CONTEXT_TARGET_RATIO от бюджета (и от CONTEXT_MAX_TURNS), а не до самой границы —
+    иначе каждый следующий ход снова переполнял бы её и стоил ещё одного вызова summary.
+
+    Последние ходы остаются дословно, более старые сворачиваются в state["summary"]
+    (инкрементально — старое summary + вырезаемые ходы) и удаляются из messages через
+    RemoveMessage. Картинки прошлых ходов заменяются пометкой. Резать можно только по
+    границе HumanMessage.
+    """
+    async def node(state: State) -> dict:
+        if CONTEXT_MAX_TOKENS <= 0:
+            return {}
+
+        # последний ход — текущее сообщение пользователя, ответа на него ещё нет:
+        # он остаётся всегда, бюджет считаем по завершённым ходам
+        turns = split_turns(state.get("messages", []))[:-1]
+        updates: list[BaseMessage] = []
+
+        # картинки нужны модели только в последних ходах, дальше это лишние сотни токенов на ход
+        image_turns = max(CONTEXT_KEEP_IMAGE_TURNS, 0)
+        for turn in turns[: len(turns) - image_turns]:
+            for m in turn:
+                if isinstance(m.content, list) and any(_is_image_part(p) for p in m.content):
+                    updates.append(_strip_images(m))
+
+        min_turns = max(CONTEXT_MIN_TURNS, 1)
+        max_turns = max(CONTEXT_MAX_TURNS, min_turns)
+        if not over_budget(turns, max_tokens=CONTEXT_MAX_TOKENS, min_turns=min_turns, max_turns=max_turns):
+            return {"messages": updates} if updates else {}
+
+        ratio = min(max(CONTEXT_TARGET_RATIO, 0.0), 1.0)
+        split = _split_point(
+            turns,
+            max_tokens=int(CONTEXT_MAX_TOKENS * ratio),
+            min_turns=min_turns,
+            max_turns=max(int(max_turns * ratio), min_turns),
+        )
+        if split == 0:
+            return {"messages": updates} if updates else {}
+
+        # берём старейшие ходы, пока текст влезает в одно обновление summary
+        old: list[list[BaseMessage]] = []
+        size = 0
+        for turn in turns[:split]:
+            chars = len(_render([turn]))
+            if old and size + chars > _SUMMARY_INPUT_CHARS:
+                break
+            old.append(turn)
+            size += chars
+
+        previous = state.get("summary") or ""
+        try:
+            response = await llm.ainvoke(build_summary_messages(previous, _render(old)))
+            summary = str(getattr(response, "content", "") or "").strip()
+        except Exception as e:
+            # не смогли свернуть — ходы остаются в messages до следующей попытки
+            logger.warning(f"Context summary failed: {e}")
+            return {"messages": updates} if updates else {}
+        if not summary:
+            return {"messages": updates} if updates else {}
+
+        removed = [m for turn in old for m in turn if m.id is not None]
+        removed_ids = {m.id for m in removed}
+        updates = [m for m in updates if m.id not in removed_ids]
+        logger.info(
+            f"Context compacted: turns={len(turns)} summarized={len(old)} removed_messages={len(removed)} "
+            f"summary_chars={len(summary)}"
+        )
+        return {
+            "messages": [RemoveMessage(id=m.id) for m in removed] + updates,
+            "summary": summary,
+        }
+
+    return node
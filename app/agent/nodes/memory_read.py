@@ -1,13 +1,126 @@
+import asyncio
+import time
+
 from app.agent.state import State
 from app.llm.prompt import build_memory_request_messages
 from app.services.utils import _extract_json
-from app.services.service_db import build_memory_catalog, get_core_for_context, get_episodic_for_context, get_extended_for_context, normalize_memory_request
+from app.services.memory_catalog import catalog_version
+from app.services.memory_planner import plan_memory_request
+from app.services.planner_cache import planner_cache
+from app.services.service_db import QueryContext, build_memory_catalog, get_core_for_context, get_episodic_for_context, get_extended_for_context, get_memory_for_context, normalize_memory_request
 
-from app.core import get_logger
+from app.core import MEMORY_PLANNER_MIN_CONFIDENCE, MEMORY_PLANNER_MODE, MEMORY_RETRIEVAL_COMBINED, get_logger
 
 logger = get_logger(__name__)
 
 
+async def _timed(name: str, coro, timings: dict[str, float]):
+    t0 = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[name] = round((time.perf_counter() - t0) * 1000, 1)
+
+
+async def _cache_vector(query: QueryContext):
+    if not query.text.strip():
+        return None
+    try:
+        return (await query.embedding())[0]
+    except Exception as e:
+        logger.warning(f"Planner cache: no query embedding ({e})")
+        return None
+
+
+async def _plan(llm, user_message: str, catalog: dict, query: QueryContext) -> dict | None:
+    """
+    Сначала локальный планировщик (эмбеддинги + правила), LLM — только если он не уверен.
+    Возвращает сырой JSON-запрос (до normalize_memory_request) или None.
+    """
+    raw_json = None
+    local_plan = None
+    if MEMORY_PLANNER_MODE != "llm":
+        try:
+            local_plan = await plan_memory_request(user_message, catalog, query)
+        except Exception as e:
+            logger.warning(f"Local planner failed: {e}")
+
+    if local_plan is not None and (
+        MEMORY_PLANNER_MODE == "local" or local_plan.confidence >= MEMORY_PLANNER_MIN_CONFIDENCE
+    ):
+        logger.info(f"Planner: local conf={local_plan.confidence} reasons={local_plan.reasons}")
+        return local_plan.request
+
+    # Просим модель вернуть JSON "что доставать"
+    planner_messages = build_memory_request_messages(
+        user_message=user_message,
+        catalog=catalog,
+    )
+    try:
+        response = await llm.ainvoke(planner_messages)
+        raw_json = _extract_json(getattr(response, "content", "") or "")
+        # logger.debug(f"Planner response JSON: {raw_json}")
+    except Exception as e:
+        logger.warning(f"Planner failed: {e}")
+        raw_json = None
+
+    # LLM не ответил — лучше неуверенный локальный план, чем никакого
+    if raw_json is None and local_plan is not None:
+        raw_json = local_plan.request
+    logger.info(f"Planner: llm (local conf={local_plan.confidence if local_plan else None})")
+    return raw_json
+
+
+async def retrieve_memory(user_message: str, req: dict, query: QueryContext) -> dict:
+    """Достаёт память по нормализованному запросу (SQL-фильтры -> candidates -> rerank embeddings)."""
+    timings: dict[str, float] = {}
+    t0 = time.perf_counter()
+
+    if MEMORY_RETRIEVAL_COMBINED:
+        # все кандидаты одним запросом — один round trip до БД
+        core_facts, extended_facts, episodic_facts = await _timed("combined", get_memory_for_context(
+            query_text=user_message,
+            req=req,
+            core_limit=50,
+            extended_limit=200,
+            episodic_limit=300,
+            query=query,
+        ), timings)
+    else:
+        # три ветки параллельно, каждая на своём соединении
+        core_facts, extended_facts, episodic_facts = await asyncio.gather(
+            _timed("core", get_core_for_context(
+                core_limit=50,
+            ), timings),
+            _timed("extended", get_extended_for_context(
+                query_text=user_message,
+                req=req,
+                candidate_limit=200,
+                query=query,
+            ), timings),
+            _timed("episodic", get_episodic_for_context(
+                query_text=user_message,
+                req=req,
+                candidate_limit=300,
+                query=query,
+            ), timings),
+        )
+
+    total_ms = round((time.perf_counter() - t0) * 1000, 1)
+
+    logger.info(f"Memory counts: core={len(core_facts)} ext={len(extended_facts)} epi={len(episodic_facts)}")
+    logger.info(f"Memory retrieval: total={total_ms}ms steps={timings}")
+
+    # messages не трогаем
+    return {
+        "core_facts": core_facts,
+        "extended_facts": extended_facts,
+        "episodic_facts": episodic_facts,
+        # если хочешь дебажить — можно раскомментить:
+        # "memory_request": req,
+    }
+
+
 def memory_read(llm):
     async def node(state: State) -> dict:
         # 1) Берём текущее сообщение пользователя (последнее в messages)
@@ -17,55 +130,33 @@ def memory_read(llm):
         except Exception:
             user_message = ""
 
+        # эмбеддинг запроса считаем один раз на ход и параллельно с планировщиком
+        query = QueryContext(user_message)
+        query.prefetch()
+
         # 2) Строим каталог памяти (меню возможностей)
         catalog = await build_memory_catalog()
 
-        # 3) Просим модель вернуть JSON "что доставать"
-        planner_messages = build_memory_request_messages(
-            user_message=user_message,
-            catalog=catalog,
-        )
+        # 3) Решаем "что доставать": повторяющиеся сообщения берём из кэша решений
+        #    (ключ — нормализованное сообщение + версия меток каталога)
+        version = catalog_version()
+        cache_vec = await _cache_vector(query) if planner_cache.needs_vector() else None
+        req = planner_cache.get(user_message, version, cache_vec)
 
-        raw_json = None
-        try:
-            response = await llm.ainvoke(planner_messages)
-            raw_json = _extract_json(getattr(response, "content", "") or "")
-            # logger.debug(f"Planner response JSON: {raw_json}")
-        except Exception as e:
-            logger.warning(f"Planner failed: {e}")
-            raw_json = None
+        if req is not None:
+            logger.info(f"Planner: cache {planner_cache.stats()}")
+        else:
+            raw_json = await _plan(llm, user_message, catalog, query)
 
-        # 4) Нормализуем запрос (режем лимиты, выкидываем неизвестные поля, fallback)
-        req = normalize_memory_request(raw_json, catalog=catalog)
+            # 4) Нормализуем запрос (режем лимиты, выкидываем неизвестные поля, fallback)
+            req = normalize_memory_request(raw_json, catalog=catalog)
+            if raw_json is not None:
+                # сбой планировщика не кэшируем
+                planner_cache.put(user_message, version, req, cache_vec)
 
         # logger.debug(f"Memory request: {req}")
 
-        # 5) Достаём память (SQL-фильтры -> candidates -> rerank embeddings)
-        core_facts = await get_core_for_context(
-            core_limit=50,
-        )
-
-        extended_facts = await get_extended_for_context(
-            query_text=user_message,
-            req=req,
-            candidate_limit=200,
-        )
-
-        episodic_facts = await get_episodic_for_context(
-            query_text=user_message,
-            req=req,
-            candidate_limit=300,
-        )
-
-        logger.info(f"Memory counts: core={len(core_facts)} ext={len(extended_facts)} epi={len(episodic_facts)}")
-
-        # 6) Возвращаем в state. messages не трогаем.
-        return {
-            "core_facts": core_facts,
-            "extended_facts": extended_facts,
-            "episodic_facts": episodic_facts,
-            # если хочешь дебажить — можно раскомментить:
-            # "memory_request": req,
-        }
+        # 5) Достаём память и возвращаем в state
+        return await retrieve_memory(user_message, req, query)
 
-    return node
\ No newline at end of file
+    return node
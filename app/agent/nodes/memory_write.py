@@ -7,9 +7,10 @@ from typing import Any, Optional
 from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
 
 from app.agent.state import State
-from app.core import get_logger
-from app.db.session import session_factory
+from app.core import MEMORY_WRITE_MODE, get_logger
 from app.llm.prompt import build_memory_write_messages
+from app.services.memory_gate import memory_gate
+from app.services.memory_queue import json_safe, memory_write_queue
 from app.services.utils import _extract_json
 from app.services.service_db import add_memory_fact, add_episodic_memory
 
@@ -66,124 +67,192 @@ def _get_last_user_and_ai(messages: list[BaseMessage]) -> tuple[str, str]:
     return user_text, ai_text
 
 
-def memory_write(llm):
-    async def node(state: State) -> dict:
-        messages = state.get("messages", [])
-        user_text, ai_text = _get_last_user_and_ai(messages)
+def _tools_used(messages: list[BaseMessage]) -> list[str]:
+    """Инструменты, вызванные после последней HumanMessage (ход ушёл в tools)."""
+    names: list[str] = []
+    for m in reversed(messages):
+        if m.__class__.__name__ == "HumanMessage":
+            break
+        if m.__class__.__name__ == "ToolMessage":
+            names.append(str(getattr(m, "name", None) or "tool"))
+    return names[::-1]
 
-        if not user_text and not ai_text:
-            return {}
 
-        # 1) Спросить у модели, что сохранять
-        planner_msgs = build_memory_write_messages(
-            user_text=user_text,
-            ai_text=ai_text,
-            core_facts=state.get("core_facts", []),
-            extended_facts=state.get("extended_facts", []),
-            episodic_facts=state.get("episodic_facts", []),
+def memory_write_payload(state: State) -> dict[str, Any]:
+    """
+    Всё, что нужно для записи памяти, одним JSON-объектом — задание для очереди
+    (или сразу для write_memory в inline-режиме).
+    """
+    messages = state.get("messages", [])
+    user_text, ai_text = _get_last_user_and_ai(messages)
+    return json_safe({
+        "user_text": user_text,
+        "ai_text": ai_text,
+        "route_to": state.get("route_to"),
+        "tools_used": _tools_used(messages),
+        "core_facts": state.get("core_facts", []),
+        "extended_facts": state.get("extended_facts", []),
+        "episodic_facts": state.get("episodic_facts", []),
+        "source_chat_id": state.get("source_chat_id"),
+        "source_message_id": state.get("source_message_id"),
+    })
+
+
+async def write_memory(llm, payload: dict[str, Any]) -> tuple[int, int]:
+    """
+    Спрашивает модель, что сохранить, санитизирует и пишет в БД.
+    Ошибка LLM пробрасывается — очередь сделает ретрай. Возвращает (facts, episodic).
+    Повтор безопасен: факты апсертятся по canonical_key, эпизоды — по source ids + номеру эпизода.
+    Тривиальные ходы отсекает memory_gate ещё до LLM-вызова.
+    """
+    if not payload.get("user_text") and not payload.get("ai_text"):
+        return 0, 0
+
+    decision = await memory_gate.assess(payload)
+    if decision.skip and not decision.sampled:
+        return 0, 0
+
+    written = await _extract_and_write(llm, payload)
+    memory_gate.record(decision, payload, sum(written))
+    return written
+
+
+async def _extract_and_write(llm, payload: dict[str, Any]) -> tuple[int, int]:
+    user_text = payload.get("user_text") or ""
+    ai_text = payload.get("ai_text") or ""
+
+    # 1) Спросить у модели, что сохранять
+    planner_msgs = build_memory_write_messages(
+        user_text=user_text,
+        ai_text=ai_text,
+        core_facts=payload.get("core_facts", []),
+        extended_facts=payload.get("extended_facts", []),
+        episodic_facts=payload.get("episodic_facts", []),
+    )
+
+    resp = await llm.ainvoke(planner_msgs)
+    logger.debug(f"LLM response: {getattr(resp, 'content', None)}")
+    raw = _extract_json(getattr(resp, "content", "") or "")
+    # logger.debug(f"Extracted json: {raw}")
+
+    if not raw:
+        logger.debug("No json extracted")
+        return 0, 0
+
+    facts = raw.get("facts", [])
+    episodic = raw.get("episodic", [])
+
+    if not isinstance(facts, list):
+        facts = []
+    if not isinstance(episodic, list):
+        episodic = []
+
+    # 2) Санитизация (чтобы не записать мусор/сломанный формат)
+    clean_facts: list[dict[str, Any]] = []
+    for f in facts[:5]:
+        if not isinstance(f, dict):
+            continue
+
+        tier = f.get("tier")
+        subject = f.get("subject")
+        predicate = f.get("predicate")
+        value = f.get("value")
+
+        if tier not in ("core", "extended"):
+            continue
+        if not isinstance(subject, str) or not subject.strip():
+            continue
+        if not isinstance(predicate, str) or not predicate.strip():
+            continue
+        if not isinstance(value, str) or not value.strip():
+            continue
+
+        confidence = _clamp01(f.get("confidence"), None)
+        canonical_key = _make_canonical_key(tier, subject, predicate)
+
+        clean_facts.append(
+            {
+                "tier": tier,
+                "subject": subject.strip(),
+                "predicate": predicate.strip(),
+                "value": value.strip(),
+                "confidence": confidence,
+                "canonical_key": canonical_key,
+            }
         )
 
-        try:
-            resp = await llm.ainvoke(planner_msgs)
-            logger.debug(f"LLM response: {getattr(resp, 'content', None)}")
-            raw = _extract_json(getattr(resp, "content", "") or "")
-            # logger.debug(f"Extracted json: {raw}")
-        except Exception as e:
-            logger.warning(f"LLM invoke failed: {e}")
-            return {}
+    clean_episodes: list[dict[str, Any]] = []
+    for ep in episodic[:2]:
+        if not isinstance(ep, dict):
+            continue
+
+        event_type = ep.get("event_type")
+        summary = ep.get("summary")
+        content = ep.get("content")
+        importance = _clamp01(ep.get("importance"), 0.0) or 0.0
+
+        if not isinstance(event_type, str) or not event_type.strip():
+            continue
+        if not isinstance(summary, str) or not summary.strip():
+            continue
+        if not isinstance(content, str) or not content.strip():
+            continue
+
+        clean_episodes.append(
+            {
+                "event_type": event_type.strip(),
+                "summary": summary.strip(),
+                "content": content.strip(),
+                "importance": float(importance),
+            }
+        )
 
-        if not raw:
-            logger.debug("No json extracted")
-            return {}
+    logger.debug(f"Sanitized facts: {clean_facts}")
+    logger.debug(f"Sanitized episodic: {clean_episodes}")
 
-        facts = raw.get("facts", [])
-        episodic = raw.get("episodic", [])
-
-        if not isinstance(facts, list):
-            facts = []
-        if not isinstance(episodic, list):
-            episodic = []
-
-        # 2) Санитизация (чтобы не записать мусор/сломанный формат)
-        clean_facts: list[dict[str, Any]] = []
-        for f in facts[:5]:
-            if not isinstance(f, dict):
-                continue
-
-            tier = f.get("tier")
-            subject = f.get("subject")
-            predicate = f.get("predicate")
-            value = f.get("value")
-
-            if tier not in ("core", "extended"):
-                continue
-            if not isinstance(subject, str) or not subject.strip():
-                continue
-            if not isinstance(predicate, str) or not predicate.strip():
-                continue
-            if not isinstance(value, str) or not value.strip():
-                continue
-
-            confidence = _clamp01(f.get("confidence"), None)
-            canonical_key = _make_canonical_key(tier, subject, predicate)
-
-            clean_facts.append(
-                {
-                    "tier": tier,
-                    "subject": subject.strip(),
-                    "predicate": predicate.strip(),
-                    "value": value.strip(),
-                    "confidence": confidence,
-                    "canonical_key": canonical_key,
-                }
-            )
-
-        clean_episodes: list[dict[str, Any]] = []
-        for ep in episodic[:2]:
-            if not isinstance(ep, dict):
-                continue
-
-            event_type = ep.get("event_type")
-            summary = ep.get("summary")
-            content = ep.get("content")
-            importance = _clamp01(ep.get("importance"), 0.0) or 0.0
-
-            if not isinstance(event_type, str) or not event_type.strip():
-                continue
-            if not isinstance(summary, str) or not summary.strip():
-                continue
-            if not isinstance(content, str) or not content.strip():
-                continue
-
-            clean_episodes.append(
-                {
-                    "event_type": event_type.strip(),
-                    "summary": summary.strip(),
-                    "content": content.strip(),
-                    "importance": float(importance),
-                }
-            )
-
-        logger.debug(f"Sanitized facts: {clean_facts}")
-        logger.debug(f"Sanitized episodic: {clean_episodes}")
-
-        if not clean_facts and not clean_episodes:
-            logger.debug("Nothing to write after sanitize")
-            return {}
+    if not clean_facts and not clean_episodes:
+        logger.debug("Nothing to write after sanitize")
+        return 0, 0
 
-        # 3) Запись в БД (upsert по canonical_key / по source ids если будут)
-        # source ids (если ты когда-то добавишь в state)
-        source_chat_id = state.get("source_chat_id")  # может отсутствовать
-        source_message_id = state.get("source_message_id")
+    # 3) Запись в БД (upsert по canonical_key / по source ids)
+    await add_memory_fact(clean_facts)
+    await add_episodic_memory(
+        clean_episodes,
+        source_chat_id=payload.get("source_chat_id"),
+        source_message_id=payload.get("source_message_id"),
+    )
 
-        await add_memory_fact(clean_facts)
-        await add_episodic_memory(
-            clean_episodes,
-            source_chat_id=source_chat_id,
-            source_message_id=source_message_id,
-        )
+    logger.info(f"Memory write: wrote facts={len(clean_facts)} episodic={len(clean_episodes)}")
+    return len(clean_facts), len(clean_episodes)
+
+
+def memory_write_handler(llm):
+    """Обработчик заданий очереди memory_write_jobs."""
+    async def handle(payload: dict[str, Any]) -> None:
+        await write_memory(llm, payload)
+
+    return handle
+
+
+def memory_write(llm):
+    async def node(state: State) -> dict:
+        payload = memory_write_payload(state)
+        if not payload["user_text"] and not payload["ai_text"]:
+            return {}
+
+        if MEMORY_WRITE_MODE == "queue":
+            # ответ пользователю не ждёт LLM-вызова записи: только INSERT задания
+            try:
+                job_id = await memory_write_queue.enqueue(payload)
+                logger.debug(f"Memory write job queued: {job_id}")
+                return {}
+            except Exception as e:
+                logger.warning(f"Memory write enqueue failed, writing inline: {e}")
 
-        logger.info(f"Memory write: wrote facts={len(clean_facts)} episodic={len(clean_episodes)}")
+        try:
+            await write_memory(llm, payload)
+        except Exception as e:
+            logger.warning(f"LLM invoke failed: {e}")
 
         # Ничего не меняем в state, чтобы не ломать "последнее сообщение"
         return {}
@@ -0,0 +1,63 @@
+import json
+
+from app.agent.nodes.memory_read import retrieve_memory
+from app.agent.state import State
+from app.llm.prompt import build_turn_planner_messages, turn_planner_schema
+from app.services.memory_planner import plan_memory_request
+from app.services.service_db import QueryContext, build_memory_catalog, normalize_memory_request
+
+from app.core import MEMORY_PLANNER_MODE, get_logger
+
+logger = get_logger(__name__)
+
+ROUTES = ("chat", "tools")
+
+
+def turn_planner(llm, tools: list):
+    """
+    route + memory_read одним LLM-вызовом: ответ ограничен JSON-схемой через format= Ollama,
+    так что он сразу идёт в normalize_memory_request и в условное ребро графа.
+    """
+    async def node(state: State) -> dict:
+        user_message = ""
+        has_images = False
+        try:
+            content = state.get("messages", [])[-1].content
+            user_message = str(content)
+            has_images = isinstance(content, list)
+        except Exception:
+            user_message = ""
+
+        query = QueryContext(user_message)
+        query.prefetch()
+
+        catalog = await build_memory_catalog()
+
+        raw_json = None
+        try:
+            planner = llm.bind(format=turn_planner_schema(catalog))
+            response = await planner.ainvoke(build_turn_planner_messages(user_message, catalog, tools))
+            raw_json = json.loads(getattr(response, "content", "") or "")
+        except Exception as e:
+            logger.warning(f"Turn planner failed: {e}")
+
+        route_to = raw_json.get("route") if isinstance(raw_json, dict) else None
+        if route_to not in ROUTES:
+            route_to = "chat"
+        if has_images:
+            # как в route: сообщения с картинками идут в chat_tools
+            route_to = "tools"
+
+        if not isinstance(raw_json, dict) and MEMORY_PLANNER_MODE != "llm":
+            # LLM не ответил — лучше локальный план памяти, чем никакого
+            try:
+                raw_json = (await plan_memory_request(user_message, catalog, query)).request
+            except Exception as e:
+                logger.warning(f"Local planner failed: {e}")
+
+        req = normalize_memory_request(raw_json, catalog=catalog)
+        logger.info(f"Turn planner: route={route_to}")
+
+        return {"route_to": route_to, **await retrieve_memory(user_message, req, query)}
+
+    return node
@@ -1,15 +1,31 @@
-from typing import Any
+from typing import Any, Optional
 from typing_extensions import TypedDict, Annotated
 from langchain_core.messages import BaseMessage
 from langgraph.graph.message import add_messages
 
 
+def replace(old: Any, new: Any) -> Any:
+    """
+    Редьюсер "последнее значение": в отличие от канала по умолчанию не падает,
+    если ключ пишут несколько параллельных веток в одном шаге.
+    """
+    return new
+
+
 class State(TypedDict, total=False):
     messages: Annotated[list[BaseMessage], add_messages]
 
-    route_to: str
+    # route и memory_read идут параллельно от START, каждая ветка пишет только свои ключи
+    route_to: Annotated[str, replace]
 
     # память (перезаписывается на каждом read)
-    core_facts: list[dict[str, Any]]
-    extended_facts: list[dict[str, Any]]
-    episodic_facts: list[dict[str, Any]]
\ No newline at end of file
+    core_facts: Annotated[list[dict[str, Any]], replace]
+    extended_facts: Annotated[list[dict[str, Any]], replace]
+    episodic_facts: Annotated[list[dict[str, Any]], replace]
+
+    # откуда пришло сообщение (Telegram) — дедуп эпизодов при ретраях записи памяти
+    source_chat_id: Optional[int]
+    source_message_id: Optional[int]
+
+    # краткое содержание ходов, вырезанных из messages (compact_context)
+    summary: Annotated[str, replace]
@@ -7,11 +7,60 @@ CHECKPOINT_DB_URI = _settings.CHECKPOINT_DB_URI
 
 BOT_TOKEN = _settings.BOT_TOKEN
 GROUP_ID = _settings.GROUP_ID
+BOT_STREAM_REPLIES = _settings.BOT_STREAM_REPLIES
+BOT_STREAM_EDIT_INTERVAL_S = _settings.BOT_STREAM_EDIT_INTERVAL_S
+BOT_STREAM_MIN_DELTA = _settings.BOT_STREAM_MIN_DELTA
+BOT_MAX_CONCURRENT_RUNS = _settings.BOT_MAX_CONCURRENT_RUNS
 
 OLLAMA_MODEL_FASTER_COLD = _settings.OLLAMA_MODEL_FASTER_COLD
 OLLAMA_MODEL_COLD = _settings.OLLAMA_MODEL_COLD
 OLLAMA_MODEL_WARM = _settings.OLLAMA_MODEL_WARM
+LLM_SCHEDULER_ENABLED = _settings.LLM_SCHEDULER_ENABLED
+LLM_SCHEDULER_CONCURRENCY = _settings.LLM_SCHEDULER_CONCURRENCY
+LLM_SCHEDULER_MAX_WAIT_S = _settings.LLM_SCHEDULER_MAX_WAIT_S
+LLM_KEEP_ALIVE = _settings.LLM_KEEP_ALIVE
 EMBEDDING_MODEL = _settings.EMBEDDING_MODEL
+EMBEDDING_CACHE_MAX_BYTES = _settings.EMBEDDING_CACHE_MAX_BYTES
+EMBEDDING_BATCH_MAX_SIZE = _settings.EMBEDDING_BATCH_MAX_SIZE
+EMBEDDING_BATCH_MAX_WAIT_MS = _settings.EMBEDDING_BATCH_MAX_WAIT_MS
+EMBEDDING_WORKERS = _settings.EMBEDDING_WORKERS
+EMBEDDING_TORCH_THREADS = _settings.EMBEDDING_TORCH_THREADS
+EMBEDDING_EXECUTOR = _settings.EMBEDDING_EXECUTOR
+EMBEDDING_BACKEND = _settings.EMBEDDING_BACKEND
+EMBEDDING_QUANTIZE = _settings.EMBEDDING_QUANTIZE
+EMBEDDING_EXPORT_DIR = _settings.EMBEDDING_EXPORT_DIR
+EMBEDDING_STORAGE_DTYPE = _settings.EMBEDDING_STORAGE_DTYPE
+EMBEDDING_STORAGE_DIM = _settings.EMBEDDING_STORAGE_DIM
+
+MEMORY_INDEX_ENABLED = _settings.MEMORY_INDEX_ENABLED
+MEMORY_INDEX_NPROBE = _settings.MEMORY_INDEX_NPROBE
+MEMORY_INDEX_TRAIN_THRESHOLD = _settings.MEMORY_INDEX_TRAIN_THRESHOLD
+MEMORY_INDEX_CANDIDATES = _settings.MEMORY_INDEX_CANDIDATES
+MEMORY_RETRIEVAL_COMBINED = _settings.MEMORY_RETRIEVAL_COMBINED
+MEMORY_CATALOG_TTL_S = _settings.MEMORY_CATALOG_TTL_S
+BLOB_DIR = _settings.BLOB_DIR
+MEMORY_WRITE_MODE = _settings.MEMORY_WRITE_MODE
+MEMORY_QUEUE_CONCURRENCY = _settings.MEMORY_QUEUE_CONCURRENCY
+MEMORY_QUEUE_MAX_ATTEMPTS = _settings.MEMORY_QUEUE_MAX_ATTEMPTS
+MEMORY_QUEUE_POLL_S = _settings.MEMORY_QUEUE_POLL_S
+MEMORY_QUEUE_STALE_S = _settings.MEMORY_QUEUE_STALE_S
+MEMORY_GATE_ENABLED = _settings.MEMORY_GATE_ENABLED
+MEMORY_GATE_MIN_CHARS = _settings.MEMORY_GATE_MIN_CHARS
+MEMORY_GATE_KNOWN_SIM = _settings.MEMORY_GATE_KNOWN_SIM
+MEMORY_GATE_SAMPLE_RATE = _settings.MEMORY_GATE_SAMPLE_RATE
+MEMORY_CORE_RECONCILE_S = _settings.MEMORY_CORE_RECONCILE_S
+MEMORY_PLANNER_CACHE_SIZE = _settings.MEMORY_PLANNER_CACHE_SIZE
+MEMORY_PLANNER_CACHE_TTL_S = _settings.MEMORY_PLANNER_CACHE_TTL_S
+MEMORY_PLANNER_CACHE_SIM = _settings.MEMORY_PLANNER_CACHE_SIM
+CONTEXT_MAX_TOKENS = _settings.CONTEXT_MAX_TOKENS
+CONTEXT_MIN_TURNS = _settings.CONTEXT_MIN_TURNS
+CONTEXT_MAX_TURNS = _settings.CONTEXT_MAX_TURNS
+CONTEXT_TARGET_RATIO = _settings.CONTEXT_TARGET_RATIO
+CONTEXT_KEEP_IMAGE_TURNS = _settings.CONTEXT_KEEP_IMAGE_TURNS
+TURN_PLANNER_ENABLED = _settings.TURN_PLANNER_ENABLED
+MEMORY_PLANNER_MODE = _settings.MEMORY_PLANNER_MODE
+MEMORY_PLANNER_SIM_THRESHOLD = _settings.MEMORY_PLANNER_SIM_THRESHOLD
+MEMORY_PLANNER_MIN_CONFIDENCE = _settings.MEMORY_PLANNER_MIN_CONFIDENCE
 
 del _settings
 
@@ -21,9 +70,57 @@ __all__ = [
     "CHECKPOINT_DB_URI",
     "BOT_TOKEN",
     "GROUP_ID",
+    "BOT_STREAM_REPLIES",
+    "BOT_STREAM_EDIT_INTERVAL_S",
+    "BOT_STREAM_MIN_DELTA",
+    "BOT_MAX_CONCURRENT_RUNS",
     "OLLAMA_MODEL_FASTER_COLD",
     "OLLAMA_MODEL_COLD",
     "OLLAMA_MODEL_WARM",
+    "LLM_SCHEDULER_ENABLED",
+    "LLM_SCHEDULER_CONCURRENCY",
+    "LLM_SCHEDULER_MAX_WAIT_S",
+    "LLM_KEEP_ALIVE",
     "EMBEDDING_MODEL",
+    "EMBEDDING_CACHE_MAX_BYTES",
+    "EMBEDDING_BATCH_MAX_SIZE",
+    "EMBEDDING_BATCH_MAX_WAIT_MS",
+    "EMBEDDING_WORKERS",
+    "EMBEDDING_TORCH_THREADS",
+    "EMBEDDING_EXECUTOR",
+    "EMBEDDING_BACKEND",
+    "EMBEDDING_QUANTIZE",
+    "EMBEDDING_EXPORT_DIR",
+    "EMBEDDING_STORAGE_DTYPE",
+    "EMBEDDING_STORAGE_DIM",
+    "MEMORY_INDEX_ENABLED",
+    "MEMORY_INDEX_NPROBE",
+    "MEMORY_INDEX_TRAIN_THRESHOLD",
+    "MEMORY_INDEX_CANDIDATES",
+    "MEMORY_RETRIEVAL_COMBINED",
+    "MEMORY_CATALOG_TTL_S",
+    "BLOB_DIR",
+    "MEMORY_WRITE_MODE",
+    "MEMORY_QUEUE_CONCURRENCY",
+    "MEMORY_QUEUE_MAX_ATTEMPTS",
+    "MEMORY_QUEUE_POLL_S",
+    "MEMORY_QUEUE_STALE_S",
+    "MEMORY_GATE_ENABLED",
+    "MEMORY_GATE_MIN_CHARS",
+    "MEMORY_GATE_KNOWN_SIM",
+    "MEMORY_GATE_SAMPLE_RATE",
+    "MEMORY_CORE_RECONCILE_S",
+    "MEMORY_PLANNER_CACHE_SIZE",
+    "MEMORY_PLANNER_CACHE_TTL_S",
+    "MEMORY_PLANNER_CACHE_SIM",
+    "CONTEXT_MAX_TOKENS",
+    "CONTEXT_MIN_TURNS",
+    "CONTEXT_MAX_TURNS",
+    "CONTEXT_TARGET_RATIO",
+    "CONTEXT_KEEP_IMAGE_TURNS",
+    "TURN_PLANNER_ENABLED",
+    "MEMORY_PLANNER_MODE",
+    "MEMORY_PLANNER_SIM_THRESHOLD",
+    "MEMORY_PLANNER_MIN_CONFIDENCE",
     "get_logger",
 ]
\ No newline at end of file
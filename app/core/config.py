@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -11,12 +13,62 @@ class Settings(BaseSettings):
 
     BOT_TOKEN: str
     GROUP_ID: int
+    BOT_STREAM_REPLIES: bool = True           # ответ появляется по мере генерации (правками сообщения)
+    BOT_STREAM_EDIT_INTERVAL_S: float = 1.5   # не чаще одной правки за интервал (лимиты Telegram)
+    BOT_STREAM_MIN_DELTA: int = 20            # и не меньше стольких новых символов
+    BOT_MAX_CONCURRENT_RUNS: int = 2          # прогонов графа одновременно по всем темам
     
     OLLAMA_MODEL_FASTER_COLD: str
     OLLAMA_MODEL_COLD: str
     OLLAMA_MODEL_WARM: str
+    LLM_SCHEDULER_ENABLED: bool = True        # очередь запросов к Ollama с учётом загруженной модели
+    LLM_SCHEDULER_CONCURRENCY: int = 1        # запросов к одной модели одновременно (как OLLAMA_NUM_PARALLEL)
+    LLM_SCHEDULER_MAX_WAIT_S: float = 20.0    # дольше ждать смены модели нельзя — переключаемся
+    LLM_KEEP_ALIVE: str | None = "30m"        # keep_alive в каждом запросе, None — по умолчанию Ollama
     EMBEDDING_MODEL: str
+    EMBEDDING_CACHE_MAX_BYTES: int = 64 * 1024 * 1024   # 0 — кэш выключен
+    EMBEDDING_BATCH_MAX_SIZE: int = 64        # сколько текстов максимум в одном forward pass
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0  # сколько ждём соседей по батчу
+    EMBEDDING_WORKERS: int = 1                # параллельных forward pass-ов
+    EMBEDDING_TORCH_THREADS: int | None = None
+    EMBEDDING_EXECUTOR: Literal["thread", "process"] = "thread"  # process — модель в отдельных процессах
+    EMBEDDING_BACKEND: Literal["torch", "onnx", "openvino"] = "torch"  # onnx/openvino — экспорт для CPU
+    EMBEDDING_QUANTIZE: bool = False          # dynamic int8 (только onnx)
+    EMBEDDING_EXPORT_DIR: str = "models/embedding"  # кэш экспортированных моделей
+    EMBEDDING_STORAGE_DTYPE: Literal["float32", "float16", "int8"] = "float32"  # БД и ANN-индекс
+    EMBEDDING_STORAGE_DIM: int | None = None  # Matryoshka-усечение, None — полная размерность
+
+    MEMORY_INDEX_ENABLED: bool = True
+    MEMORY_INDEX_NPROBE: int = 8
+    MEMORY_INDEX_TRAIN_THRESHOLD: int = 4096  # до этого размера — точный перебор
+    MEMORY_INDEX_CANDIDATES: int = 100        # сколько кандидатов ANN добавляет к SQL-выборке
+
+    MEMORY_RETRIEVAL_COMBINED: bool = True    # все кандидаты одним SQL (UNION ALL), False — три запроса параллельно
+    CONTEXT_MAX_TOKENS: int = 3000            # бюджет истории в промпте (оценка), 0 — без обрезки
+    CONTEXT_MIN_TURNS: int = 2                # последние ходы, которые остаются дословно даже сверх бюджета
+    CONTEXT_MAX_TURNS: int = 12               # больше ходов дословно не держим, остальное — в summary
+    CONTEXT_TARGET_RATIO: float = 0.5         # при превышении сжимаем до этой доли бюджета, чтобы summary был редким
+    CONTEXT_KEEP_IMAGE_TURNS: int = 1         # у скольких последних ходов остаются картинки
+    TURN_PLANNER_ENABLED: bool = False        # route + планировщик памяти одним LLM-вызовом с JSON-схемой
+    MEMORY_PLANNER_MODE: Literal["llm", "local", "hybrid"] = "hybrid"  # hybrid — LLM только при низкой уверенности
+    MEMORY_PLANNER_SIM_THRESHOLD: float = 0.45  # косинус сообщения с меткой каталога
+    MEMORY_PLANNER_MIN_CONFIDENCE: float = 0.7  # ниже — спрашиваем LLM-планировщик
+    MEMORY_PLANNER_CACHE_SIZE: int = 512      # решений планировщика в кэше, 0 — выключен
+    MEMORY_PLANNER_CACHE_TTL_S: float = 3600.0
+    MEMORY_PLANNER_CACHE_SIM: float | None = 0.95  # косинус "похожего" сообщения, None — только точное совпадение
+    MEMORY_CORE_RECONCILE_S: float = 300.0    # сверка кэша core-фактов с БД, 0 — без сверки
+    MEMORY_WRITE_MODE: Literal["queue", "inline"] = "queue"  # queue — запись памяти в фоне, после ответа
+    MEMORY_QUEUE_CONCURRENCY: int = 2         # одновременных заданий записи
+    MEMORY_QUEUE_MAX_ATTEMPTS: int = 5
+    MEMORY_QUEUE_POLL_S: float = 5.0
+    MEMORY_QUEUE_STALE_S: float = 600.0       # running дольше — процесс упал, задание возвращается в очередь
+    MEMORY_GATE_ENABLED: bool = True          # фильтр ходов перед LLM-вызовом memory_write
+    MEMORY_GATE_MIN_CHARS: int = 15           # короче и без подсказок про память — пропуск
+    MEMORY_GATE_KNOWN_SIM: float = 0.92       # сообщение почти дословно повторяет известный факт — пропуск
+    MEMORY_GATE_SAMPLE_RATE: float = 0.05     # доля пропусков, которые всё равно идут в LLM (поиск ложных пропусков)
+    MEMORY_CATALOG_TTL_S: float = 600.0      # страховка от записей мимо процесса, 0 — только по версии
 
+    BLOB_DIR: str = "data/blobs"              # фото из Telegram (в сообщениях — только blob://-ссылки)
     LOG_LEVEL: str = "INFO"
 
     @property
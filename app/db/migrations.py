@@ -0,0 +1,34 @@
+from sqlalchemy import text
+
+from app.db.session import engine
+
+
+# Правки схемы для баз, созданных до соответствующих изменений моделей
+# (init_db пересоздаёт всё с нуля). Каждая идемпотентна — гоняются на каждом старте.
+_MIGRATIONS = [
+    # эмбеддинги фактов и эпизодов, пишутся при записи (см. app/services/vectors.py)
+    "ALTER TABLE memory_facts ADD COLUMN IF NOT EXISTS embedding BYTEA",
+    "ALTER TABLE episodic_memory ADD COLUMN IF NOT EXISTS embedding BYTEA",
+    # очередь memory_write пишет id чатов Telegram, а id групп (-100...) в int4 не помещаются
+    "DO $$ BEGIN "
+    "IF (SELECT data_type FROM information_schema.columns "
+    "WHERE table_name = 'episodic_memory' AND column_name = 'source_chat_id') = 'integer' THEN "
+    "ALTER TABLE episodic_memory ALTER COLUMN source_chat_id TYPE BIGINT; "
+    "END IF; END $$",
+    # у одного сообщения может быть несколько эпизодов: source_part входит в uq_epi_source
+    "DO $$ BEGIN "
+    "IF NOT EXISTS (SELECT 1 FROM information_schema.columns "
+    "WHERE table_name = 'episodic_memory' AND column_name = 'source_part') THEN "
+    "ALTER TABLE episodic_memory ADD COLUMN source_part INTEGER NOT NULL DEFAULT 0; "
+    "ALTER TABLE episodic_memory DROP CONSTRAINT IF EXISTS uq_epi_source; "
+    "ALTER TABLE episodic_memory ADD CONSTRAINT uq_epi_source "
+    "UNIQUE (source_chat_id, source_message_id, source_part); "
+    "END IF; END $$",
+]
+
+
+async def migrate_schema() -> None:
+    """Досоздаёт недостающие колонки/ограничения. Вызывать до любых чтений памяти."""
+    async with engine.begin() as conn:
+        for sql in _MIGRATIONS:
+            await conn.execute(text(sql))
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+from app.core import BOT_MAX_CONCURRENT_RUNS, get_logger
+
+logger = get_logger(__name__)
+
+Job = Callable[[], Awaitable[Any]]
+
+
+class _Mailbox:
+    def __init__(self):
+        self.queue: deque[tuple[Job, asyncio.Future, float]] = deque()
+        self.worker: Optional[asyncio.Task] = None
+        self.running = False
+
+
+class TopicDispatcher:
+    """
+    Слой между router и графом.
+
+    - у каждой темы (thread_id) свой почтовый ящик: сообщения одной темы идут строго
+      по очереди, два прогона графа на одном чекпоинте не пересекаются;
+    - глобальный семафор ограничивает число прогонов графа одновременно по всем темам,
+      чтобы всплеск сообщений не заваливал Ollama параллельными запросами.
+
+    Воркер ящика живёт, пока в нём есть сообщения; пустой ящик удаляется.
+    """
+    def __init__(self, max_concurrent: int = 2):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._mailboxes: dict[str, _Mailbox] = {}
+
+        self.in_flight = 0
+        self.processed = 0
+        self.errors = 0
+        self.max_depth = 0
+        self._wait_total = 0.0
+        self.max_wait_s = 0.0
+
+    def depth(self, key: str) -> int:
+        """Сообщений темы в очереди + выполняемое сейчас."""
+        box = self._mailboxes.get(key)
+        if box is None:
+            return 0
+        return len(box.queue) + int(box.running)
+
+    async def submit(self, key: str, job: Job) -> Any:
+        """Ставит job в ящик темы и ждёт результата (исключение job пробрасывается)."""
+        future = asyncio.get_running_loop().create_future()
+
+        box = self._mailboxes.get(key)
+        if box is None:
+            box = self._mailboxes[key] = _Mailbox()
+        box.queue.append((job, future, time.perf_counter()))
+
+        depth = self.depth(key)
+        self.max_depth = max(self.max_depth, depth)
+        if depth > 1:
+            logger.debug(f"Topic {key}: queued behind {depth - 1} message(s)")
+
+        if box.worker is None:
+            box.worker = asyncio.create_task(self._drain(key, box), name=f"mailbox-{key}")
+        return await future
+
+    async def _drain(self, key: str, box: _Mailbox) -> None:
+        try:
+            while box.queue:
+                job, future, enqueued_at = box.queue.popleft()
+                if future.cancelled():
+                    continue
+
+                box.running = True
+                try:
+                    async with self._slots:
+                        wait = time.perf_counter() - enqueued_at
+                        self._wait_total += wait
+                        self.max_wait_s = max(self.max_wait_s, wait)
+                        if wait >= 1.0:
+                            logger.info(f"Topic {key}: waited {wait:.2f}s before the graph run")
+
+                        self.in_flight += 1
+                        try:
+                            result = await job()
+                        except asyncio.CancelledError:
+                            future.cancel()
+                            raise
+                        except Exception as e:
+                            self.errors += 1
+                            if not future.done():
+                                future.set_exception(e)
+                        else:
+                            if not future.done():
+                                future.set_result(result)
+                        finally:
+                            self.in_flight -= 1
+                            self.processed += 1
+                finally:
+                    box.running = False
+        finally:
+            box.worker = None
+            if not box.queue and self._mailboxes.get(key) is box:
+                del self._mailboxes[key]
+
+    def stats(self) -> dict:
+        return {
+            "topics": len(self._mailboxes),
+            "queued": sum(len(b.queue) for b in self._mailboxes.values()),
+            "depth": {k: self.depth(k) for k in self._mailboxes if self.depth(k) > 1},
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "processed": self.processed,
+            "errors": self.errors,
+            "max_depth": self.max_depth,
+            "avg_wait_s": round(self._wait_total / self.processed, 3) if self.processed else 0.0,
+            "max_wait_s": round(self.max_wait_s, 3),
+        }
+
+
+topic_dispatcher = TopicDispatcher(max_concurrent=BOT_MAX_CONCURRENT_RUNS)
+
+
+async def log_dispatcher_stats(interval_s: float = 60.0) -> None:
+    while True:
+        await asyncio.sleep(interval_s)
+        if topic_dispatcher.processed or topic_dispatcher.stats()["queued"]:
+            logger.info(f"Topic dispatcher: {topic_dispatcher.stats()}")
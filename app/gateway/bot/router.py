@@ -3,7 +3,9 @@ from aiogram.types import Message
 
 from langchain_core.messages import HumanMessage
 
-from app.core import get_logger
+from app.core import BOT_STREAM_EDIT_INTERVAL_S, BOT_STREAM_MIN_DELTA, BOT_STREAM_REPLIES, get_logger
+from app.gateway.bot.mailbox import topic_dispatcher
+from app.gateway.bot.streaming import StreamingReply, stream_graph_reply
 from app.services.service_download import download_photo
 
 
@@ -28,20 +30,37 @@ async def handle_message(msg: Message, graph_app):
 
     logger.info(f"Received message in thread {thread_id}: text={text}|photo={len(msg.photo) if msg.photo else 0}")
 
+    # сообщения одной темы — строго по очереди, прогоны графа по всем темам — не больше BOT_MAX_CONCURRENT_RUNS
+    key = f"tg:{thread_id}"
+    await topic_dispatcher.submit(key, lambda: _run_graph(msg, graph_app, text=text, thread_key=key))
+
+
+async def _run_graph(msg: Message, graph_app, *, text: str, thread_key: str) -> None:
     photo = msg.photo[-1] if msg.photo else None
     if photo is not None:
         logger.info(f"Downloading photo {photo.file_id}...")
-        data_url = await download_photo(msg.bot, photo)
+        # в сообщении только ссылка blob://..., байты подставляет chat при сборке промпта
+        image_ref = await download_photo(msg.bot, photo)
         messages = HumanMessage(content=[
-            {"type": "image_url", "image_url": data_url},
+            {"type": "image_url", "image_url": image_ref},
             {"type": "text", "text": text},
         ])
     else:
         messages = HumanMessage(content=text)
 
-    out = await graph_app.ainvoke(
-        {"messages": [messages]},
-        config={"configurable": {"thread_id": f"tg:{thread_id}"}},
-    )
+    graph_input = {
+        "messages": [messages],
+        # для дедупа эпизодов памяти (ретраи очереди записи не плодят дубли)
+        "source_chat_id": msg.chat.id,
+        "source_message_id": msg.message_id,
+    }
+    config = {"configurable": {"thread_id": thread_key}}
+
+    if BOT_STREAM_REPLIES:
+        reply = StreamingReply(msg, interval_s=BOT_STREAM_EDIT_INTERVAL_S, min_delta=BOT_STREAM_MIN_DELTA)
+        await stream_graph_reply(graph_app, graph_input, config, reply)
+        return
+
+    out = await graph_app.ainvoke(graph_input, config=config)
 
     await msg.answer(out["messages"][-1].content)
\ No newline at end of file
@@ -0,0 +1,182 @@
+import asyncio
+import time
+from typing import Any, Optional
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from app.core import get_logger
+
+logger = get_logger(__name__)
+
+# лимит длины текста сообщения в Telegram
+TELEGRAM_TEXT_LIMIT = 4096
+
+# узлы, чьи токены видит пользователь (route и планировщик памяти тоже зовут LLM)
+REPLY_NODES = ("chat", "chat_tools")
+
+PLACEHOLDER = "…"
+
+
+def _split(text: str, limit: int = TELEGRAM_TEXT_LIMIT) -> list[str]:
+    return [text[i: i + limit] for i in range(0, len(text), limit)] or [""]
+
+
+class StreamingReply:
+    """
+    Ответ, который растёт по мере генерации: плейсхолдер + правки накопленным текстом.
+
+    Правки идут из фонового цикла не чаще interval_s и только если прибавилось
+    хотя бы min_delta символов — поток токенов их не ждёт. Промежуточные правки
+    без parse_mode (недописанный HTML Telegram не примет), финальная — с HTML бота.
+    """
+    def __init__(self, msg: Message, *, interval_s: float = 1.5, min_delta: int = 20):
+        self.msg = msg
+        self.interval_s = max(0.5, float(interval_s))
+        self.min_delta = max(1, int(min_delta))
+
+        self._message: Optional[Message] = None
+        self._text = ""
+        self._sent = PLACEHOLDER
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._finished = False
+
+        self.started_at = time.perf_counter()
+        self.first_token_s: Optional[float] = None
+        self.edits = 0
+
+    async def start(self) -> None:
+        self._message = await self.msg.answer(PLACEHOLDER, parse_mode=None)
+        self._task = asyncio.create_task(self._edit_loop(), name=f"stream-reply-{self.msg.message_id}")
+
+    def update(self, text: str) -> None:
+        if self._finished or text == self._text:
+            return
+        if self.first_token_s is None and text.strip():
+            self.first_token_s = time.perf_counter() - self.started_at
+        self._text = text
+        self._changed.set()
+
+    async def _edit(self, text: str, **kwargs: Any) -> bool:
+        try:
+            await self._message.edit_text(text, **kwargs)
+            self.edits += 1
+            return True
+        except TelegramRetryAfter as e:
+            logger.debug(f"Stream edit throttled by Telegram for {e.retry_after}s")
+            await asyncio.sleep(e.retry_after)
+        except TelegramBadRequest as e:
+            # "message is not modified" и т.п. — следующая правка всё исправит
+            logger.debug(f"Stream edit rejected: {e}")
+        return False
+
+    async def _edit_loop(self) -> None:
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+
+            text = self._text
+            if text == self._sent:
+                continue
+            # первый токен показываем сразу, дальше — не меньше min_delta новых символов
+            if self._sent != PLACEHOLDER and len(text) - len(self._sent) < self.min_delta:
+                await asyncio.sleep(self.interval_s)
+                self._changed.set()
+                continue
+
+            visible = text if len(text) <= TELEGRAM_TEXT_LIMIT else text[: TELEGRAM_TEXT_LIMIT - 1] + PLACEHOLDER
+            if visible.strip() and await self._edit(visible, parse_mode=None):
+                self._sent = text
+            await asyncio.sleep(self.interval_s)
+
+    async def _stop(self) -> None:
+        self._finished = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def finish(self, text: str) -> None:
+        """Финальная правка полным текстом (с parse_mode бота); хвост длиннее лимита — отдельными сообщениями."""
+        await self._stop()
+        if not text.strip():
+            await self.abort()
+            return
+        parts = _split(text)
+
+        if not await self._edit(parts[0]):
+            # HTML модели Telegram не разобрал — оставляем как есть, но без разметки
+            await self._edit(parts[0], parse_mode=None)
+        for part in parts[1:]:
+            await self.msg.answer(part)
+
+        logger.info(
+            f"Streamed reply: first_token={self.first_token_s and round(self.first_token_s, 2)}s "
+            f"total={round(time.perf_counter() - self.started_at, 2)}s edits={self.edits} chars={len(text)}"
+        )
+
+    async def abort(self) -> None:
+        """Убирает плейсхолдер, если ответа не будет."""
+        await self._stop()
+        if self._message is not None:
+            try:
+                await self._message.delete()
+            except TelegramBadRequest:
+                pass
+
+
+async def stream_graph_reply(
+    graph_app,
+    graph_input: dict[str, Any],
+    config: dict[str, Any],
+    reply: StreamingReply,
+) -> str:
+    """
+    Гонит граф через astream(messages + updates): токены узлов REPLY_NODES уходят в reply,
+    финальная правка — как только chat/chat_tools закончил ответ (до memory_write).
+    Поток дочитывается до конца, чтобы отработали memory_write и чекпоинтер.
+    """
+    await reply.start()
+
+    text = ""
+    chunk_id: Optional[str] = None
+    final: Optional[str] = None
+
+    try:
+        async for mode, chunk in graph_app.astream(graph_input, config=config, stream_mode=["messages", "updates"]):
+            if mode == "messages":
+                message, metadata = chunk
+                if final is not None or metadata.get("langgraph_node") not in REPLY_NODES:
+                    continue
+                if not isinstance(message, AIMessageChunk) or not isinstance(message.content, str):
+                    continue
+                # новый вызов модели (например, chat после tools) — начинаем текст заново
+                if message.id != chunk_id:
+                    chunk_id, text = message.id, ""
+                text += message.content
+                reply.update(text)
+                continue
+
+            # updates: {node: update} после завершения узла
+            for node, update in (chunk or {}).items():
+                if final is not None or node not in REPLY_NODES:
+                    continue
+                for message in (update or {}).get("messages", []):
+                    if isinstance(message, AIMessage) and not message.tool_calls:
+                        final = str(message.content or "")
+                if final is not None:
+                    await reply.finish(final)
+    except BaseException:
+        if final is None:
+            await reply.abort()
+        raise
+
+    if final is None:
+        # граф закончился без ответа chat-узла — показываем то, что успело прийти
+        final = text
+        await reply.finish(final)
+    return final
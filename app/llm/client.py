@@ -1,7 +1,10 @@
 from functools import lru_cache
-from typing import Literal
-from langchain_ollama import ChatOllama
-from app.core import OLLAMA_MODEL_FASTER_COLD, OLLAMA_MODEL_COLD, OLLAMA_MODEL_WARM, get_logger
+from typing import TYPE_CHECKING, Literal
+from app.core import LLM_SCHEDULER_ENABLED, OLLAMA_MODEL_FASTER_COLD, OLLAMA_MODEL_COLD, OLLAMA_MODEL_WARM, get_logger
+from app.llm.scheduler import ScheduledChatModel, llm_scheduler
+
+if TYPE_CHECKING:
+    from langchain_ollama import ChatOllama
 
 logger = get_logger(__name__)
 
@@ -20,10 +23,11 @@ Profile = Literal["faster_cold", "cold", "warm"]
 
 
 @lru_cache(maxsize=16)
-def get_chat_model(profile: Profile = "cold", num_ctx: int | None = None) -> ChatOllama:
+def get_chat_model(profile: Profile = "cold", num_ctx: int | None = None) -> "ChatOllama | ScheduledChatModel":
     """
     Единая точка создания LLM-клиента, но с профилями.
     Кэш теперь на (profile, num_ctx), а не один инстанс на всё.
+    С LLM_SCHEDULER_ENABLED модель обёрнута в ScheduledChatModel (общая очередь к Ollama).
     """
     if profile == "cold":
         model = OLLAMA_MODEL_COLD
@@ -37,11 +41,16 @@ def get_chat_model(profile: Profile = "cold", num_ctx: int | None = None) -> Cha
     # if num_ctx is not None:
     #     params["num_ctx"] = num_ctx
 
+    from langchain_ollama import ChatOllama
+
     logger.info(
         f"Using LLM model: provider=ollama model={model} profile={profile}" # params={params}"
     )
 
-    return ChatOllama(
+    llm = ChatOllama(
         model=model,
         # **params,
-    )
\ No newline at end of file
+    )
+    if LLM_SCHEDULER_ENABLED:
+        return ScheduledChatModel(llm, model=model, scheduler=llm_scheduler)
+    return llm
\ No newline at end of file
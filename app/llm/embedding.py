@@ -1,41 +1,395 @@
 import asyncio
-from functools import lru_cache, partial
+import hashlib
+import threading
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
-from app.core import EMBEDDING_MODEL
-from sentence_transformers import SentenceTransformer
+from typing import Callable, Literal
+
+import numpy as np
+
+from app.core import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_BATCH_MAX_SIZE,
+    EMBEDDING_BATCH_MAX_WAIT_MS,
+    EMBEDDING_CACHE_MAX_BYTES,
+    EMBEDDING_EXECUTOR,
+    EMBEDDING_EXPORT_DIR,
+    EMBEDDING_MODEL,
+    EMBEDDING_QUANTIZE,
+    EMBEDDING_TORCH_THREADS,
+    EMBEDDING_WORKERS,
+)
 
 from app.core import get_logger
+from app.llm.embedding_export import EmbeddingBackend, load_exported_model
 
 logger = get_logger(__name__, "logs.log")
 
+EmbeddingExecutor = Literal["thread", "process"]
 
-class EmbeddingModel:
-    def __init__(self, model_name: str):
+
+class EmbeddingCache:
+    """
+    LRU-кэш векторов по ключу (model_name, sha1(text)) с бюджетом по байтам.
+    Храним только numpy float32, размер записи = vec.nbytes.
+    """
+    def __init__(self, model_name: str, max_bytes: int):
         self.model_name = model_name
-        self._executor = ThreadPoolExecutor()
-        self._model = SentenceTransformer(model_name)
+        self.max_bytes = max(0, int(max_bytes))
+        self._data: OrderedDict[tuple[str, bytes], np.ndarray] = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, text: str) -> tuple[str, bytes]:
+        return self.model_name, hashlib.sha1(text.encode("utf-8")).digest()
 
-    async def encode(self, inputs: list[str]):
+    def get(self, text: str) -> np.ndarray | None:
+        key = self._key(text)
+        vec = self._data.get(key)
+        if vec is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return vec
+
+    def put(self, text: str, vec: np.ndarray) -> None:
+        if self.max_bytes <= 0:
+            return
+        vec = np.array(vec, dtype=np.float32)
+        vec.setflags(write=False)
+        if vec.nbytes > self.max_bytes:
+            return
+
+        key = self._key(text)
+        old = self._data.pop(key, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+
+        self._data[key] = vec
+        self._bytes += vec.nbytes
+
+        while self._bytes > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class EmbeddingBatcher:
+    """
+    Async-фронт для encode: собирает запросы от всех корутин в один батч
+    (до max_batch_size текстов или max_wait_ms ожидания), делает один forward pass
+    в выделенном пуле из `workers` потоков и раздаёт результаты обратно.
+    Пока батч считается, новые запросы копятся в очереди и уходят следующим батчем.
+    """
+    def __init__(
+        self,
+        encode_fn: Callable[[list[str]], np.ndarray],
+        *,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        workers: int = 1,
+    ):
+        self._encode_fn = encode_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.workers = max(1, int(workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="embedding")
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._runner: asyncio.Task | None = None
+        # ссылки на батчи в работе: без них задачу может собрать GC посреди forward pass
+        self._active: set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.texts = 0
+
+    def _ensure_started(self) -> None:
         loop = asyncio.get_running_loop()
-        func = partial(self._model.encode, inputs)
+        if self._loop is loop and self._runner is not None and not self._runner.done():
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._runner = loop.create_task(self._run(), name="embedding-batcher")
+
+    async def submit(self, texts: list[str]) -> np.ndarray:
+        self._ensure_started()
+        fut = self._loop.create_future()
+        self._queue.put_nowait((texts, fut))
+        return await fut
+
+    async def _collect(self) -> list[tuple[list[str], asyncio.Future]]:
+        first = await self._queue.get()
+        batch = [first]
+        size = len(first[0])
+
+        deadline = self._loop.time() + self.max_wait
+        while size < self.max_batch_size:
+            if not self._queue.empty():
+                item = self._queue.get_nowait()
+            else:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            batch.append(item)
+            size += len(item[0])
+
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = self._loop.create_task(self._process(batch))
+            self._active.add(task)
+            task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._active.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Embedding batch failed: {task.exception()!r}")
+
+    async def _process(self, batch: list[tuple[list[str], asyncio.Future]]) -> None:
+        try:
+            # отменённые пока ждали в очереди — не считаем
+            live = [(item, fut) for item, fut in batch if not fut.done()]
+            texts = [t for item, _ in live for t in item]
+            if not texts:
+                return
+
+            try:
+                vectors = await self._loop.run_in_executor(self._executor, self._encode_fn, texts)
+            except Exception as e:
+                for _, fut in live:
+                    if not fut.done():
+                        fut.set_exception(e)
+                return
+
+            self.batches += 1
+            self.texts += len(texts)
+
+            offset = 0
+            for item, fut in live:
+                if not fut.done():
+                    fut.set_result(vectors[offset: offset + len(item)])
+                offset += len(item)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch": round(self.texts / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+def load_sentence_transformer(
+    model_name: str,
+    torch_threads: int | None = None,
+    backend: EmbeddingBackend = "torch",
+    quantize: bool = False,
+    export_dir: str = "models/embedding",
+):
+    """
+    Загрузка SentenceTransformer — общая для in-process пути и для воркер-процесса.
+    backend="onnx"|"openvino" — экспортированный граф (опционально dynamic int8),
+    при любой ошибке (нет optimum/onnxruntime, экспорт упал) — обычный torch.
+    """
+    if backend != "torch":
+        try:
+            return load_exported_model(
+                model_name,
+                backend,
+                quantize=quantize,
+                export_dir=export_dir,
+                threads=torch_threads,
+            )
+        except Exception as e:
+            logger.warning(f"Embedding backend {backend} unavailable ({e!r}), falling back to torch")
+
+    if torch_threads:
+        # иначе каждый forward pass берёт все ядра и дерётся с event loop-ом
+        import torch
+        torch.set_num_threads(int(torch_threads))
+    # тяжёлый импорт (torch, transformers) — только когда модель реально нужна
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+class EmbeddingModel:
+    def __init__(
+        self,
+        model_name: str,
+        cache_max_bytes: int = 0,
+        *,
+        batch_max_size: int = 64,
+        batch_max_wait_ms: float = 5.0,
+        workers: int = 1,
+        torch_threads: int | None = None,
+        executor: EmbeddingExecutor = "thread",
+        backend: EmbeddingBackend = "torch",
+        quantize: bool = False,
+        export_dir: str = "models/embedding",
+    ):
+        self.model_name = model_name
+        self.executor = executor
+        self.backend = backend
+        backend_kwargs = {"backend": backend, "quantize": quantize, "export_dir": export_dir}
+
+        if executor == "process":
+            # модель живёт в отдельных процессах, результаты приходят через shared memory
+            from app.llm.embedding_worker import ProcessEncoderPool
+            self._model = None
+            encode_fn = ProcessEncoderPool(
+                model_name,
+                workers=workers,
+                torch_threads=torch_threads,
+                loader_kwargs=backend_kwargs,
+            )
+        else:
+            self._model = load_sentence_transformer(model_name, torch_threads, **backend_kwargs)
+            encode_fn = self._model.encode
+
+        self.cache = EmbeddingCache(model_name, cache_max_bytes)
+        self.batcher = EmbeddingBatcher(
+            encode_fn,
+            max_batch_size=batch_max_size,
+            max_wait_ms=batch_max_wait_ms,
+            workers=workers,
+        )
+
+    async def _encode_raw(self, inputs: list[str]) -> np.ndarray:
+        return await self.batcher.submit(inputs)
+
+    async def encode(self, inputs: list[str]) -> np.ndarray:
+        """
+        Батч с кэшем: в SentenceTransformer уходят только промахи (без дублей),
+        порядок результата совпадает с inputs.
+        """
+        if not inputs:
+            return np.empty((0, 0), dtype=np.float32)
+
+        result: list[np.ndarray | None] = [None] * len(inputs)
+        pending: dict[str, list[int]] = {}
+
+        for i, text in enumerate(inputs):
+            if text in pending:
+                pending[text].append(i)
+                continue
+            vec = self.cache.get(text)
+            if vec is None:
+                pending[text] = [i]
+            else:
+                result[i] = vec
+
+        if pending:
+            texts = list(pending)
+            encoded = await self._encode_raw(texts)
+            for text, vec in zip(texts, encoded):
+                self.cache.put(text, vec)
+                for i in pending[text]:
+                    result[i] = vec
+
+        return np.vstack(result).astype(np.float32, copy=False)
 
-        return await loop.run_in_executor(self._executor, func)
-    
     async def encode_one(self, text: str) -> list[float]:
         emb = await self.encode([text])  # shape = (1, dim)
         return emb[0].tolist()
-    
-@lru_cache(maxsize=1)
+
+_model: EmbeddingModel | None = None
+_model_lock = threading.Lock()
+
+
 def get_embedding_model() -> EmbeddingModel:
     """
-    Единая точка создания embedding-модели.
+    Единая точка создания embedding-модели (синглтон с double-checked lock).
+
+    lru_cache не защищает от гонки: prewarm строит модель в потоке, а запросы с
+    event loop могли бы в тот же момент начать строить вторую (или второй пул
+    процессов). Синхронный вызов блокирует до конца загрузки — из async-кода
+    используйте aget_embedding_model.
     """
+    global _model
+    if _model is not None:
+        return _model
+    with _model_lock:
+        if _model is None:
+            _model = _build_embedding_model()
+    return _model
+
+
+async def aget_embedding_model() -> EmbeddingModel:
+    """Модель для async-кода: первая загрузка идёт в потоке, event loop не блокируется."""
+    if _model is not None:
+        return _model
+    return await asyncio.to_thread(get_embedding_model)
+
+
+async def encode_texts(inputs: list[str]) -> np.ndarray:
+    """encode общей моделью — то, что нужно почти всем вызывающим из async-кода."""
+    return await (await aget_embedding_model()).encode(inputs)
+
+
+def _build_embedding_model() -> EmbeddingModel:
     model = EMBEDDING_MODEL
     metricks = {
         "model": EMBEDDING_MODEL,
+        "cache_max_bytes": EMBEDDING_CACHE_MAX_BYTES,
+        "batch_max_size": EMBEDDING_BATCH_MAX_SIZE,
+        "batch_max_wait_ms": EMBEDDING_BATCH_MAX_WAIT_MS,
+        "workers": EMBEDDING_WORKERS,
+        "executor": EMBEDDING_EXECUTOR,
+        "backend": EMBEDDING_BACKEND,
+        "quantize": EMBEDDING_QUANTIZE,
     }
     logger.info(f"Using embedding model: {metricks}")
 
     return EmbeddingModel(
         model_name=model,
-    )
\ No newline at end of file
+        cache_max_bytes=EMBEDDING_CACHE_MAX_BYTES,
+        batch_max_size=EMBEDDING_BATCH_MAX_SIZE,
+        batch_max_wait_ms=EMBEDDING_BATCH_MAX_WAIT_MS,
+        workers=EMBEDDING_WORKERS,
+        torch_threads=EMBEDDING_TORCH_THREADS,
+        executor=EMBEDDING_EXECUTOR,
+        backend=EMBEDDING_BACKEND,
+        quantize=EMBEDDING_QUANTIZE,
+        export_dir=EMBEDDING_EXPORT_DIR,
+    )
+
+
+async def prewarm_embedding_model() -> None:
+    """
+    Явная загрузка модели на старте (в потоке, чтобы не блокировать event loop)
+    и один прогон encode, чтобы первый пользовательский запрос не платил за инициализацию.
+    """
+    model = await aget_embedding_model()
+    await model.encode(["prewarm"])
+    logger.info("Embedding model prewarmed")
@@ -0,0 +1,121 @@
+import json
+import platform
+import re
+from pathlib import Path
+from typing import Any, Literal
+
+from app.core import get_logger
+
+logger = get_logger(__name__, "logs.log")
+
+EmbeddingBackend = Literal["torch", "onnx", "openvino"]
+
+_MANIFEST = "export.json"
+
+
+def _cpu_quantization_config() -> str:
+    """Пресет dynamic int8 для ONNX Runtime под текущий CPU."""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64"
+    try:
+        flags = Path("/proc/cpuinfo").read_text()
+    except OSError:
+        return "avx2"
+    if "avx512_vnni" in flags or "avx512vnni" in flags:
+        return "avx512_vnni"
+    if "avx512f" in flags:
+        return "avx512"
+    return "avx2"
+
+
+def export_path(export_dir: str, model_name: str, backend: EmbeddingBackend, quantize: bool) -> Path:
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+    return Path(export_dir) / slug / (f"{backend}-int8" if quantize else backend)
+
+
+def _model_kwargs(backend: EmbeddingBackend, threads: int | None) -> dict[str, Any]:
+    if not threads:
+        return {}
+    if backend == "onnx":
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = int(threads)
+        return {"session_options": options}
+    return {"ov_config": {"INFERENCE_NUM_THREADS": str(int(threads))}}
+
+
+def _find_file(path: Path, backend: EmbeddingBackend, quantized: bool) -> str:
+    pattern = "*.onnx" if backend == "onnx" else "*.xml"
+    files = sorted(p.relative_to(path).as_posix() for p in path.rglob(pattern))
+    if quantized:
+        files = [f for f in files if "qint8" in f]
+    else:
+        files = [f for f in files if "qint8" not in f]
+    if not files:
+        raise FileNotFoundError(f"No exported {backend} model in {path}")
+    return files[0]
+
+
+def _export(model_name: str, backend: EmbeddingBackend, quantize: bool, path: Path) -> dict[str, Any]:
+    """
+    Разовый экспорт: SentenceTransformer(backend=...) сам конвертирует веса через optimum,
+    результат сохраняем локально, чтобы следующие старты грузили готовый граф.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    path.mkdir(parents=True, exist_ok=True)
+    model = SentenceTransformer(model_name, backend=backend)
+    model.save_pretrained(str(path))
+
+    quantized = False
+    if quantize:
+        if backend == "onnx":
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+
+            config = _cpu_quantization_config()
+            export_dynamic_quantized_onnx_model(model, config, str(path))
+            quantized = True
+        else:
+            # для OpenVINO в sentence-transformers есть только static-квантизация с калибровкой
+            # на датасете — в рантайме её не делаем, остаёмся на fp32-графе
+            logger.warning("EMBEDDING_QUANTIZE is supported for the onnx backend only, using fp32 OpenVINO model")
+
+    manifest = {
+        "model": model_name,
+        "backend": backend,
+        "quantized": quantized,
+        "file_name": _find_file(path, backend, quantized),
+    }
+    (path / _MANIFEST).write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    logger.info(f"Embedding model exported: {manifest} -> {path}")
+    return manifest
+
+
+def load_exported_model(
+    model_name: str,
+    backend: EmbeddingBackend,
+    *,
+    quantize: bool = False,
+    export_dir: str = "models/embedding",
+    threads: int | None = None,
+):
+    """
+    SentenceTransformer на ONNX Runtime / OpenVINO из локального кэша экспорта.
+    Если экспорта ещё нет (или он от другой модели) — экспортирует один раз.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    path = export_path(export_dir, model_name, backend, quantize)
+    manifest_file = path / _MANIFEST
+
+    manifest = None
+    if manifest_file.exists():
+        manifest = json.loads(manifest_file.read_text(encoding="utf-8"))
+        if manifest.get("model") != model_name or not (path / manifest["file_name"]).exists():
+            manifest = None
+    if manifest is None:
+        manifest = _export(model_name, backend, quantize, path)
+
+    model_kwargs = {"file_name": manifest["file_name"], **_model_kwargs(backend, threads)}
+    return SentenceTransformer(str(path), backend=backend, model_kwargs=model_kwargs)
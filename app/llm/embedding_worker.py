@@ -0,0 +1,196 @@
+import atexit
+import importlib
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any
+
+import numpy as np
+
+from app.core import get_logger
+
+logger = get_logger(__name__)
+
+
+DEFAULT_LOADER = "app.llm.embedding:load_sentence_transformer"
+
+
+def _resolve(loader: str):
+    module, _, attr = loader.partition(":")
+    return getattr(importlib.import_module(module), attr)
+
+
+def _worker_main(conn, loader: str, loader_kwargs: dict[str, Any]) -> None:
+    """
+    Цикл воркер-процесса: грузит модель, на каждый запрос (texts, shm_name)
+    пишет float32 (n, dim) в shared memory родителя и отвечает только shape.
+    """
+    try:
+        model = _resolve(loader)(**loader_kwargs)
+        dim = int(model.get_sentence_embedding_dimension())
+    except Exception as e:
+        conn.send(("error", repr(e)))
+        return
+    conn.send(("ready", dim))
+
+    attached: dict[str, SharedMemory] = {}
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+        if msg is None:
+            break
+
+        req_id, texts, shm_name = msg
+        try:
+            vecs = np.ascontiguousarray(model.encode(texts), dtype=np.float32)
+
+            shm = attached.get(shm_name)
+            if shm is None:
+                for old in attached.values():
+                    old.close()
+                # буфер принадлежит родителю, он же делает unlink; resource_tracker
+                # у spawn-процессов общий с родителем, так что повторная регистрация — no-op
+                attached = {shm_name: SharedMemory(name=shm_name)}
+                shm = attached[shm_name]
+
+            np.ndarray(vecs.shape, dtype=np.float32, buffer=shm.buf)[...] = vecs
+            conn.send((req_id, "ok", vecs.shape))
+        except Exception as e:
+            conn.send((req_id, "error", repr(e)))
+
+    for shm in attached.values():
+        shm.close()
+
+
+class ProcessEncoder:
+    """
+    Одна модель в отдельном (spawn) процессе. Вызов блокирующий — его делают
+    из потока батчера, ожидание recv() GIL не держит, так что event loop не страдает.
+    Результат не пиклится: воркер пишет в заранее выделенный SharedMemory,
+    который растёт по необходимости.
+    """
+    def __init__(
+        self,
+        loader: str = DEFAULT_LOADER,
+        loader_kwargs: dict[str, Any] | None = None,
+        *,
+        initial_bytes: int = 4 * 1024 * 1024,
+    ):
+        self.loader = loader
+        self.loader_kwargs = loader_kwargs or {}
+        self._initial_bytes = initial_bytes
+        self._ctx = mp.get_context("spawn")
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._proc = None
+        self._conn = None
+        self._shm: SharedMemory | None = None
+        self.dim: int | None = None
+        self._start()
+
+    def _start(self) -> None:
+        parent, child = self._ctx.Pipe()
+        self._proc = self._ctx.Process(
+            target=_worker_main,
+            args=(child, self.loader, self.loader_kwargs),
+            daemon=True,
+            name="embedding-worker",
+        )
+        self._proc.start()
+        child.close()
+        self._conn = parent
+
+        status, payload = self._conn.recv()
+        if status != "ready":
+            raise RuntimeError(f"Embedding worker failed to start: {payload}")
+        self.dim = int(payload)
+        logger.info(f"Embedding worker started: pid={self._proc.pid} dim={self.dim}")
+
+    def _ensure_buffer(self, nbytes: int) -> SharedMemory:
+        if self._shm is None or self._shm.size < nbytes:
+            self._release_buffer()
+            self._shm = SharedMemory(create=True, size=max(nbytes, self._initial_bytes))
+        return self._shm
+
+    def _release_buffer(self) -> None:
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def _request(self, texts: list[str]) -> np.ndarray:
+        shm = self._ensure_buffer(len(texts) * self.dim * 4)
+        req_id = next(self._ids)
+        self._conn.send((req_id, texts, shm.name))
+
+        reply = self._conn.recv()
+        if reply[0] != req_id:
+            raise RuntimeError(f"Embedding worker protocol error: {reply!r}")
+        if reply[1] != "ok":
+            raise RuntimeError(f"Embedding worker error: {reply[2]}")
+
+        shape = tuple(reply[2])
+        return np.ndarray(shape, dtype=np.float32, buffer=shm.buf).copy()
+
+    def __call__(self, texts: list[str]) -> np.ndarray:
+        with self._lock:
+            try:
+                return self._request(texts)
+            except (EOFError, BrokenPipeError, ConnectionResetError) as e:
+                # воркер упал (OOM и т.п.) — поднимаем заново и повторяем один раз
+                logger.warning(f"Embedding worker died ({e!r}), restarting")
+                self._start()
+                return self._request(texts)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.send(None)
+                except Exception:
+                    pass
+                self._conn.close()
+                self._conn = None
+            if self._proc is not None:
+                self._proc.join(timeout=5)
+                if self._proc.is_alive():
+                    self._proc.kill()
+                self._proc = None
+            self._release_buffer()
+
+
+class ProcessEncoderPool:
+    """
+    Пул из `workers` процессов с тем же интерфейсом, что и model.encode(texts).
+    Каждый поток батчера берёт свободный процесс из пула.
+    """
+    def __init__(
+        self,
+        model_name: str,
+        *,
+        workers: int = 1,
+        torch_threads: int | None = None,
+        loader: str = DEFAULT_LOADER,
+        loader_kwargs: dict[str, Any] | None = None,
+    ):
+        kwargs = {"model_name": model_name, "torch_threads": torch_threads, **(loader_kwargs or {})}
+        self._encoders = [ProcessEncoder(loader, kwargs) for _ in range(max(1, int(workers)))]
+        self._free: queue.Queue[ProcessEncoder] = queue.Queue()
+        for enc in self._encoders:
+            self._free.put(enc)
+        atexit.register(self.close)
+
+    def __call__(self, texts: list[str]) -> np.ndarray:
+        enc = self._free.get()
+        try:
+            return enc(texts)
+        finally:
+            self._free.put(enc)
+
+    def close(self) -> None:
+        for enc in self._encoders:
+            enc.close()
@@ -97,6 +97,84 @@ tools|chat
 - chat если это болтовня, объяснение, мнение, совет, идеи без внешних действий.
 """
 
+TURN_PLANNER_SYSTEM = """Ты — планировщик хода агента. По сообщению пользователя за один раз реши две вещи:
+1) route — какой путь выбрать: "tools" или "chat";
+2) какие данные нужно ДОСТАТЬ из памяти перед ответом (extended / episodic).
+
+Входные данные:
+1) TOOLS — инструменты, доступные ассистенту (вызывать их тебе ЗАПРЕЩЕНО).
+2) MEMORY_CATALOG — каталог того, что вообще есть в памяти (subjects, predicates_top, event_types, counts, date_range).
+3) USER_MESSAGE — текущее сообщение пользователя.
+
+Выход — один JSON-объект по заданной схеме.
+
+Правила route:
+- tools если для ответа понадобятся инструменты.
+- chat если это болтовня, объяснение, мнение, совет, идеи без внешних действий.
+
+Правила памяти:
+- Используй только те значения subject/predicate/event_type, которые есть в MEMORY_CATALOG.
+- Не запрашивай слишком много: extended.k <= 30, episodic.k <= 15.
+- Если extended.need=false → списки пустые и k=0. С episodic — аналогично.
+- Если пользователь спрашивает “вспомни/ты помнишь/раньше/что мы решили” → episodic.need=true.
+- Если вопрос про настройки/предпочтения/железо/проекты → extended.need=true и укажи нужные predicates/subjects.
+- prefer_recent=true, если важна актуальность/последнее состояние."""
+
+
+SUMMARY_SYSTEM = """Ты ведёшь краткое содержание длинного диалога пользователя с ассистентом.
+На вход: PREVIOUS_SUMMARY (может быть пустым) и OLD_TURNS — реплики, которые уходят из контекста.
+Верни обновлённое краткое содержание: PREVIOUS_SUMMARY + главное из OLD_TURNS.
+
+Правила:
+- Сохраняй темы, решения, договорённости, открытые вопросы, важные числа и имена.
+- Не пересказывай приветствия и болтовню, не добавляй ничего от себя.
+- Пиши сжато, обычным текстом без Markdown, не длиннее 1500 символов.
+- Верни только текст краткого содержания."""
+
+def _string_list_schema(values: list[str]) -> dict[str, Any]:
+    # значения из каталога — через enum, чтобы модель не придумывала новые
+    items: dict[str, Any] = {"type": "string"}
+    if values:
+        items["enum"] = list(values)
+    return {"type": "array", "items": items}
+
+
+def turn_planner_schema(catalog: dict[str, Any]) -> dict[str, Any]:
+    """JSON-схема для format= в Ollama: route + запрос к памяти в форме MEMORY_PLANNER_SYSTEM."""
+    facts_catalog = catalog.get("facts_catalog", {}) or {}
+    episodic_catalog = catalog.get("episodic_catalog", {}) or {}
+    return {
+        "type": "object",
+        "properties": {
+            "route": {"type": "string", "enum": ["chat", "tools"]},
+            "extended": {
+                "type": "object",
+                "properties": {
+                    "need": {"type": "boolean"},
+                    "k": {"type": "integer"},
+                    "subjects": _string_list_schema(facts_catalog.get("subjects", []) or []),
+                    "predicates": _string_list_schema(facts_catalog.get("predicates_top", []) or []),
+                    "min_confidence": {"type": ["number", "null"]},
+                    "prefer_recent": {"type": "boolean"},
+                },
+                "required": ["need", "k", "subjects", "predicates", "min_confidence", "prefer_recent"],
+            },
+            "episodic": {
+                "type": "object",
+                "properties": {
+                    "need": {"type": "boolean"},
+                    "k": {"type": "integer"},
+                    "event_types": _string_list_schema(episodic_catalog.get("event_types", []) or []),
+                    "since_days": {"type": ["integer", "null"]},
+                    "min_importance": {"type": ["number", "null"]},
+                    "prefer_recent": {"type": "boolean"},
+                },
+                "required": ["need", "k", "event_types", "since_days", "min_importance", "prefer_recent"],
+            },
+        },
+        "required": ["route", "extended", "episodic"],
+    }
+
 
 def _fmt_facts(title: str, facts: list) -> str:
     if not facts:
@@ -113,7 +191,7 @@ def _fmt_facts(title: str, facts: list) -> str:
                 lines.append({"subject": sub, "predicate": pred, "value": val})
     return f"{title}: {lines}\n"
 
-def build_messages(messages: list[BaseMessage], core_facts = None, extended_facts = None, episodic_facts = None) -> list[BaseMessage]:
+def build_messages(messages: list[BaseMessage], core_facts = None, extended_facts = None, episodic_facts = None, summary: str | None = None) -> list[BaseMessage]:
     core_facts = core_facts or []
     extended_facts = extended_facts or []
     episodic_facts = episodic_facts or []
@@ -129,9 +207,15 @@ def build_messages(messages: list[BaseMessage], core_facts = None, extended_fact
 
     logger.debug("Built memory block:\n" + memory_block)
 
+    # старые ходы вырезаны из state (compact_context) — вместо них краткое содержание
+    summary_block = []
+    if summary:
+        summary_block = [SystemMessage(content=f"КРАТКОЕ СОДЕРЖАНИЕ ПРЕДЫДУЩЕГО РАЗГОВОРА:\n{summary}")]
+
     return [
         SystemMessage(content=SYSTEM_BASE),
         SystemMessage(content=memory_block),
+        *summary_block,
         *messages
     ]
 
@@ -165,4 +249,17 @@ def build_route_messages(user_message: str) -> list:
     return [
         SystemMessage(content=ROUTER_SYS),
         HumanMessage(content=f"USER_MESSAGE:\n{user_message}"),
-    ]
\ No newline at end of file
+    ]
+
+def build_turn_planner_messages(user_message: str, catalog: dict[str, Any], tools: list) -> list:
+    tools_block = "\n".join(f"- {t.name}: {(t.description or '').strip()}" for t in tools) or "- нет"
+    return [
+        SystemMessage(content=TURN_PLANNER_SYSTEM),
+        HumanMessage(content=f"TOOLS:\n{tools_block}\n\nMEMORY_CATALOG:\n{catalog}\n\nUSER_MESSAGE:\n{user_message}"),
+    ]
+
+def build_summary_messages(previous_summary: str, old_turns: str) -> list:
+    return [
+        SystemMessage(content=SUMMARY_SYSTEM),
+        HumanMessage(content=f"PREVIOUS_SUMMARY:\n{previous_summary or '(пусто)'}\n\nOLD_TURNS:\n{old_turns}"),
+    ]
@@ -0,0 +1,223 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import Counter, deque
+from typing import Any, Optional
+
+from app.core import LLM_KEEP_ALIVE, LLM_SCHEDULER_CONCURRENCY, LLM_SCHEDULER_MAX_WAIT_S, get_logger
+
+logger = get_logger(__name__)
+
+# меньше — важнее
+PRIORITY_CHAT = 0         # ответ пользователю (chat / chat_tools)
+PRIORITY_PLANNER = 1      # route и планировщик памяти — тоже до ответа, но не сам ответ
+PRIORITY_BACKGROUND = 2   # запись памяти из очереди
+
+# load_duration из ответа Ollama больше этого — модель реально грузилась с диска
+_LOAD_THRESHOLD_S = 0.5
+
+
+class _Waiter:
+    __slots__ = ("model", "priority", "enqueued_at", "future")
+
+    def __init__(self, model: str, priority: int):
+        self.model = model
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class ModelScheduler:
+    """
+    Очередь запросов к Ollama с учётом того, какая модель сейчас в памяти.
+
+    - у каждой модели своя очередь (по приоритету, затем по времени);
+    - пока есть запросы к загруженной модели, выдаются только они (до concurrency
+      одновременно): смена модели ждёт, пока текущая пачка не закончится;
+    - переключаемся раньше, если другую модель ждёт запрос важнее (chat важнее
+      планировщика и записи) или кто-то ждёт дольше max_wait_s;
+    - keep_alive на каждом запросе — чтобы Ollama не выгружала модель между ходами;
+    - swaps — наши переключения, loads — реальные загрузки (load_duration в ответе).
+    """
+    def __init__(self, *, concurrency: int = 1, max_wait_s: float = 20.0, keep_alive: Optional[str] = None):
+        self.concurrency = max(1, int(concurrency))
+        self.max_wait_s = float(max_wait_s)
+        self.keep_alive = keep_alive
+
+        self._queues: dict[str, list[tuple[int, int, _Waiter]]] = {}
+        self._seq = itertools.count()
+        self._loaded: Optional[str] = None
+        self._in_flight = 0
+
+        self.requests: Counter[str] = Counter()
+        self.swaps = 0
+        self.loads = 0
+        self._load_times: deque[float] = deque()
+        self._wait_total = 0.0
+        self._waits: deque[float] = deque(maxlen=512)
+
+    # ---------- выбор следующего запроса ----------
+
+    def _head(self, model: str) -> Optional[_Waiter]:
+        queue = self._queues.get(model)
+        while queue and queue[0][2].future.cancelled():
+            heapq.heappop(queue)
+        return queue[0][2] if queue else None
+
+    def _starving(self, waiter: _Waiter, now: float) -> bool:
+        return now - waiter.enqueued_at >= self.max_wait_s
+
+    def _pick(self) -> Optional[_Waiter]:
+        heads = {m: w for m in list(self._queues) if (w := self._head(m)) is not None}
+        if not heads:
+            return None
+
+        now = time.monotonic()
+        current = heads.get(self._loaded) if self._loaded is not None else None
+        if current is not None:
+            preempt = any(
+                w.priority < current.priority or (self._starving(w, now) and not self._starving(current, now))
+                for m, w in heads.items()
+                if m != self._loaded
+            )
+            if not preempt:
+                return current if self._in_flight < self.concurrency else None
+
+        # смена модели — только когда текущая пачка отработала
+        if self._in_flight > 0:
+            return None
+        return min(heads.values(), key=lambda w: (not self._starving(w, now), w.priority, w.enqueued_at))
+
+    def _dispatch(self) -> None:
+        while self._in_flight < self.concurrency:
+            waiter = self._pick()
+            if waiter is None:
+                return
+            heapq.heappop(self._queues[waiter.model])
+
+            if waiter.model != self._loaded:
+                if self._loaded is not None:
+                    self.swaps += 1
+                    logger.info(f"LLM scheduler: switching {self._loaded} -> {waiter.model}")
+                self._loaded = waiter.model
+
+            wait = time.monotonic() - waiter.enqueued_at
+            self._wait_total += wait
+            self._waits.append(wait)
+            self._in_flight += 1
+            waiter.future.set_result(None)
+
+    # ---------- API ----------
+
+    async def acquire(self, model: str, priority: int) -> None:
+        waiter = _Waiter(model, priority)
+        heapq.heappush(self._queues.setdefault(model, []), (priority, next(self._seq), waiter))
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            # слот могли выдать в тот же момент — вернуть
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(model, None)
+            raise
+
+    def release(self, model: str, response: Any) -> None:
+        self._in_flight -= 1
+        self.requests[model] += 1
+        self._record_load(model, response)
+        self._dispatch()
+
+    def _record_load(self, model: str, response: Any) -> None:
+        meta = getattr(response, "response_metadata", None) or {}
+        load_s = (meta.get("load_duration") or 0) / 1e9
+        if load_s < _LOAD_THRESHOLD_S:
+            return
+        now = time.monotonic()
+        self.loads += 1
+        self._load_times.append(now)
+        logger.info(f"LLM scheduler: {model} loaded in {load_s:.2f}s")
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        while self._load_times and now - self._load_times[0] > 3600:
+            self._load_times.popleft()
+        waits = sorted(self._waits)
+        total = sum(self.requests.values())
+        return {
+            "loaded": self._loaded,
+            "in_flight": self._in_flight,
+            "queued": {m: len(q) for m, q in self._queues.items() if q},
+            "requests": dict(self.requests),
+            "swaps": self.swaps,
+            "loads": self.loads,
+            "loads_last_hour": len(self._load_times),
+            "avg_wait_s": round(self._wait_total / total, 3) if total else 0.0,
+            "p95_wait_s": round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+        }
+
+
+class ScheduledChatModel:
+    """
+    Обёртка над ChatOllama (или её bind/bind_tools): ainvoke проходит через ModelScheduler.
+    bind/bind_tools/with_priority возвращают новую обёртку с тем же model.
+    """
+    def __init__(self, runnable: Any, *, model: str, scheduler: ModelScheduler, priority: int = PRIORITY_PLANNER):
+        self.runnable = runnable
+        self.model = model
+        self.scheduler = scheduler
+        self.priority = priority
+
+    def _wrap(self, runnable: Any, priority: Optional[int] = None) -> "ScheduledChatModel":
+        return ScheduledChatModel(
+            runnable,
+            model=self.model,
+            scheduler=self.scheduler,
+            priority=self.priority if priority is None else priority,
+        )
+
+    def with_priority(self, priority: int) -> "ScheduledChatModel":
+        return self._wrap(self.runnable, priority)
+
+    def bind(self, **kwargs: Any) -> "ScheduledChatModel":
+        return self._wrap(self.runnable.bind(**kwargs))
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScheduledChatModel":
+        return self._wrap(self.runnable.bind_tools(tools, **kwargs))
+
+    async def ainvoke(self, input: Any, config: Optional[dict] = None, **kwargs: Any) -> Any:
+        if self.scheduler.keep_alive is not None:
+            kwargs.setdefault("keep_alive", self.scheduler.keep_alive)
+
+        await self.scheduler.acquire(self.model, self.priority)
+        response = None
+        try:
+            response = await self.runnable.ainvoke(input, config, **kwargs)
+            return response
+        finally:
+            self.scheduler.release(self.model, response)
+
+    def __getattr__(self, name: str) -> Any:
+        # остальное (model, get_graph, ...) — как у исходной модели
+        if name == "runnable":
+            raise AttributeError(name)
+        return getattr(self.runnable, name)
+
+
+def with_priority(llm: Any, priority: int) -> Any:
+    """Приоритет для обёрнутой модели; без планировщика модель возвращается как есть."""
+    return llm.with_priority(priority) if isinstance(llm, ScheduledChatModel) else llm
+
+
+llm_scheduler = ModelScheduler(
+    concurrency=LLM_SCHEDULER_CONCURRENCY,
+    max_wait_s=LLM_SCHEDULER_MAX_WAIT_S,
+    keep_alive=LLM_KEEP_ALIVE,
+)
+
+
+async def log_llm_scheduler_stats(interval_s: float = 60.0) -> None:
+    while True:
+        await asyncio.sleep(interval_s)
+        if llm_scheduler.requests:
+            logger.info(f"LLM scheduler: {llm_scheduler.stats()}")
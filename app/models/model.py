@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Annotated
-from sqlalchemy import CheckConstraint, DateTime, Float, Index, String, Text, UniqueConstraint, func
+from sqlalchemy import BigInteger, CheckConstraint, DateTime, Float, Index, Integer, LargeBinary, String, Text, UniqueConstraint, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db.session import Base
@@ -10,6 +11,7 @@ str16 = Annotated[str, mapped_column(String(16), nullable=False)]
 str64 = Annotated[str, mapped_column(String(64), nullable=False)]
 str256 = Annotated[str, mapped_column(String(256), nullable=False)]
 txt = Annotated[str, mapped_column(Text, nullable=False)]
+vector = Annotated[bytes, mapped_column(LargeBinary, nullable=True)]
 
 
 class MemoryFacts(Base):
@@ -26,6 +28,8 @@ class MemoryFacts(Base):
 
     confidence: Mapped[float] = mapped_column(Float, nullable=True)
 
+    embedding: Mapped[vector]   # эмбеддинг "predicate: value", см. app/services/vectors.py
+
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
@@ -58,8 +62,11 @@ class EpisodicMemory(Base):
 
     importance: Mapped[float] = mapped_column(Float, nullable=False, server_default="0.0")
 
-    source_chat_id: Mapped[int] = mapped_column(nullable=True)
+    embedding: Mapped[vector]   # эмбеддинг summary
+
+    source_chat_id: Mapped[int] = mapped_column(BigInteger, nullable=True)  # id групп в Telegram не влезают в int4
     source_message_id: Mapped[int] = mapped_column(nullable=True)
+    source_part: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")  # номер эпизода в ходе (writer даёт до 2)
 
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
@@ -69,13 +76,42 @@ class EpisodicMemory(Base):
 
     __table_args__ = (
         # дедуп для Telegram (если используешь):
-        UniqueConstraint("source_chat_id", "source_message_id", name="uq_epi_source"),
+        UniqueConstraint("source_chat_id", "source_message_id", "source_part", name="uq_epi_source"),
         CheckConstraint("importance >= 0.0 and importance <= 1.0", name="ck_epi_importance"),
         Index("ix_epi_created_at", "created_at"),
         Index("ix_epi_event_type", "event_type"),
     )
 
 
+class MemoryWriteJob(Base):
+    """Очередь memory_write: задания переживают рестарт, воркеры забирают их через SKIP LOCKED."""
+    __tablename__ = "memory_write_jobs"
+
+    id: Mapped[intpk]
+
+    status: Mapped[str16] = mapped_column(String(16), nullable=False, server_default="pending")  # pending / running / failed
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)   # user/ai текст, прочитанная память, source ids
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    last_error: Mapped[str] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+    available_at: Mapped[datetime] = mapped_column(  # не раньше этого времени (backoff ретраев)
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        CheckConstraint("status in ('pending', 'running', 'failed')", name="ck_memory_write_jobs_status"),
+        Index("ix_memory_write_jobs_status_available", "status", "available_at"),
+    )
+
+
 # class Applications(Base):
 #     __tablename__ = "applications"
 
@@ -1,12 +1,76 @@
 from typing import Any, Optional
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import Row, Sequence, delete, desc, exists, select, or_, and_, func
+from sqlalchemy import DateTime, Float, Row, Sequence, String, Text, cast, delete, desc, exists, literal, null, select, or_, and_, func, union_all, update
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.models.model import *
 
 
+def _dedupe_last(rows: list[dict[str, Any]], key) -> dict[Any, dict[str, Any]]:
+    """
+    Дубликаты ключа внутри батча: побеждает последняя строка — как при построчных
+    апсертах подряд. Иначе Postgres падает с "ON CONFLICT DO UPDATE command cannot
+    affect row a second time".
+    """
+    out: dict[Any, dict[str, Any]] = {}
+    for row in rows:
+        out[key(row)] = row
+    return out
+
+
+async def add_memory_facts_repo(
+    session: AsyncSession,
+    facts: list[dict[str, Any]],
+) -> list[dict[str, Any]]:
+    """
+    Батчевый апсерт фактов по canonical_key: один multi-row INSERT ... ON CONFLICT
+    (SQLAlchemy режет на страницы по лимиту параметров asyncpg).
+
+    facts: [{"tier", "subject", "predicate", "value", "canonical_key", "confidence"?, "embedding"?}, ...]
+    Возвращает {"id", "tier", "last_seen_at"} для каждого входного факта в том же порядке;
+    дубликаты canonical_key получают одну и ту же строку (с данными последнего).
+    """
+    if not facts:
+        return []
+
+    batch = _dedupe_last(facts, lambda f: f["canonical_key"])
+    values = [
+        {
+            "tier": f["tier"],
+            "subject": f["subject"],
+            "predicate": f["predicate"],
+            "value": f["value"],
+            "canonical_key": f["canonical_key"],
+            "confidence": f.get("confidence"),
+            "embedding": f.get("embedding"),
+        }
+        for f in batch.values()
+    ]
+
+    stmt = pg_insert(MemoryFacts)
+    stmt = (
+        stmt.on_conflict_do_update(
+            index_elements=["canonical_key"],
+            set_={
+                "value": stmt.excluded.value,
+                "confidence": stmt.excluded.confidence,
+                "embedding": stmt.excluded.embedding,
+                "last_seen_at": func.now(),
+            },
+        )
+        .returning(MemoryFacts.id, MemoryFacts.canonical_key, MemoryFacts.tier, MemoryFacts.last_seen_at)
+    )
+
+    # порядок RETURNING у апсерта не гарантирован — сопоставляем по canonical_key
+    rows = {
+        r.canonical_key: {"id": int(r.id), "tier": r.tier, "last_seen_at": r.last_seen_at}
+        for r in (await session.execute(stmt, values)).all()
+    }
+    await session.flush()
+    return [dict(rows[f["canonical_key"]]) for f in facts]
+
+
 async def add_memory_fact_repo(
     session: AsyncSession,
     *,
@@ -16,34 +80,112 @@ async def add_memory_fact_repo(
     value: str,
     canonical_key: str,
     confidence: Optional[float] = None,
-) -> None:
+    embedding: Optional[bytes] = None,
+) -> dict[str, Any]:
     """
     Добавляет факт в MemoryFacts с дедупом по canonical_key.
-    Если canonical_key уже существует — обновляет value/confidence/last_seen_at.
+    Если canonical_key уже существует — обновляет value/confidence/embedding/last_seen_at.
+    embedding считается от нового value, поэтому при апсерте он тоже перезаписывается.
+    Возвращает {"id", "tier", "last_seen_at"} строки (новой или обновлённой):
+    tier при апсерте не меняется, так что он может отличаться от переданного.
     """
-    stmt = (
-        pg_insert(MemoryFacts)
-        .values(
+    rows = await add_memory_facts_repo(
+        session,
+        [dict(
             tier=tier,
             subject=subject,
             predicate=predicate,
             value=value,
             canonical_key=canonical_key,
             confidence=confidence,
-        )
-        .on_conflict_do_update(
-            index_elements=["canonical_key"],
-            set_={
-                # если хочешь НЕ затирать value всегда — скажи, сделаем merge-политику
-                "value": value,
-                "confidence": confidence,
-                "last_seen_at": datetime.now(timezone.utc),  # можно func.now(), но тут ок
-            },
-        )
+            embedding=embedding,
+        )],
     )
+    return rows[0]
+
+
+def _episode_source(ep: dict[str, Any]) -> Optional[tuple[int, int, int]]:
+    chat_id, message_id = ep.get("source_chat_id"), ep.get("source_message_id")
+    if chat_id is None or message_id is None:
+        return None
+    return chat_id, message_id, ep.get("source_part") or 0
+
+
+async def add_episodic_memories_repo(
+    session: AsyncSession,
+    episodes: list[dict[str, Any]],
+) -> list[int]:
+    """
+    Батчевая запись эпизодов, не больше двух statement'ов на батч:
+    - с source_chat_id + source_message_id — апсерт по (chat, message, source_part):
+      source_part — номер эпизода в ходе, ретрай того же хода перезаписывает свои строки;
+      внутри батча схлопываются только настоящие повторы ключа (побеждает последний);
+    - без источника — просто multi-row INSERT.
+
+    episodes: [{"event_type", "summary", "content", "importance"?, "embedding"?,
+                "source_chat_id"?, "source_message_id"?, "source_part"?}, ...]
+    Возвращает id для каждого входного эпизода в том же порядке.
+    """
+    if not episodes:
+        return []
+
+    def values(ep: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "event_type": ep["event_type"],
+            "summary": ep["summary"],
+            "content": ep["content"],
+            "importance": ep.get("importance", 0.0),
+            "embedding": ep.get("embedding"),
+            "source_chat_id": ep.get("source_chat_id"),
+            "source_message_id": ep.get("source_message_id"),
+            "source_part": ep.get("source_part") or 0,
+        }
+
+    ids: list[Optional[int]] = [None] * len(episodes)
+
+    keyed = _dedupe_last([ep for ep in episodes if _episode_source(ep) is not None], _episode_source)
+    if keyed:
+        stmt = pg_insert(EpisodicMemory)
+        stmt = (
+            stmt.on_conflict_do_update(
+                index_elements=["source_chat_id", "source_message_id", "source_part"],
+                set_={
+                    # обычно эпизод один и тот же — можно обновить summary/content/importance
+                    "event_type": stmt.excluded.event_type,
+                    "summary": stmt.excluded.summary,
+                    "content": stmt.excluded.content,
+                    "importance": stmt.excluded.importance,
+                    "embedding": stmt.excluded.embedding,
+                },
+            )
+            .returning(
+                EpisodicMemory.id,
+                EpisodicMemory.source_chat_id,
+                EpisodicMemory.source_message_id,
+                EpisodicMemory.source_part,
+            )
+        )
+        # как и у фактов, сопоставляем по ключу, а не по порядку RETURNING
+        by_source = {
+            (r.source_chat_id, r.source_message_id, r.source_part): int(r.id)
+            for r in (await session.execute(stmt, [values(ep) for ep in keyed.values()])).all()
+        }
+        for i, ep in enumerate(episodes):
+            source = _episode_source(ep)
+            if source is not None:
+                ids[i] = by_source[source]
+
+    plain = [i for i, ep in enumerate(episodes) if _episode_source(ep) is None]
+    if plain:
+        # у чистого INSERT порядок RETURNING SQLAlchemy гарантирует сам
+        stmt = pg_insert(EpisodicMemory).returning(EpisodicMemory.id, sort_by_parameter_order=True)
+        result = await session.execute(stmt, [values(episodes[i]) for i in plain])
+        for i, episode_id in zip(plain, result.scalars().all()):
+            ids[i] = int(episode_id)
 
-    await session.execute(stmt)
     await session.flush()
+    return [int(i) for i in ids]
+
 
 async def add_episodic_memory_repo(
     session: AsyncSession,
@@ -54,46 +196,30 @@ async def add_episodic_memory_repo(
     importance: float = 0.0,
     source_chat_id: Optional[int] = None,
     source_message_id: Optional[int] = None,
-) -> None:
+    source_part: int = 0,
+    embedding: Optional[bytes] = None,
+) -> int:
     """
     Добавляет эпизод в EpisodicMemory.
-    Если переданы source_chat_id и source_message_id — делает дедуп по ним.
+    Если переданы source_chat_id и source_message_id — делает дедуп по ним и source_part.
     Иначе просто вставляет новую запись.
+    embedding — вектор summary, при апсерте перезаписывается вместе с summary.
+    Возвращает id эпизода.
     """
-    values = dict(
-        event_type=event_type,
-        summary=summary,
-        content=content,
-        importance=importance,
-        source_chat_id=source_chat_id,
-        source_message_id=source_message_id,
+    ids = await add_episodic_memories_repo(
+        session,
+        [dict(
+            event_type=event_type,
+            summary=summary,
+            content=content,
+            importance=importance,
+            source_chat_id=source_chat_id,
+            source_message_id=source_message_id,
+            source_part=source_part,
+            embedding=embedding,
+        )],
     )
-
-    # Если есть источник — делаем UPSERT (дедуп)
-    if source_chat_id is not None and source_message_id is not None:
-        stmt = (
-            pg_insert(EpisodicMemory)
-            .values(**values)
-            .on_conflict_do_update(
-                index_elements=["source_chat_id", "source_message_id"],
-                set_={
-                    # обычно эпизод один и тот же — можно обновить summary/content/importance
-                    "event_type": event_type,
-                    "summary": summary,
-                    "content": content,
-                    "importance": importance,
-                    "last_seen_at": datetime.now(timezone.utc),
-                },
-            )
-        )
-        await session.execute(stmt)
-        await session.flush()
-        return
-
-    # Если источника нет — просто вставляем
-    new = EpisodicMemory(**values)
-    session.add(new)
-    await session.flush()
+    return ids[0]
 
 async def build_memory_catalog_repo(
     session: AsyncSession,
@@ -192,6 +318,82 @@ async def build_memory_catalog_repo(
 
 # ---------- READ CANDIDATES (SQL filters) ----------
 
+def _fact_candidate(r) -> dict[str, Any]:
+    return {
+        "id": r.id,
+        "subject": r.subject,
+        "predicate": r.predicate,
+        "value": r.value,
+        "confidence": float(r.confidence) if r.confidence is not None else None,
+        "last_seen_at": r.last_seen_at,
+        "embedding": r.embedding,
+    }
+
+
+def _episode_candidate(r) -> dict[str, Any]:
+    return {
+        "id": r.id,
+        "event_type": r.event_type,
+        "summary": r.summary,
+        "content": r.content,
+        "importance": float(r.importance) if r.importance is not None else 0.0,
+        "created_at": r.created_at,
+        "embedding": r.embedding,
+    }
+
+
+def _extended_where(
+    subjects: Optional[list[str]],
+    predicates: Optional[list[str]],
+    min_confidence: Optional[float],
+) -> list:
+    where = [MemoryFacts.tier == "extended"]
+    if subjects:
+        where.append(MemoryFacts.subject.in_(subjects))
+    if predicates:
+        where.append(MemoryFacts.predicate.in_(predicates))
+    if min_confidence is not None:
+        where.append(MemoryFacts.confidence >= float(min_confidence))
+    return where
+
+
+def _extended_order(prefer_recent: bool) -> list:
+    if prefer_recent:
+        return [MemoryFacts.last_seen_at.desc()]
+    return [MemoryFacts.confidence.desc().nullslast(), MemoryFacts.last_seen_at.desc()]
+
+
+def _episodic_where(
+    event_types: Optional[list[str]],
+    since_dt: Optional[datetime],
+    min_importance: Optional[float],
+) -> list:
+    where = []
+    if event_types:
+        where.append(EpisodicMemory.event_type.in_(event_types))
+    if since_dt is not None:
+        where.append(EpisodicMemory.created_at >= since_dt)
+    if min_importance is not None:
+        where.append(EpisodicMemory.importance >= float(min_importance))
+    return where
+
+
+def _episodic_order(prefer_recent: bool) -> list:
+    if prefer_recent:
+        return [EpisodicMemory.created_at.desc(), EpisodicMemory.importance.desc()]
+    return [EpisodicMemory.importance.desc(), EpisodicMemory.created_at.desc()]
+
+
+def _core_fact(r) -> dict[str, Any]:
+    return {
+        "subject": r.subject,
+        "predicate": r.predicate,
+        "value": r.value,
+        "confidence": float(r.confidence) if r.confidence is not None else None,
+        "last_seen_at": r.last_seen_at,
+    }
+
+
 async def select_core_facts_repo(
     session: AsyncSession,
     *,
@@ -211,16 +413,21 @@ async def select_core_facts_repo(
     )
 
     rows = (await session.execute(stmt)).all()
-    return [
-        {
-            "subject": r.subject,
-            "predicate": r.predicate,
-            "value": r.value,
-            "confidence": float(r.confidence) if r.confidence is not None else None,
-            "last_seen_at": r.last_seen_at,
-        }
-        for r in rows
-    ]
+    return [_core_fact(r) for r in rows]
+
+
+async def select_core_fact_rows_repo(session: AsyncSession) -> list[dict[str, Any]]:
+    """Все core-факты с id — снимок для кэша в процессе."""
+    stmt = select(
+        MemoryFacts.id,
+        MemoryFacts.subject,
+        MemoryFacts.predicate,
+        MemoryFacts.value,
+        MemoryFacts.confidence,
+        MemoryFacts.last_seen_at,
+    ).where(MemoryFacts.tier == "core")
+    rows = (await session.execute(stmt)).all()
+    return [{"id": r.id, **_core_fact(r)} for r in rows]
 
 
 async def select_extended_candidates_repo(
@@ -234,40 +441,21 @@ async def select_extended_candidates_repo(
 ) -> list[dict[str, Any]]:
     stmt = (
         select(
+            MemoryFacts.id,
             MemoryFacts.subject,
             MemoryFacts.predicate,
             MemoryFacts.value,
             MemoryFacts.confidence,
             MemoryFacts.last_seen_at,
+            MemoryFacts.embedding,
         )
-        .where(MemoryFacts.tier == "extended")
+        .where(*_extended_where(subjects, predicates, min_confidence))
+        .order_by(*_extended_order(prefer_recent))
+        .limit(candidate_limit)
     )
 
-    if subjects:
-        stmt = stmt.where(MemoryFacts.subject.in_(subjects))
-    if predicates:
-        stmt = stmt.where(MemoryFacts.predicate.in_(predicates))
-    if min_confidence is not None:
-        stmt = stmt.where(MemoryFacts.confidence >= float(min_confidence))
-
-    if prefer_recent:
-        stmt = stmt.order_by(MemoryFacts.last_seen_at.desc())
-    else:
-        stmt = stmt.order_by(MemoryFacts.confidence.desc().nullslast(), MemoryFacts.last_seen_at.desc())
-
-    stmt = stmt.limit(candidate_limit)
-
     rows = (await session.execute(stmt)).all()
-    return [
-        {
-            "subject": r.subject,
-            "predicate": r.predicate,
-            "value": r.value,
-            "confidence": float(r.confidence) if r.confidence is not None else None,
-            "last_seen_at": r.last_seen_at,
-        }
-        for r in rows
-    ]
+    return [_fact_candidate(r) for r in rows]
 
 
 async def select_episodic_candidates_repo(
@@ -280,37 +468,395 @@ async def select_episodic_candidates_repo(
     candidate_limit: int = 300,
 ) -> list[dict[str, Any]]:
     stmt = select(
+        EpisodicMemory.id,
         EpisodicMemory.event_type,
         EpisodicMemory.summary,
         EpisodicMemory.content,
         EpisodicMemory.importance,
         EpisodicMemory.created_at,
+        EpisodicMemory.embedding,
         # если у тебя есть last_seen_at — можно добавить:
         # EpisodicMemory.last_seen_at,
     )
 
-    if event_types:
-        stmt = stmt.where(EpisodicMemory.event_type.in_(event_types))
-    if since_dt is not None:
-        stmt = stmt.where(EpisodicMemory.created_at >= since_dt)
-    if min_importance is not None:
-        stmt = stmt.where(EpisodicMemory.importance >= float(min_importance))
+    stmt = (
+        stmt.where(*_episodic_where(event_types, since_dt, min_importance))
+        .order_by(*_episodic_order(prefer_recent))
+        .limit(candidate_limit)
+    )
 
-    if prefer_recent:
-        stmt = stmt.order_by(EpisodicMemory.created_at.desc(), EpisodicMemory.importance.desc())
-    else:
-        stmt = stmt.order_by(EpisodicMemory.importance.desc(), EpisodicMemory.created_at.desc())
+    rows = (await session.execute(stmt)).all()
+    return [_episode_candidate(r) for r in rows]
+
+
+async def select_facts_by_ids_repo(
+    session: AsyncSession,
+    ids: list[int],
+) -> list[dict[str, Any]]:
+    """Кандидаты-факты по списку id (например, из ANN-индекса), в том же формате."""
+    if not ids:
+        return []
+    stmt = select(
+        MemoryFacts.id,
+        MemoryFacts.subject,
+        MemoryFacts.predicate,
+        MemoryFacts.value,
+        MemoryFacts.confidence,
+        MemoryFacts.last_seen_at,
+        MemoryFacts.embedding,
+    ).where(MemoryFacts.id.in_(ids))
+    rows = (await session.execute(stmt)).all()
+    return [_fact_candidate(r) for r in rows]
+
+
+async def select_episodes_by_ids_repo(
+    session: AsyncSession,
+    ids: list[int],
+) -> list[dict[str, Any]]:
+    """Кандидаты-эпизоды по списку id, в том же формате."""
+    if not ids:
+        return []
+    stmt = select(
+        EpisodicMemory.id,
+        EpisodicMemory.event_type,
+        EpisodicMemory.summary,
+        EpisodicMemory.content,
+        EpisodicMemory.importance,
+        EpisodicMemory.created_at,
+        EpisodicMemory.embedding,
+    ).where(EpisodicMemory.id.in_(ids))
+    rows = (await session.execute(stmt)).all()
+    return [_episode_candidate(r) for r in rows]
+
+
+# ---------- ALL CANDIDATES IN ONE ROUND TRIP ----------
+
+def _fact_branch(kind: str, *where, order_by: list, limit: Optional[int] = None):
+    """
+    Ветка UNION ALL по memory_facts в общей форме строки (эпизодные колонки — NULL).
+    ord — позиция внутри ветки, порядок UNION ALL сам по себе не гарантирован.
+    """
+    stmt = select(
+        literal(kind).label("kind"),
+        func.row_number().over(order_by=order_by).label("ord"),
+        MemoryFacts.id,
+        MemoryFacts.subject,
+        MemoryFacts.predicate,
+        MemoryFacts.value,
+        MemoryFacts.confidence,
+        MemoryFacts.last_seen_at,
+        cast(null(), String).label("event_type"),
+        cast(null(), Text).label("summary"),
+        cast(null(), Text).label("content"),
+        cast(null(), Float).label("importance"),
+        cast(null(), DateTime(timezone=True)).label("created_at"),
+        MemoryFacts.embedding,
+    ).where(*where).order_by(*order_by)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return select(stmt.subquery())
+
+
+def _episode_branch(kind: str, *where, order_by: list, limit: Optional[int] = None):
+    stmt = select(
+        literal(kind).label("kind"),
+        func.row_number().over(order_by=order_by).label("ord"),
+        EpisodicMemory.id,
+        cast(null(), String).label("subject"),
+        cast(null(), String).label("predicate"),
+        cast(null(), Text).label("value"),
+        cast(null(), Float).label("confidence"),
+        cast(null(), DateTime(timezone=True)).label("last_seen_at"),
+        EpisodicMemory.event_type,
+        EpisodicMemory.summary,
+        EpisodicMemory.content,
+        EpisodicMemory.importance,
+        EpisodicMemory.created_at,
+        EpisodicMemory.embedding,
+    ).where(*where).order_by(*order_by)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return select(stmt.subquery())
+
+
+async def select_context_candidates_repo(
+    session: AsyncSession,
+    *,
+    core_limit: int = 50,
+    extended: Optional[dict[str, Any]] = None,
+    episodic: Optional[dict[str, Any]] = None,
+    extended_ids: Optional[list[int]] = None,
+    episodic_ids: Optional[list[int]] = None,
+) -> dict[str, list[dict[str, Any]]]:
+    """
+    Все кандидаты хода одним запросом (UNION ALL) — один round trip вместо трёх-пяти.
 
-    stmt = stmt.limit(candidate_limit)
+    extended — kwargs как у select_extended_candidates_repo
+        (subjects, predicates, min_confidence, prefer_recent, candidate_limit), None — ветки нет.
+    episodic — kwargs как у select_episodic_candidates_repo
+        (event_types, since_dt, min_importance, prefer_recent, candidate_limit).
+    extended_ids / episodic_ids — добор по id (ANN), как select_*_by_ids_repo.
 
+    Возвращает {"core", "extended", "extended_ids", "episodic", "episodic_ids"} в тех же форматах,
+    что и отдельные select_*_repo.
+    """
+    branches = []
+    if core_limit > 0:
+        branches.append(_fact_branch(
+            "core",
+            MemoryFacts.tier == "core",
+            order_by=[MemoryFacts.confidence.desc()],
+            limit=core_limit,
+        ))
+    if extended is not None:
+        branches.append(_fact_branch(
+            "extended",
+            *_extended_where(extended.get("subjects"), extended.get("predicates"), extended.get("min_confidence")),
+            order_by=_extended_order(extended.get("prefer_recent", True)),
+            limit=extended.get("candidate_limit", 200),
+        ))
+    if extended_ids:
+        branches.append(_fact_branch("extended_ids", MemoryFacts.id.in_(extended_ids), order_by=[MemoryFacts.id]))
+    if episodic is not None:
+        branches.append(_episode_branch(
+            "episodic",
+            *_episodic_where(episodic.get("event_types"), episodic.get("since_dt"), episodic.get("min_importance")),
+            order_by=_episodic_order(episodic.get("prefer_recent", True)),
+            limit=episodic.get("candidate_limit", 300),
+        ))
+    if episodic_ids:
+        branches.append(_episode_branch("episodic_ids", EpisodicMemory.id.in_(episodic_ids), order_by=[EpisodicMemory.id]))
+
+    out: dict[str, list[dict[str, Any]]] = {
+        "core": [], "extended": [], "extended_ids": [], "episodic": [], "episodic_ids": [],
+    }
+    if not branches:
+        return out
+
+    united = union_all(*branches).subquery()
+    stmt = select(united).order_by(united.c.kind, united.c.ord)
+
+    for r in (await session.execute(stmt)).all():
+        if r.kind == "core":
+            out["core"].append(_core_fact(r))
+        elif r.kind in ("extended", "extended_ids"):
+            out[r.kind].append(_fact_candidate(r))
+        else:
+            out[r.kind].append(_episode_candidate(r))
+    return out
+
+
+# ---------- VECTORS FOR ANN INDEX ----------
+
+async def select_fact_vectors_repo(
+    session: AsyncSession,
+    *,
+    after_id: int = 0,
+    limit: int = 5000,
+) -> list[dict[str, Any]]:
+    """Страница (keyset по id) фактов с эмбеддингами + поля для пост-фильтра."""
+    stmt = (
+        select(
+            MemoryFacts.id,
+            MemoryFacts.tier,
+            MemoryFacts.subject,
+            MemoryFacts.predicate,
+            MemoryFacts.confidence,
+            MemoryFacts.embedding,
+        )
+        .where(MemoryFacts.embedding.is_not(None), MemoryFacts.id > after_id)
+        .order_by(MemoryFacts.id.asc())
+        .limit(limit)
+    )
     rows = (await session.execute(stmt)).all()
     return [
         {
+            "id": r.id,
+            "tier": r.tier,
+            "subject": r.subject,
+            "predicate": r.predicate,
+            "confidence": float(r.confidence) if r.confidence is not None else None,
+            "embedding": r.embedding,
+        }
+        for r in rows
+    ]
+
+
+async def select_episode_vectors_repo(
+    session: AsyncSession,
+    *,
+    after_id: int = 0,
+    limit: int = 5000,
+) -> list[dict[str, Any]]:
+    """Страница (keyset по id) эпизодов с эмбеддингами + поля для пост-фильтра."""
+    stmt = (
+        select(
+            EpisodicMemory.id,
+            EpisodicMemory.event_type,
+            EpisodicMemory.importance,
+            EpisodicMemory.created_at,
+            EpisodicMemory.embedding,
+        )
+        .where(EpisodicMemory.embedding.is_not(None), EpisodicMemory.id > after_id)
+        .order_by(EpisodicMemory.id.asc())
+        .limit(limit)
+    )
+    rows = (await session.execute(stmt)).all()
+    return [
+        {
+            "id": r.id,
             "event_type": r.event_type,
-            "summary": r.summary,
-            "content": r.content,
             "importance": float(r.importance) if r.importance is not None else 0.0,
             "created_at": r.created_at,
+            "embedding": r.embedding,
         }
         for r in rows
-    ]
\ No newline at end of file
+    ]
+
+
+# ---------- EMBEDDINGS BACKFILL ----------
+
+async def select_facts_without_embedding_repo(
+    session: AsyncSession,
+    *,
+    limit: int = 64,
+) -> list[dict[str, Any]]:
+    stmt = (
+        select(MemoryFacts.id, MemoryFacts.predicate, MemoryFacts.value)
+        .where(MemoryFacts.embedding.is_(None))
+        .order_by(MemoryFacts.id.asc())
+        .limit(limit)
+    )
+    rows = (await session.execute(stmt)).all()
+    return [{"id": r.id, "predicate": r.predicate, "value": r.value} for r in rows]
+
+
+async def select_episodes_without_embedding_repo(
+    session: AsyncSession,
+    *,
+    limit: int = 64,
+) -> list[dict[str, Any]]:
+    stmt = (
+        select(EpisodicMemory.id, EpisodicMemory.summary)
+        .where(EpisodicMemory.embedding.is_(None))
+        .order_by(EpisodicMemory.id.asc())
+        .limit(limit)
+    )
+    rows = (await session.execute(stmt)).all()
+    return [{"id": r.id, "summary": r.summary} for r in rows]
+
+
+async def set_fact_embeddings_repo(
+    session: AsyncSession,
+    items: list[tuple[int, bytes]],
+) -> None:
+    """
+    items: [(id, embedding), ...]
+    Один executemany (bulk UPDATE по первичному ключу) на весь батч.
+    """
+    if not items:
+        return
+    await session.execute(
+        update(MemoryFacts),
+        [{"id": fact_id, "embedding": embedding} for fact_id, embedding in items],
+    )
+    await session.flush()
+
+
+async def set_episode_embeddings_repo(
+    session: AsyncSession,
+    items: list[tuple[int, bytes]],
+) -> None:
+    """
+    items: [(id, embedding), ...]
+    Один executemany (bulk UPDATE по первичному ключу) на весь батч.
+    """
+    if not items:
+        return
+    await session.execute(
+        update(EpisodicMemory),
+        [{"id": episode_id, "embedding": embedding} for episode_id, embedding in items],
+    )
+    await session.flush()
+
+# ---------- MEMORY WRITE QUEUE ----------
+
+async def enqueue_memory_write_job_repo(session: AsyncSession, payload: dict[str, Any]) -> int:
+    stmt = pg_insert(MemoryWriteJob).values(payload=payload).returning(MemoryWriteJob.id)
+    job_id = (await session.execute(stmt)).scalar_one()
+    await session.flush()
+    return int(job_id)
+
+
+async def claim_memory_write_jobs_repo(session: AsyncSession, *, limit: int) -> list[dict[str, Any]]:
+    """
+    Забирает до limit готовых заданий: pending -> running, attempts + 1.
+    FOR UPDATE SKIP LOCKED — несколько воркеров (и процессов) не получат одно задание дважды.
+    """
+    picked = (
+        select(MemoryWriteJob.id)
+        .where(MemoryWriteJob.status == "pending", MemoryWriteJob.available_at <= func.now())
+        .order_by(MemoryWriteJob.id.asc())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    stmt = (
+        update(MemoryWriteJob)
+        .where(MemoryWriteJob.id.in_(picked))
+        .values(status="running", attempts=MemoryWriteJob.attempts + 1, started_at=func.now())
+        .returning(MemoryWriteJob.id, MemoryWriteJob.payload, MemoryWriteJob.attempts, MemoryWriteJob.created_at)
+    )
+    rows = (await session.execute(stmt)).all()
+    return [
+        {"id": r.id, "payload": r.payload, "attempts": r.attempts, "created_at": r.created_at}
+        for r in sorted(rows, key=lambda r: r.id)
+    ]
+
+
+async def complete_memory_write_job_repo(session: AsyncSession, job_id: int) -> None:
+    # выполненные не храним — таблица остаётся маленькой
+    await session.execute(delete(MemoryWriteJob).where(MemoryWriteJob.id == job_id))
+
+
+async def retry_memory_write_job_repo(session: AsyncSession, job_id: int, *, error: str, delay: timedelta) -> None:
+    await session.execute(
+        update(MemoryWriteJob)
+        .where(MemoryWriteJob.id == job_id)
+        .values(status="pending", last_error=error, available_at=func.now() + delay, started_at=None)
+    )
+
+
+async def fail_memory_write_job_repo(session: AsyncSession, job_id: int, *, error: str) -> None:
+    """Попытки кончились — задание остаётся в таблице со status='failed' для разбора."""
+    await session.execute(
+        update(MemoryWriteJob).where(MemoryWriteJob.id == job_id).values(status="failed", last_error=error)
+    )
+
+
+async def requeue_stale_memory_write_jobs_repo(session: AsyncSession, *, older_than: timedelta) -> int:
+    """running дольше older_than — процесс упал посреди задания, возвращаем в очередь."""
+    stmt = (
+        update(MemoryWriteJob)
+        .where(MemoryWriteJob.status == "running", MemoryWriteJob.started_at < func.now() - older_than)
+        .values(status="pending", started_at=None)
+        .returning(MemoryWriteJob.id)
+    )
+    return len((await session.execute(stmt)).all())
+
+
+async def memory_write_queue_stats_repo(session: AsyncSession) -> dict[str, Any]:
+    """Глубина очереди по статусам и возраст самого старого pending (lag)."""
+    stmt = select(
+        func.count().filter(MemoryWriteJob.status == "pending"),
+        func.count().filter(MemoryWriteJob.status == "running"),
+        func.count().filter(MemoryWriteJob.status == "failed"),
+        func.min(MemoryWriteJob.created_at).filter(MemoryWriteJob.status == "pending"),
+    )
+    pending, running, failed, oldest = (await session.execute(stmt)).one()
+    lag = (datetime.now(timezone.utc) - oldest).total_seconds() if oldest is not None else 0.0
+    return {
+        "pending": int(pending),
+        "running": int(running),
+        "failed": int(failed),
+        "lag_s": round(max(lag, 0.0), 1),
+    }
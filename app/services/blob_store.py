@@ -0,0 +1,141 @@
+import asyncio
+import base64
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Any, Optional
+
+from langchain_core.messages import BaseMessage
+
+from app.core import BLOB_DIR, get_logger
+
+logger = get_logger(__name__)
+
+BLOB_SCHEME = "blob://"
+_REF = re.compile(r"^blob://([0-9a-f]{64})(\.[a-z0-9]+)?$")
+
+
+class BlobStore:
+    """
+    Локальное content-addressed хранилище картинок: файл <root>/<ab>/<sha256><ext>.
+
+    В сообщениях (и, значит, в чекпоинтах) лежит только ссылка blob://<sha256><ext>,
+    байты подставляются как data URL в момент сборки промпта. Одинаковые фото
+    хранятся один раз; file_unique_id Telegram -> ссылка запоминается, чтобы не
+    качать повторно то же фото.
+    """
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, digest: str, ext: str) -> Path:
+        return self.root / digest[:2] / f"{digest}{ext}"
+
+    def _alias_path(self, alias: str) -> Path:
+        safe = re.sub(r"[^A-Za-z0-9_-]", "_", alias)
+        return self.root / "aliases" / safe
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def _put(self, data: bytes, ext: str, alias: Optional[str]) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest, ext)
+        if not path.exists():
+            self._write_atomic(path, data)
+        ref = f"{BLOB_SCHEME}{digest}{ext}"
+        if alias:
+            self._write_atomic(self._alias_path(alias), ref.encode("ascii"))
+        return ref
+
+    async def put(self, data: bytes, *, mime: str = "image/jpeg", alias: Optional[str] = None) -> str:
+        """Сохраняет байты, возвращает ссылку blob://... ; alias — например file_unique_id."""
+        ext = mimetypes.guess_extension(mime) or ".bin"
+        return await asyncio.to_thread(self._put, data, ext, alias)
+
+    def _lookup(self, alias: str) -> Optional[str]:
+        try:
+            ref = self._alias_path(alias).read_text("ascii").strip()
+        except FileNotFoundError:
+            return None
+        path = self._file(ref)
+        return ref if path is not None and path.exists() else None
+
+    async def lookup(self, alias: str) -> Optional[str]:
+        return await asyncio.to_thread(self._lookup, alias)
+
+    def _file(self, ref: str) -> Optional[Path]:
+        m = _REF.match(ref)
+        if m is None:
+            return None
+        return self._path(m.group(1), m.group(2) or "")
+
+    def _read(self, ref: str) -> Optional[bytes]:
+        path = self._file(ref)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    async def data_url(self, ref: str) -> Optional[str]:
+        """blob://... -> data:<mime>;base64,...; None, если файла нет."""
+        data = await asyncio.to_thread(self._read, ref)
+        if data is None:
+            return None
+        mime = mimetypes.guess_type(f"x{Path(ref).suffix}")[0] or "application/octet-stream"
+        return f"data:{mime};base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+blob_store = BlobStore(BLOB_DIR)
+
+
+def _image_url(part: Any) -> Optional[str]:
+    if not isinstance(part, dict) or part.get("type") != "image_url":
+        return None
+    url = part.get("image_url")
+    if isinstance(url, dict):
+        url = url.get("url")
+    return url if isinstance(url, str) else None
+
+
+async def resolve_blob_refs(messages: list[BaseMessage]) -> list[BaseMessage]:
+    """
+    Подставляет байты картинок вместо blob://-ссылок — только в копии для вызова модели,
+    state и чекпоинт остаются со ссылками. Старые data URL проходят как есть.
+    """
+    out: list[BaseMessage] = []
+    for m in messages:
+        if not isinstance(m.content, list) or not any(
+            (_image_url(p) or "").startswith(BLOB_SCHEME) for p in m.content
+        ):
+            out.append(m)
+            continue
+
+        content = []
+        for part in m.content:
+            url = _image_url(part)
+            if url is None or not url.startswith(BLOB_SCHEME):
+                content.append(part)
+                continue
+            data_url = await blob_store.data_url(url)
+            if data_url is None:
+                logger.warning(f"Blob not found: {url}")
+                content.append({"type": "text", "text": "[изображение недоступно]"})
+            else:
+                image_url = part["image_url"]
+                content.append({**part, "image_url": {**image_url, "url": data_url} if isinstance(image_url, dict) else data_url})
+        out.append(m.model_copy(update={"content": content}))
+    return out
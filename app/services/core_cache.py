@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import time
+from typing import Any, Optional
+
+from app.core import get_logger
+from app.db.session import session_factory
+from app.repository.repo import select_core_fact_rows_repo
+
+logger = get_logger(__name__)
+
+
+def _order_key(fact: dict[str, Any]) -> tuple:
+    # как ORDER BY confidence DESC в Postgres: NULL идут первыми
+    conf = fact.get("confidence")
+    return (conf is None, conf if conf is not None else 0.0)
+
+
+class CoreFactsCache:
+    """
+    Все core-факты в памяти процесса (их мало и меняются они только через add_memory_fact).
+
+    - load() — снимок из БД (на старте и при reconcile);
+    - upsert()/remove() — write-through сразу после коммита записи;
+    - top(limit) — то же, что select_core_facts_repo, но без похода в БД.
+
+    Записи, пришедшие пока грузился снимок, накладываются поверх него,
+    чтобы reconcile не откатил свежий апсерт.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._facts: dict[int, dict[str, Any]] = {}
+        self._sorted: Optional[list[dict[str, Any]]] = None
+        self._loaded = False
+        self._pending: Optional[dict[int, Optional[dict[str, Any]]]] = None  # записи во время load()
+
+        self.loaded_at = 0.0
+        self.reads = 0
+        self.writes = 0
+        self.reconciles = 0
+        self.drift = 0      # расхождений, найденных reconcile (записи мимо процесса)
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded
+
+    def __len__(self) -> int:
+        return len(self._facts)
+
+    def _set(self, fact_id: int, fact: Optional[dict[str, Any]]) -> None:
+        if fact is None:
+            self._facts.pop(fact_id, None)
+        else:
+            self._facts[fact_id] = fact
+        self._sorted = None
+        if self._pending is not None:
+            self._pending[fact_id] = fact
+
+    def upsert(self, fact_id: int, fact: dict[str, Any]) -> None:
+        fact = {
+            "subject": fact.get("subject"),
+            "predicate": fact.get("predicate"),
+            "value": fact.get("value"),
+            "confidence": float(fact["confidence"]) if fact.get("confidence") is not None else None,
+            "last_seen_at": fact.get("last_seen_at"),
+        }
+        with self._lock:
+            self._set(int(fact_id), fact)
+            self.writes += 1
+
+    def remove(self, fact_id: int) -> None:
+        with self._lock:
+            self._set(int(fact_id), None)
+            self.writes += 1
+
+    def top(self, limit: int = 50) -> list[dict[str, Any]]:
+        with self._lock:
+            if self._sorted is None:
+                self._sorted = sorted(self._facts.values(), key=_order_key, reverse=True)
+            self.reads += 1
+            return [dict(f) for f in self._sorted[:limit]]
+
+    async def load(self) -> int:
+        """Снимок из БД. Возвращает, сколько фактов разошлось с тем, что было в кэше."""
+        with self._lock:
+            self._pending = {}
+
+        try:
+            async with session_factory() as session:
+                rows = await select_core_fact_rows_repo(session)
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+
+        snapshot = {r.pop("id"): r for r in rows}
+        with self._lock:
+            pending, self._pending = self._pending or {}, None
+            for fact_id, fact in pending.items():
+                if fact is None:
+                    snapshot.pop(fact_id, None)
+                else:
+                    snapshot[fact_id] = fact
+
+            drift = 0
+            if self._loaded:
+                drift = sum(1 for k in snapshot.keys() | self._facts.keys() if snapshot.get(k) != self._facts.get(k))
+                self.reconciles += 1
+                self.drift += drift
+
+            self._facts = snapshot
+            self._sorted = None
+            self._loaded = True
+            self.loaded_at = time.monotonic()
+        return drift
+
+    def stats(self) -> dict:
+        return {
+            "facts": len(self._facts),
+            "reads": self.reads,
+            "writes": self.writes,
+            "reconciles": self.reconciles,
+            "drift": self.drift,
+        }
+
+
+core_facts_cache = CoreFactsCache()
+
+
+async def load_core_facts() -> None:
+    await core_facts_cache.load()
+    logger.info(f"Core facts cache loaded: {core_facts_cache.stats()}")
+
+
+async def reconcile_core_facts(interval_s: float) -> None:
+    """
+    Периодическая сверка с Postgres: при нескольких процессах чужие записи
+    в этот кэш через write-through не попадают.
+    """
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            drift = await core_facts_cache.load()
+            if drift:
+                logger.info(f"Core facts cache reconciled: drift={drift} {core_facts_cache.stats()}")
+        except Exception as e:
+            logger.warning(f"Core facts reconcile failed: {e}")
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from typing import Any, Optional
+
+from app.core import MEMORY_CATALOG_TTL_S, get_logger
+from app.db.session import session_factory
+from app.repository.repo import build_memory_catalog_repo
+
+logger = get_logger(__name__)
+
+
+def _catalog_labels(catalog: dict[str, Any]) -> tuple:
+    """Метки, от которых зависят решения планировщика: subjects / predicates / event_types."""
+    facts = catalog.get("facts_catalog", {}) or {}
+    episodic = catalog.get("episodic_catalog", {}) or {}
+    return (
+        tuple(facts.get("subjects", []) or []),
+        tuple(facts.get("predicates_top", []) or []),
+        tuple(episodic.get("event_types", []) or []),
+    )
+
+
+class MemoryCatalogCache:
+    """
+    Каталог памяти в процессе + счётчик версий.
+
+    Версия растёт на каждой записи в память (bump), каталог пересобирается
+    только при первом чтении после изменения. ttl_s — страховка от записей
+    мимо процесса (init_db, ручной SQL); 0 — без TTL.
+
+    labels_version — отдельный счётчик для кэшей планировщика: растёт, только если
+    после пересборки поменялись метки (subjects / predicates / event_types), а не
+    на каждой записи — иначе почти каждый ход сбрасывал бы кэш решений.
+    """
+    def __init__(self, ttl_s: float = 0.0):
+        self.ttl_s = max(0.0, float(ttl_s))
+        self._version = 0
+        self._built_version = -1
+        self._built_at = 0.0
+        self._catalog: Optional[dict[str, Any]] = None
+        self._labels: Optional[tuple] = None
+        self._labels_version = 0
+        self._lock = asyncio.Lock()
+
+        self.hits = 0
+        self.rebuilds = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def labels_version(self) -> int:
+        return self._labels_version
+
+    def bump(self) -> int:
+        self._version += 1
+        return self._version
+
+    def _fresh(self) -> bool:
+        if self._catalog is None or self._built_version != self._version:
+            return False
+        return not self.ttl_s or time.monotonic() - self._built_at < self.ttl_s
+
+    async def get(self) -> dict[str, Any]:
+        if self._fresh():
+            self.hits += 1
+            return self._catalog
+
+        async with self._lock:
+            # пока ждали лок, каталог мог пересобрать соседний запрос
+            if self._fresh():
+                self.hits += 1
+                return self._catalog
+
+            version = self._version
+            t0 = time.perf_counter()
+            async with session_factory() as session:
+                catalog = await build_memory_catalog_repo(session)
+
+            # если за время сборки была запись — версия уже другая, следующий get пересоберёт
+            labels = _catalog_labels(catalog)
+            if labels != self._labels:
+                self._labels = labels
+                self._labels_version += 1
+            self._catalog = catalog
+            self._built_version = version
+            self._built_at = time.monotonic()
+            self.rebuilds += 1
+            logger.debug(f"Memory catalog rebuilt: version={version} {round((time.perf_counter() - t0) * 1000, 1)}ms")
+            return catalog
+
+    def stats(self) -> dict:
+        total = self.hits + self.rebuilds
+        return {
+            "version": self._version,
+            "labels_version": self._labels_version,
+            "hits": self.hits,
+            "rebuilds": self.rebuilds,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+memory_catalog = MemoryCatalogCache(ttl_s=MEMORY_CATALOG_TTL_S)
+
+
+def catalog_version() -> int:
+    """Версия меток каталога — ключ кэшей планировщика. Читать после build_memory_catalog()."""
+    return memory_catalog.labels_version
+
+
+def bump_catalog_version() -> int:
+    return memory_catalog.bump()
@@ -0,0 +1,154 @@
+import random
+import re
+from collections import Counter
+from typing import Any, NamedTuple
+
+import numpy as np
+
+from app.core import (
+    MEMORY_GATE_ENABLED,
+    MEMORY_GATE_KNOWN_SIM,
+    MEMORY_GATE_MIN_CHARS,
+    MEMORY_GATE_SAMPLE_RATE,
+    get_logger,
+)
+from app.llm.embedding import encode_texts
+from app.services.memory_planner import has_memory_hints, is_small_talk
+from app.services.service_db import QueryContext, fact_text, prepare_embeddings
+
+logger = get_logger(__name__)
+
+
+# "запомни", "меня зовут", "я живу в ..." — пишем всегда, остальные сигналы не смотрим
+_REMEMBER_HINTS = re.compile(
+    r"(запомни|запиши|не забудь|меня зовут|зови меня|я живу|я работаю|мне \d+ (год|лет)|мой день рождения|"
+    r"теперь (у меня|я)|больше не|remember|note that|my name is|call me|i live|i work)",
+    re.IGNORECASE,
+)
+
+
+class GateDecision(NamedTuple):
+    """skip — LLM-вызов записи не нужен; sampled — пропуск, который всё равно проверяется LLM."""
+    skip: bool
+    reason: str
+    sampled: bool = False
+    score: float = 0.0
+
+
+class MemoryWriteGate:
+    """
+    Дешёвый фильтр перед LLM-вызовом memory_write. Сигналы по порядку:
+
+    - remember-подсказка -> пишем;
+    - болтовня ("привет", "спасибо", "ок") -> пропуск;
+    - короткое сообщение без подсказок про память -> пропуск;
+    - ход ушёл в tools, а личного в сообщении нет ("который час") -> пропуск;
+    - сообщение почти совпадает с уже прочитанным core/extended фактом -> пропуск.
+
+    Доля sample_rate пропусков всё равно идёт в LLM: если та что-то записала —
+    это ложный пропуск, он логируется вместе с причиной.
+    """
+    def __init__(
+        self,
+        *,
+        enabled: bool = True,
+        min_chars: int = 15,
+        known_sim: float = 0.92,
+        sample_rate: float = 0.05,
+        log_every: int = 100,
+    ):
+        self.enabled = enabled
+        self.min_chars = max(0, int(min_chars))
+        self.known_sim = float(known_sim)
+        self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        self.log_every = max(1, int(log_every))
+
+        self.decisions: Counter[str] = Counter()
+        self.total = 0
+        self.skipped = 0
+        self.sampled = 0
+        self.false_negatives = 0
+        self.empty_writes = 0   # прошли фильтр, но LLM ничего не записала
+
+    async def _known_similarity(self, user_text: str, facts: list[dict[str, Any]]) -> float:
+        texts = [fact_text(f.get("predicate"), f.get("value")) for f in facts if f.get("value")]
+        if not texts:
+            return 0.0
+        # вектор сообщения уже в LRU EmbeddingModel после memory_read, тексты core-фактов — после первых ходов
+        query_vec = (await QueryContext(user_text).embedding())[0]
+        fact_vecs = prepare_embeddings(await encode_texts(texts))
+        return float(np.max(fact_vecs @ query_vec))
+
+    async def _assess(self, payload: dict[str, Any]) -> GateDecision:
+        user_text = (payload.get("user_text") or "").strip()
+
+        if _REMEMBER_HINTS.search(user_text):
+            return GateDecision(False, "remember_hint")
+        if not user_text or is_small_talk(user_text):
+            return GateDecision(True, "small_talk")
+
+        hinted = has_memory_hints(user_text)
+        if len(user_text) < self.min_chars and not hinted:
+            return GateDecision(True, "short")
+        if payload.get("tools_used") and not hinted:
+            return GateDecision(True, "tool_only")
+
+        facts = list(payload.get("core_facts") or []) + list(payload.get("extended_facts") or [])
+        try:
+            sim = await self._known_similarity(user_text, facts)
+        except Exception as e:
+            logger.warning(f"Memory gate: similarity failed, not skipping: {e}")
+            return GateDecision(False, "novel")
+        if sim >= self.known_sim:
+            return GateDecision(True, "known", score=sim)
+        return GateDecision(False, "novel", score=sim)
+
+    async def assess(self, payload: dict[str, Any]) -> GateDecision:
+        if not self.enabled:
+            return GateDecision(False, "disabled")
+
+        decision = await self._assess(payload)
+        if decision.skip and random.random() < self.sample_rate:
+            decision = decision._replace(sampled=True)
+
+        self.total += 1
+        self.decisions[decision.reason] += 1
+        if decision.skip:
+            self.skipped += 1
+        if decision.sampled:
+            self.sampled += 1
+
+        logger.debug(f"Memory gate: {decision}")
+        if self.total % self.log_every == 0:
+            logger.info(f"Memory gate: {self.stats()}")
+        return decision
+
+    def record(self, decision: GateDecision, payload: dict[str, Any], written: int) -> None:
+        """Итог LLM-вызова для хода, прошедшего через assess()."""
+        if decision.sampled and written:
+            self.false_negatives += 1
+            logger.info(
+                f"Memory gate false negative: reason={decision.reason} score={decision.score:.2f} "
+                f"written={written} user_text={(payload.get('user_text') or '')[:200]!r}"
+            )
+        elif not decision.skip and not written:
+            self.empty_writes += 1
+
+    def stats(self) -> dict:
+        return {
+            "total": self.total,
+            "skip_rate": round(self.skipped / self.total, 4) if self.total else 0.0,
+            "reasons": dict(self.decisions),
+            "sampled": self.sampled,
+            "false_negatives": self.false_negatives,
+            "fn_rate": round(self.false_negatives / self.sampled, 4) if self.sampled else 0.0,
+            "empty_writes": self.empty_writes,
+        }
+
+
+memory_gate = MemoryWriteGate(
+    enabled=MEMORY_GATE_ENABLED,
+    min_chars=MEMORY_GATE_MIN_CHARS,
+    known_sim=MEMORY_GATE_KNOWN_SIM,
+    sample_rate=MEMORY_GATE_SAMPLE_RATE,
+)
@@ -0,0 +1,248 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from app.core import (
+    EMBEDDING_STORAGE_DTYPE,
+    MEMORY_INDEX_ENABLED,
+    MEMORY_INDEX_NPROBE,
+    MEMORY_INDEX_TRAIN_THRESHOLD,
+    get_logger,
+)
+from app.db.session import session_factory
+from app.repository.repo import select_episode_vectors_repo, select_fact_vectors_repo
+from app.services.vector_index import VectorIndex
+from app.services.vectors import unpack_vector
+
+logger = get_logger(__name__)
+
+
+# Процессные ANN-индексы по всей памяти. Грузятся на старте (load_memory_index),
+# дальше обновляются инкрементально из add_memory_fact / add_episodic_memory.
+fact_index = VectorIndex(
+    nprobe=MEMORY_INDEX_NPROBE,
+    train_threshold=MEMORY_INDEX_TRAIN_THRESHOLD,
+    dtype=EMBEDDING_STORAGE_DTYPE,
+)
+episode_index = VectorIndex(
+    nprobe=MEMORY_INDEX_NPROBE,
+    train_threshold=MEMORY_INDEX_TRAIN_THRESHOLD,
+    dtype=EMBEDDING_STORAGE_DTYPE,
+)
+
+_loaded = False
+_training: set[int] = set()
+_rebuilding: set[int] = set()
+_tasks: set[asyncio.Task] = set()
+
+
+def index_ready() -> bool:
+    return MEMORY_INDEX_ENABLED and _loaded
+
+
+def _ts(dt: Optional[datetime]) -> float:
+    return float(dt.timestamp()) if dt is not None else 0.0
+
+
+def fact_meta(row: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "tier": row.get("tier"),
+        "subject": row.get("subject"),
+        "predicate": row.get("predicate"),
+        "confidence": row.get("confidence"),
+    }
+
+
+def episode_meta(row: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "event_type": row.get("event_type"),
+        "importance": row.get("importance"),
+        "created_ts": _ts(row.get("created_at")),
+    }
+
+
+# имя -> (индекс, постраничная выборка из БД, meta строки): загрузка и перестройка
+_SOURCES: dict[str, tuple[VectorIndex, Callable, Callable]] = {
+    "facts": (fact_index, select_fact_vectors_repo, fact_meta),
+    "episodic": (episode_index, select_episode_vectors_repo, episode_meta),
+}
+
+
+async def _maybe_train(index: VectorIndex, name: str) -> None:
+    # обучение k-means — в потоке, чтобы не блокировать event loop
+    if not index.needs_training() or id(index) in _training:
+        return
+    _training.add(id(index))
+    try:
+        t0 = time.perf_counter()
+        await asyncio.to_thread(index.train)
+        logger.info(f"ANN index '{name}' trained on {len(index)} vectors in {(time.perf_counter() - t0) * 1000:.0f}ms")
+    finally:
+        _training.discard(id(index))
+
+
+async def _load(
+    index: VectorIndex,
+    name: str,
+    select_page: Callable,
+    meta: Callable,
+    *,
+    dim: Optional[int] = None,
+    page_size: int = 5000,
+) -> None:
+    """
+    Заливает индекс из БД постранично. dim=None — размерность задаёт первая строка.
+    Строки другой размерности (записаны до смены модели / EMBEDDING_STORAGE_DIM)
+    в индекс не попадают: их векторы несравнимы с запросами.
+    """
+    skipped = 0
+    after_id = 0
+    while True:
+        async with session_factory() as session:
+            rows = await select_page(session, after_id=after_id, limit=page_size)
+        if not rows:
+            break
+        for r in rows:
+            vec = unpack_vector(r["embedding"], dim)
+            if vec is None or not index.add(r["id"], vec, meta(r)):
+                skipped += r["embedding"] is not None
+        after_id = rows[-1]["id"]
+
+    if skipped:
+        logger.warning(
+            f"ANN index '{name}': skipped {skipped} vectors with dim != {index.dim} "
+            f"(embedding model or EMBEDDING_STORAGE_DIM changed?)"
+        )
+
+
+async def load_memory_index(page_size: int = 5000) -> None:
+    """Полная (пере)загрузка индексов из БД постранично."""
+    global _loaded
+    if not MEMORY_INDEX_ENABLED:
+        return
+
+    t0 = time.perf_counter()
+    fact_index.clear()
+    episode_index.clear()
+
+    for name, (index, select_page, meta) in _SOURCES.items():
+        await _load(index, name, select_page, meta, page_size=page_size)
+
+    _loaded = True
+    logger.info(
+        f"ANN index loaded: facts={len(fact_index)} episodic={len(episode_index)} "
+        f"dtype={EMBEDDING_STORAGE_DTYPE} bytes={fact_index.nbytes() + episode_index.nbytes()} in {(time.perf_counter() - t0) * 1000:.0f}ms"
+    )
+
+    await _maybe_train(fact_index, "facts")
+    await _maybe_train(episode_index, "episodic")
+
+
+async def _rebuild(name: str, dim: int) -> None:
+    index, select_page, meta = _SOURCES[name]
+    t0 = time.perf_counter()
+    try:
+        index.clear()
+        await _load(index, name, select_page, meta, dim=dim)
+        logger.info(f"ANN index '{name}' rebuilt for dim={dim}: {len(index)} vectors in {(time.perf_counter() - t0) * 1000:.0f}ms")
+        await _maybe_train(index, name)
+    except Exception:
+        logger.exception(f"ANN index '{name}' rebuild failed")
+    finally:
+        _rebuilding.discard(id(index))
+
+
+def _check_dim(name: str, vec: np.ndarray) -> bool:
+    """
+    Размерность векторов сменилась (модель / EMBEDDING_STORAGE_DIM), а индекс ещё
+    на старой — он бы молча отдавал []. Пишем warning и перестраиваем индекс в фоне
+    под новую размерность; до конца перестройки ANN-кандидатов нет, остаётся SQL.
+    """
+    index = _SOURCES[name][0]
+    dim = int(np.asarray(vec).reshape(-1).shape[0])
+    if index.dim is None or index.dim == dim:
+        return True
+    if id(index) not in _rebuilding:
+        logger.warning(f"ANN index '{name}': vector dim {dim} != index dim {index.dim}, rebuilding")
+        _rebuilding.add(id(index))
+        task = asyncio.get_running_loop().create_task(_rebuild(name, dim))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+    return False
+
+
+async def index_facts(items: list[tuple[int, np.ndarray, dict[str, Any]]]) -> None:
+    """items: [(id, normalized_vec, fact_row), ...] — сразу после коммита записи."""
+    if not index_ready():
+        return
+    if items and not _check_dim("facts", items[0][1]):
+        # строки уже в БД — перестройка их подхватит
+        return
+    fact_index.add_many((i, v, fact_meta(row)) for i, v, row in items)
+    await _maybe_train(fact_index, "facts")
+
+
+async def index_episodes(items: list[tuple[int, np.ndarray, dict[str, Any]]]) -> None:
+    if not index_ready():
+        return
+    if items and not _check_dim("episodic", items[0][1]):
+        return
+    episode_index.add_many((i, v, episode_meta(row)) for i, v, row in items)
+    await _maybe_train(episode_index, "episodic")
+
+
+def _extended_filter(ext: dict[str, Any]) -> Callable[[dict[str, Any]], bool]:
+    # те же условия, что и в select_extended_candidates_repo, только пост-фильтром
+    subjects = set(ext.get("subjects") or [])
+    predicates = set(ext.get("predicates") or [])
+    min_confidence = ext.get("min_confidence")
+
+    def allow(m: dict[str, Any]) -> bool:
+        if m.get("tier") != "extended":
+            return False
+        if subjects and m.get("subject") not in subjects:
+            return False
+        if predicates and m.get("predicate") not in predicates:
+            return False
+        if min_confidence is not None and (m.get("confidence") is None or m["confidence"] < float(min_confidence)):
+            return False
+        return True
+
+    return allow
+
+
+def _episodic_filter(epi: dict[str, Any], since_dt: Optional[datetime]) -> Callable[[dict[str, Any]], bool]:
+    event_types = set(epi.get("event_types") or [])
+    min_importance = epi.get("min_importance")
+    since_ts = _ts(since_dt) if since_dt is not None else None
+
+    def allow(m: dict[str, Any]) -> bool:
+        if event_types and m.get("event_type") not in event_types:
+            return False
+        if min_importance is not None and (m.get("importance") or 0.0) < float(min_importance):
+            return False
+        if since_ts is not None and m.get("created_ts", 0.0) < since_ts:
+            return False
+        return True
+
+    return allow
+
+
+def search_extended_ids(query_vec: np.ndarray, ext: dict[str, Any], k: int) -> list[int]:
+    if not index_ready() or not _check_dim("facts", query_vec):
+        return []
+    return [i for i, _ in fact_index.search(query_vec, k, allow=_extended_filter(ext))]
+
+
+def search_episodic_ids(
+    query_vec: np.ndarray,
+    epi: dict[str, Any],
+    k: int,
+    since_dt: Optional[datetime] = None,
+) -> list[int]:
+    if not index_ready() or not _check_dim("episodic", query_vec):
+        return []
+    return [i for i, _ in episode_index.search(query_vec, k, allow=_episodic_filter(epi, since_dt))]
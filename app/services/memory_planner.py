@@ -0,0 +1,204 @@
+import re
+from typing import Any, NamedTuple, Optional
+
+import numpy as np
+
+from app.core import EMBEDDING_STORAGE_DIM, MEMORY_PLANNER_SIM_THRESHOLD, get_logger
+from app.llm.embedding import encode_texts
+from app.services.memory_catalog import catalog_version
+from app.services.service_db import QueryContext
+from app.services.vectors import reduce_dim
+
+logger = get_logger(__name__)
+
+
+class LocalPlan(NamedTuple):
+    """Запрос к памяти в формате ответа LLM-планировщика + уверенность 0..1."""
+    request: dict[str, Any]
+    confidence: float
+    reasons: list[str]
+
+
+# ---------- правила по ключевым словам ----------
+
+# болтовня без запроса к памяти — план "ничего не доставать" с высокой уверенностью
+_SMALL_TALK = re.compile(
+    r"^\W*(привет\w*|здравствуй\w*|добр\w+ (утро|день|вечер)|хай|ку|спасибо|спс|благодарю|ок(ей)?|"
+    r"понятно|ясно|отлично|супер|хорошо|ага|угу|да|нет|пока|hi|hello|hey|thanks?|thank you|ok(ay)?|bye)\W*$",
+    re.IGNORECASE,
+)
+
+# "вспомни/помнишь/раньше/что мы решили" — нужна история
+_EPISODIC_HINTS = re.compile(
+    r"(вспомн|помнишь|помните|раньше|ранее|прошл\w* раз|что мы (решили|обсуждали|делали)|"
+    r"мы (обсуждали|говорили|решили)|говорил[аи]? тебе|недавно|вчера|позавчера|на (этой|прошлой) неделе|"
+    r"в прошлом месяце|ошибк|remember|last time|earlier|previously|we (discussed|decided))",
+    re.IGNORECASE,
+)
+
+# настройки/предпочтения/железо/проекты — нужны extended факты
+_EXTENDED_HINTS = re.compile(
+    r"(у меня|мо[йяеи]\b|моего|моей|моих|предпоч|нравит|люблю|настро[йи]|конфиг|желез|видеокарт|"
+    r"процессор|\bgpu\b|\bcpu\b|\bram\b|памят[ьи] (пк|компа)|проект|стек|my |i prefer|i like|my setup)",
+    re.IGNORECASE,
+)
+
+# ключевое слово -> since_days
+_SINCE_DAYS = (
+    (re.compile(r"сегодня|today", re.IGNORECASE), 1),
+    (re.compile(r"позавчера", re.IGNORECASE), 3),
+    (re.compile(r"вчера|yesterday", re.IGNORECASE), 2),
+    (re.compile(r"недел|week", re.IGNORECASE), 14),
+    (re.compile(r"месяц|month", re.IGNORECASE), 62),
+)
+
+
+def is_small_talk(text: str) -> bool:
+    return bool(_SMALL_TALK.match(text or ""))
+
+
+def has_memory_hints(text: str) -> bool:
+    """Есть ли в тексте ключевые слова про личные данные или историю."""
+    return bool(_EXTENDED_HINTS.search(text or "") or _EPISODIC_HINTS.search(text or ""))
+
+
+def _since_days(text: str) -> Optional[int]:
+    for pattern, days in _SINCE_DAYS:
+        if pattern.search(text):
+            return days
+    return None
+
+
+# ---------- сходство с каталогом ----------
+
+def _label_text(label: str) -> str:
+    # project:eva -> "project eva", prefers_sqlalchemy_style -> "prefers sqlalchemy style"
+    return re.sub(r"[_:/\-.]+", " ", label).strip()
+
+
+_labels_cache: dict[str, Any] = {"version": None, "labels": {}, "vectors": {}}
+
+
+async def _catalog_vectors(catalog: dict[str, Any]) -> dict[str, tuple[list[str], np.ndarray]]:
+    """
+    Векторы меток каталога (subjects / predicates / event_types). Пересчёт — только
+    после смены меток каталога; сами тексты ещё и в LRU-кэше EmbeddingModel.
+    """
+    version = catalog_version()
+    groups = {
+        "subjects": list(catalog.get("facts_catalog", {}).get("subjects", []) or []),
+        "predicates": list(catalog.get("facts_catalog", {}).get("predicates_top", []) or []),
+        "event_types": list(catalog.get("episodic_catalog", {}).get("event_types", []) or []),
+    }
+    if _labels_cache["version"] == version and _labels_cache["labels"] == groups:
+        return {name: (groups[name], _labels_cache["vectors"][name]) for name in groups}
+
+    flat = [_label_text(label) for name in groups for label in groups[name]]
+    encoded = reduce_dim(await encode_texts(flat), EMBEDDING_STORAGE_DIM) if flat else None
+
+    vectors: dict[str, np.ndarray] = {}
+    offset = 0
+    for name, labels in groups.items():
+        vectors[name] = encoded[offset: offset + len(labels)] if labels else np.empty((0, 0), dtype=np.float32)
+        offset += len(labels)
+
+    _labels_cache.update(version=version, labels=groups, vectors=vectors)
+    return {name: (groups[name], vectors[name]) for name in groups}
+
+
+def _matches(
+    text: str,
+    query_vec: np.ndarray,
+    labels: list[str],
+    vectors: np.ndarray,
+    *,
+    threshold: float,
+    top: int,
+) -> tuple[list[str], list[str], float]:
+    """
+    (выше порога, top по сходству, лучший скор). Метка, встречающаяся в тексте
+    дословно, считается совпадением со скором 1.0.
+    """
+    if not labels:
+        return [], [], 0.0
+
+    sims = vectors @ query_vec if vectors.size else np.zeros(len(labels), dtype=np.float32)
+    lowered = text.lower()
+    names = [_label_text(label).lower() for label in labels]
+    literal = np.fromiter((len(n) > 2 and n in lowered for n in names), dtype=bool, count=len(labels))
+    sims = np.where(literal, 1.0, sims)
+
+    order = np.argsort(-sims)
+    above = [labels[i] for i in order if sims[i] >= threshold]
+    return above, [labels[i] for i in order[:top]], float(sims[order[0]])
+
+
+def _branch_confidence(best: float, threshold: float, margin: float, hinted: bool) -> float:
+    """
+    Уверенность решения по ветке: ключевое слово — 0.9; иначе чем дальше лучший скор
+    от порога (в любую сторону), тем увереннее; в пределах margin — около 0.5.
+    """
+    if hinted:
+        return 0.9
+    return float(np.clip(0.5 + 0.5 * abs(best - threshold) / margin, 0.5, 1.0))
+
+
+async def plan_memory_request(
+    user_message: str,
+    catalog: dict[str, Any],
+    query: Optional[QueryContext] = None,
+    *,
+    threshold: float = MEMORY_PLANNER_SIM_THRESHOLD,
+    margin: float = 0.1,
+    extended_k: int = 10,
+    episodic_k: int = 5,
+) -> LocalPlan:
+    """
+    Локальный планировщик: ключевые слова + сходство эмбеддинга сообщения с метками каталога.
+    Возвращает запрос в той же форме, что и LLM-планировщик (дальше — normalize_memory_request).
+    """
+    text = (user_message or "").strip()
+    request: dict[str, Any] = {
+        "extended": {"need": False, "k": 0, "subjects": [], "predicates": [], "min_confidence": None, "prefer_recent": True},
+        "episodic": {"need": False, "k": 0, "event_types": [], "since_days": None, "min_importance": None, "prefer_recent": True},
+    }
+
+    if not text or is_small_talk(text):
+        return LocalPlan(request, 0.95, ["small_talk"])
+
+    query = query or QueryContext(text)
+    query_vec = (await query.embedding())[0]
+    groups = await _catalog_vectors(catalog)
+
+    def match(name: str) -> tuple[list[str], list[str], float]:
+        labels, vectors = groups[name]
+        return _matches(text, query_vec, labels, vectors, threshold=threshold, top=3)
+
+    reasons: list[str] = []
+
+    # extended: subjects/predicates по сходству, ключевые слова добирают top-3 предиката
+    subj_above, subj_top, subj_best = match("subjects")
+    pred_above, pred_top, pred_best = match("predicates")
+    ext_hint = bool(_EXTENDED_HINTS.search(text))
+    ext_best = max(subj_best, pred_best)
+    if ext_hint or ext_best >= threshold:
+        predicates = pred_above or (pred_top if ext_hint else [])
+        subjects = subj_above
+        if predicates or subjects:
+            request["extended"].update(need=True, k=extended_k, subjects=subjects, predicates=predicates)
+            reasons.append(f"extended:{'hint' if ext_hint else 'sim'}={ext_best:.2f}")
+    ext_conf = _branch_confidence(ext_best, threshold, margin, ext_hint)
+
+    # episodic: event_types по сходству, "вспомни/вчера/..." — top-3 типов и since_days
+    ev_above, ev_top, ev_best = match("event_types")
+    epi_hint = bool(_EPISODIC_HINTS.search(text))
+    if epi_hint or ev_best >= threshold:
+        event_types = ev_above or (ev_top if epi_hint else [])
+        if event_types:
+            request["episodic"].update(need=True, k=episodic_k, event_types=event_types, since_days=_since_days(text))
+            reasons.append(f"episodic:{'hint' if epi_hint else 'sim'}={ev_best:.2f}")
+    epi_conf = _branch_confidence(ev_best, threshold, margin, epi_hint)
+
+    confidence = round(min(ext_conf, epi_conf), 3)
+    logger.debug(f"Local planner: conf={confidence} reasons={reasons} ext_best={ext_best:.2f} ev_best={ev_best:.2f}")
+    return LocalPlan(request, confidence, reasons)
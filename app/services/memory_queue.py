@@ -0,0 +1,214 @@
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional
+
+from app.core import (
+    MEMORY_QUEUE_CONCURRENCY,
+    MEMORY_QUEUE_MAX_ATTEMPTS,
+    MEMORY_QUEUE_POLL_S,
+    MEMORY_QUEUE_STALE_S,
+    get_logger,
+)
+from app.db.session import engine, session_factory
+from app.models.model import MemoryWriteJob
+from app.repository.repo import (
+    claim_memory_write_jobs_repo,
+    complete_memory_write_job_repo,
+    enqueue_memory_write_job_repo,
+    fail_memory_write_job_repo,
+    memory_write_queue_stats_repo,
+    requeue_stale_memory_write_jobs_repo,
+    retry_memory_write_job_repo,
+)
+
+logger = get_logger(__name__)
+
+Handler = Callable[[dict[str, Any]], Awaitable[Any]]
+
+
+def json_safe(value: Any) -> Any:
+    """
+    Приводит payload к JSON: datetime -> isoformat, bytes (эмбеддинги) выкидываются,
+    кортежи/множества -> списки. Всё неизвестное — str().
+    """
+    if isinstance(value, dict):
+        return {str(k): json_safe(v) for k, v in value.items() if not isinstance(v, (bytes, bytearray, memoryview))}
+    if isinstance(value, (list, tuple, set)):
+        return [json_safe(v) for v in value if not isinstance(v, (bytes, bytearray, memoryview))]
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _backoff(attempt: int, base_s: float = 5.0, max_s: float = 300.0) -> timedelta:
+    return timedelta(seconds=min(base_s * 2 ** max(attempt - 1, 0), max_s))
+
+
+class MemoryWriteQueue:
+    """
+    Write-behind очередь memory_write поверх таблицы memory_write_jobs.
+
+    - enqueue() — один INSERT, ответ пользователю не ждёт LLM-вызова и апсертов;
+    - run(handler) — цикл воркера: забирает задания (SKIP LOCKED), держит не больше
+      concurrency одновременно, при ошибке — ретрай с экспоненциальной паузой,
+      после max_attempts — status='failed';
+    - задания, зависшие в running (процесс упал), возвращаются в очередь через stale_s.
+    """
+    def __init__(
+        self,
+        *,
+        concurrency: int = 2,
+        max_attempts: int = 5,
+        poll_s: float = 5.0,
+        stale_s: float = 600.0,
+    ):
+        self.concurrency = max(1, int(concurrency))
+        self.max_attempts = max(1, int(max_attempts))
+        self.poll_s = max(0.1, float(poll_s))
+        self.stale_s = float(stale_s)
+
+        self._wake: Optional[asyncio.Event] = None
+        self._active: set[asyncio.Task] = set()
+
+        self.enqueued = 0
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+        self._lag_total = 0.0
+
+    def _notify(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def enqueue(self, payload: dict[str, Any]) -> int:
+        async with session_factory() as session:
+            job_id = await enqueue_memory_write_job_repo(session, json_safe(payload))
+            await session.commit()
+        self.enqueued += 1
+        self._notify()
+        return job_id
+
+    async def _requeue_stale(self) -> None:
+        async with session_factory() as session:
+            n = await requeue_stale_memory_write_jobs_repo(session, older_than=timedelta(seconds=self.stale_s))
+            await session.commit()
+        if n:
+            logger.warning(f"Memory write queue: requeued {n} stale jobs")
+
+    async def _claim(self, limit: int) -> list[dict[str, Any]]:
+        async with session_factory() as session:
+            jobs = await claim_memory_write_jobs_repo(session, limit=limit)
+            await session.commit()
+        return jobs
+
+    async def _handle(self, job: dict[str, Any], handler: Handler) -> None:
+        job_id = job["id"]
+        try:
+            await handler(job["payload"])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            async with session_factory() as session:
+                if job["attempts"] >= self.max_attempts:
+                    await fail_memory_write_job_repo(session, job_id, error=error)
+                    self.failed += 1
+                    logger.error(f"Memory write job {job_id} failed after {job['attempts']} attempts: {error}")
+                else:
+                    delay = _backoff(job["attempts"])
+                    await retry_memory_write_job_repo(session, job_id, error=error, delay=delay)
+                    self.retried += 1
+                    logger.warning(f"Memory write job {job_id} attempt {job['attempts']} failed, retry in {delay}: {error}")
+                await session.commit()
+            return
+
+        async with session_factory() as session:
+            await complete_memory_write_job_repo(session, job_id)
+            await session.commit()
+
+        self.processed += 1
+        created_at = job.get("created_at")
+        if created_at is not None:
+            self._lag_total += max((datetime.now(created_at.tzinfo) - created_at).total_seconds(), 0.0)
+
+    async def _process(self, job: dict[str, Any], handler: Handler) -> None:
+        try:
+            await self._handle(job, handler)
+        except Exception as e:
+            # упали на обновлении статуса — задание останется running и вернётся через stale_s
+            logger.warning(f"Memory write job {job['id']}: bookkeeping failed: {e}")
+        finally:
+            self._notify()
+
+    async def run(self, handler: Handler) -> None:
+        self._wake = asyncio.Event()
+        await self._requeue_stale()
+        last_stale_check = time.monotonic()
+        logger.info(f"Memory write queue started: concurrency={self.concurrency} max_attempts={self.max_attempts}")
+
+        while True:
+            self._wake.clear()
+
+            free = self.concurrency - len(self._active)
+            jobs: list[dict[str, Any]] = []
+            if free > 0:
+                try:
+                    jobs = await self._claim(free)
+                except Exception as e:
+                    logger.warning(f"Memory write queue: claim failed: {e}")
+
+            for job in jobs:
+                task = asyncio.create_task(self._process(job, handler), name=f"memory-write-{job['id']}")
+                self._active.add(task)
+                task.add_done_callback(self._active.discard)
+
+            if time.monotonic() - last_stale_check >= self.stale_s:
+                last_stale_check = time.monotonic()
+                try:
+                    await self._requeue_stale()
+                except Exception as e:
+                    logger.warning(f"Memory write queue: stale requeue failed: {e}")
+
+            # будят enqueue() и завершение задания; poll_s — на случай записей из других процессов и ретраев
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_s)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stats(self) -> dict[str, Any]:
+        """Глубина и lag из БД + счётчики этого процесса."""
+        async with session_factory() as session:
+            db = await memory_write_queue_stats_repo(session)
+        return {
+            **db,
+            "active": len(self._active),
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "retried": self.retried,
+            "failed_here": self.failed,
+            "avg_lag_s": round(self._lag_total / self.processed, 2) if self.processed else 0.0,
+        }
+
+
+memory_write_queue = MemoryWriteQueue(
+    concurrency=MEMORY_QUEUE_CONCURRENCY,
+    max_attempts=MEMORY_QUEUE_MAX_ATTEMPTS,
+    poll_s=MEMORY_QUEUE_POLL_S,
+    stale_s=MEMORY_QUEUE_STALE_S,
+)
+
+
+async def setup_memory_queue() -> None:
+    """Таблица очереди для баз, созданных до неё (init_db пересоздаёт всё с нуля)."""
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: MemoryWriteJob.__table__.create(sync_conn, checkfirst=True))
+
+
+async def log_memory_queue_stats(interval_s: float = 60.0) -> None:
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            logger.info(f"Memory write queue: {await memory_write_queue.stats()}")
+        except Exception as e:
+            logger.warning(f"Memory write queue stats failed: {e}")
@@ -0,0 +1,132 @@
+import copy
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import numpy as np
+
+from app.core import (
+    MEMORY_PLANNER_CACHE_SIM,
+    MEMORY_PLANNER_CACHE_SIZE,
+    MEMORY_PLANNER_CACHE_TTL_S,
+    get_logger,
+)
+
+logger = get_logger(__name__)
+
+
+def normalize_message(text: str) -> str:
+    """Ключ кэша: нижний регистр, ё->е, без пунктуации, схлопнутые пробелы."""
+    text = (text or "").lower().replace("ё", "е")
+    text = re.sub(r"[^\w\s]+", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class PlannerCache:
+    """
+    LRU + TTL кэш нормализованных решений планировщика памяти (выход normalize_memory_request).
+
+    Ключ — (нормализованное сообщение, версия меток каталога): когда запись в память
+    меняет subjects / predicates / event_types, версия растёт и старые решения просто
+    перестают находиться. Если точного совпадения нет,
+    а sim_threshold задан — ищется ближайшее сообщение той же версии по эмбеддингу
+    ("который час" / "сколько времени").
+    """
+    def __init__(self, max_entries: int = 512, ttl_s: float = 3600.0, sim_threshold: Optional[float] = None):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl_s = max(0.0, float(ttl_s))
+        self.sim_threshold = sim_threshold
+
+        # key -> (req, vec|None, created_at)
+        self._data: OrderedDict[tuple[str, int], tuple[dict[str, Any], Optional[np.ndarray], float]] = OrderedDict()
+
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _alive(self, key: tuple[str, int], created_at: float, now: float) -> bool:
+        if self.ttl_s and now - created_at >= self.ttl_s:
+            del self._data[key]
+            self.expired += 1
+            return False
+        return True
+
+    def _nearest(self, version: int, vec: np.ndarray, now: float) -> Optional[tuple[str, int]]:
+        keys, vecs = [], []
+        for key, (_, v, created_at) in list(self._data.items()):
+            if key[1] != version or v is None or v.shape != vec.shape:
+                continue
+            if not self._alive(key, created_at, now):
+                continue
+            keys.append(key)
+            vecs.append(v)
+        if not keys:
+            return None
+
+        sims = np.vstack(vecs) @ vec
+        best = int(np.argmax(sims))
+        return keys[best] if sims[best] >= self.sim_threshold else None
+
+    def get(self, text: str, version: int, vec: Optional[np.ndarray] = None) -> Optional[dict[str, Any]]:
+        """vec — нормализованный эмбеддинг сообщения, нужен только для поиска соседей."""
+        if self.max_entries <= 0:
+            return None
+
+        now = time.monotonic()
+        key = (normalize_message(text), version)
+        entry = self._data.get(key)
+        if entry is not None and self._alive(key, entry[2], now):
+            self._data.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[0])
+
+        if vec is not None and self.sim_threshold is not None:
+            near = self._nearest(version, np.asarray(vec, dtype=np.float32).reshape(-1), now)
+            if near is not None:
+                self._data.move_to_end(near)
+                self.near_hits += 1
+                return copy.deepcopy(self._data[near][0])
+
+        self.misses += 1
+        return None
+
+    def put(self, text: str, version: int, req: dict[str, Any], vec: Optional[np.ndarray] = None) -> None:
+        if self.max_entries <= 0:
+            return
+        key = (normalize_message(text), version)
+        if vec is not None:
+            vec = np.array(vec, dtype=np.float32).reshape(-1)
+        self._data.pop(key, None)
+        self._data[key] = (copy.deepcopy(req), vec, time.monotonic())
+
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def needs_vector(self) -> bool:
+        return self.max_entries > 0 and self.sim_threshold is not None
+
+    def stats(self) -> dict:
+        total = self.hits + self.near_hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "hit_rate": round((self.hits + self.near_hits) / total, 4) if total else 0.0,
+        }
+
+
+planner_cache = PlannerCache(
+    max_entries=MEMORY_PLANNER_CACHE_SIZE,
+    ttl_s=MEMORY_PLANNER_CACHE_TTL_S,
+    sim_threshold=MEMORY_PLANNER_CACHE_SIM,
+)
@@ -0,0 +1,88 @@
+from typing import Iterable, NamedTuple, Sequence
+
+import numpy as np
+
+
+class RankProfile(NamedTuple):
+    """Веса гибридного скора: alpha * sim + beta * weight + gamma * recency."""
+    alpha: float
+    beta: float
+    gamma: float
+
+
+# тюнинг потом
+DEFAULT_PROFILE = RankProfile(alpha=0.7, beta=0.2, gamma=0.1)
+
+
+def as_matrix(vectors: Iterable) -> np.ndarray:
+    """Contiguous float32 (N, dim). Векторы должны быть уже L2-нормализованы."""
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def minmax(arr: np.ndarray) -> np.ndarray:
+    """
+    Min-max нормализация по последней оси. Если разброса нет — 0.5
+    (как прежний _normalize в service_db).
+    float64 на входе (timestamps) считается в float64 и только потом ужимается в float32.
+    """
+    arr = np.asarray(arr)
+    if arr.dtype != np.float64:
+        arr = arr.astype(np.float32, copy=False)
+    if arr.shape[-1] == 0:
+        return arr
+    lo = arr.min(axis=-1, keepdims=True)
+    span = arr.max(axis=-1, keepdims=True) - lo
+    flat = span < 1e-8
+    out = (arr - lo) / np.where(flat, 1.0, span)
+    return np.where(flat, np.float32(0.5), out).astype(np.float32, copy=False)
+
+
+def hybrid_scores(
+    queries: np.ndarray,
+    corpus: np.ndarray,
+    weights: np.ndarray,
+    recency: np.ndarray,
+    profiles: Sequence[RankProfile] = (DEFAULT_PROFILE,),
+) -> np.ndarray:
+    """
+    queries (Q, dim), corpus (N, dim) — нормализованные float32;
+    weights/recency (N,) — confidence|importance и timestamp.
+    Возвращает скоры (Q, P, N) для каждой пары (запрос, профиль).
+    """
+    queries = as_matrix(queries).reshape(-1, corpus.shape[1])
+    sims = minmax(queries @ corpus.T)                               # (Q, N)
+    prior = np.stack([minmax(weights), minmax(recency)])            # (2, N)
+
+    prof = np.asarray(profiles, dtype=np.float32).reshape(-1, 3)    # (P, 3)
+    static = prof[:, 1:] @ prior                                    # (P, N)
+
+    return prof[None, :, 0, None] * sims[:, None, :] + static[None, :, :]
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Индексы k лучших по последней оси, по убыванию скора (argpartition + сортировка только k)."""
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape).copy()
+    part_scores = np.take_along_axis(scores, part, axis=-1)
+    order = np.argsort(-part_scores, axis=-1, kind="stable")
+    return np.take_along_axis(part, order, axis=-1)
+
+
+def rank(
+    queries: np.ndarray,
+    corpus: np.ndarray,
+    weights: np.ndarray,
+    recency: np.ndarray,
+    *,
+    k: int,
+    profiles: Sequence[RankProfile] = (DEFAULT_PROFILE,),
+) -> np.ndarray:
+    """Индексы top-k кандидатов, shape = (Q, P, k)."""
+    return top_k(hybrid_scores(queries, corpus, weights, recency, profiles), k)
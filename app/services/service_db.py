@@ -1,40 +1,41 @@
+import asyncio
 from typing import Any, Optional
 from datetime import datetime, timezone, timedelta
 
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
-from app.core import get_logger
+from app.core import EMBEDDING_STORAGE_DIM, EMBEDDING_STORAGE_DTYPE, MEMORY_INDEX_CANDIDATES, get_logger
 from app.db.session import session_factory
-from app.llm.embedding import get_embedding_model
+from app.llm.embedding import encode_texts
 from app.repository.repo import (
-    add_episodic_memory_repo,
-    add_memory_fact_repo,
-    build_memory_catalog_repo,
+    add_episodic_memories_repo,
+    add_memory_facts_repo,
+    select_context_candidates_repo,
     select_core_facts_repo,
+    select_episodes_by_ids_repo,
     select_extended_candidates_repo,
     select_episodic_candidates_repo,
+    select_facts_by_ids_repo,
+    select_episodes_without_embedding_repo,
+    select_facts_without_embedding_repo,
+    set_episode_embeddings_repo,
+    set_fact_embeddings_repo,
 )
+from app.services.core_cache import core_facts_cache
+from app.services.memory_catalog import bump_catalog_version, memory_catalog
+from app.services.memory_index import (
+    index_episodes,
+    index_facts,
+    index_ready,
+    load_memory_index,
+    search_episodic_ids,
+    search_extended_ids,
+)
+from app.services.ranking import DEFAULT_PROFILE, RankProfile, rank
+from app.services.vectors import pack_vector, pack_vectors, reduce_dim, unpack_vector
 
 logger = get_logger(__name__)
 
-emb = get_embedding_model()
-
-# тюнинг потом
-ALPHA_SIM = 0.7
-BETA_WEIGHT = 0.2
-GAMMA_RECENCY = 0.1
-
-
-def _normalize(arr: np.ndarray) -> np.ndarray:
-    if arr.size == 0:
-        return arr
-    arr_min = float(arr.min())
-    arr_max = float(arr.max())
-    if arr_max - arr_min < 1e-8:
-        return np.full_like(arr, 0.5, dtype=float)
-    return (arr - arr_min) / (arr_max - arr_min)
-
 
 def _dt_to_ts(dt: Optional[datetime]) -> float:
     if dt is None:
@@ -45,6 +46,75 @@ def _dt_to_ts(dt: Optional[datetime]) -> float:
         return 0.0
 
 
+def prepare_embeddings(mat: Any) -> np.ndarray:
+    """Выход модели -> форма хранения/поиска: усечение до EMBEDDING_STORAGE_DIM + L2-нормализация."""
+    return reduce_dim(mat, EMBEDDING_STORAGE_DIM)
+
+
+def _pack(vec: np.ndarray) -> bytes:
+    return pack_vector(vec, EMBEDDING_STORAGE_DTYPE)
+
+
+def fact_text(predicate: Any, value: Any) -> str:
+    """Текст, по которому считается эмбеддинг факта (и при записи, и при fallback в ранжировании)."""
+    return f"{predicate or ''}: {value or ''}"
+
+
+def episode_text(summary: Any) -> str:
+    return str(summary or "")
+
+
+def _merge_candidates(candidates: list[dict[str, Any]], extra: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    seen = {c.get("id") for c in candidates}
+    return candidates + [c for c in extra if c.get("id") not in seen]
+
+
+def _strip_embedding(item: dict[str, Any]) -> dict[str, Any]:
+    # bytes эмбеддинга не нужны ни промпту, ни чекпоинтеру
+    return {k: v for k, v in item.items() if k != "embedding"}
+
+
+async def _corpus_embeddings(items: list[dict[str, Any]], texts: list[str], dim: int) -> np.ndarray:
+    """
+    Берёт сохранённые векторы кандидатов; кодирует только те, у которых вектора нет
+    (строки до бэкфилла или после смены модели).
+    """
+    vecs: list[Optional[np.ndarray]] = [unpack_vector(it.get("embedding"), dim) for it in items]
+    missing = [i for i, v in enumerate(vecs) if v is None]
+    if missing:
+        logger.debug(f"Encoding {len(missing)}/{len(items)} candidates without stored embedding")
+        encoded = prepare_embeddings(await encode_texts([texts[i] for i in missing]))
+        for j, i in enumerate(missing):
+            vecs[i] = encoded[j]
+    return np.vstack(vecs)
+
+
+class QueryContext:
+    """
+    Признаки запроса на один ход: эмбеддинг user_message считается один раз
+    и переиспользуется ранжированием фактов и эпизодов.
+    """
+    def __init__(self, text: str):
+        self.text = text or ""
+        self._embedding: Optional[asyncio.Task] = None
+
+    def prefetch(self) -> None:
+        """Запускает кодирование заранее (пока, например, думает планировщик)."""
+        if self._embedding is None and self.text.strip():
+            self._embedding = asyncio.ensure_future(self._encode())
+            # если ранжирование так и не понадобится — не сыпать "exception was never retrieved"
+            self._embedding.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def _encode(self) -> np.ndarray:
+        return prepare_embeddings(await encode_texts([self.text]))
+
+    async def embedding(self) -> np.ndarray:
+        """Нормализованный вектор запроса, shape = (1, dim)."""
+        if self._embedding is None:
+            self._embedding = asyncio.ensure_future(self._encode())
+        return await asyncio.shield(self._embedding)
+
+
 def _safe_bool(v: Any, default: bool) -> bool:
     return v if isinstance(v, bool) else default
 
@@ -70,10 +140,11 @@ def _safe_float(v: Any) -> Optional[float]:
 
 
 async def build_memory_catalog() -> dict[str, Any]:
-    async with session_factory() as session:
-        result: dict[str, Any] = await build_memory_catalog_repo(session)
-        logger.debug(f"Memory catalog: {result}")
-        return result
+    """
+    Каталог из кэша процесса; пересборка в БД — только после записи в память.
+    Результат общий для всех запросов — не мутировать.
+    """
+    return await memory_catalog.get()
 
 
 def normalize_memory_request(
@@ -164,75 +235,84 @@ def normalize_memory_request(
     return out
 
 
+async def _hybrid_rank(
+    query: QueryContext,
+    items: list[dict[str, Any]],
+    *,
+    texts: list[str],
+    weights: np.ndarray,
+    recency: np.ndarray,
+    k: int,
+    profile: RankProfile,
+) -> list[dict[str, Any]]:
+    query_emb = await query.embedding()
+    corpus_emb = await _corpus_embeddings(items, texts, query_emb.shape[1])
+
+    top_idx = rank(query_emb, corpus_emb, weights, recency, k=k, profiles=(profile,))[0, 0]
+    logger.debug(f"{query.text}: top={top_idx.tolist()} of {len(items)}")
+    return [_strip_embedding(items[i]) for i in top_idx]
+
+
 async def hybrid_rank_facts(
-    query_text: str,
+    query: QueryContext,
     facts: list[dict[str, Any]],
     *,
     k: int,
-    alpha: float = ALPHA_SIM,
-    beta: float = BETA_WEIGHT,
-    gamma: float = GAMMA_RECENCY,
+    profile: RankProfile = DEFAULT_PROFILE,
 ) -> list[dict[str, Any]]:
     if not facts or k <= 0:
         return []
 
-    texts = [f"{it.get('predicate','')}: {it.get('value','')}" for it in facts]
-    confidences = np.array(
-        [float(it["confidence"]) if it.get("confidence") is not None else 0.5 for it in facts],
-        dtype=float,
+    return await _hybrid_rank(
+        query,
+        facts,
+        texts=[fact_text(it.get("predicate"), it.get("value")) for it in facts],
+        weights=np.fromiter(
+            (it["confidence"] if it.get("confidence") is not None else 0.5 for it in facts),
+            dtype=np.float32,
+            count=len(facts),
+        ),
+        recency=np.fromiter((_dt_to_ts(it.get("last_seen_at")) for it in facts), dtype=np.float64, count=len(facts)),
+        k=k,
+        profile=profile,
     )
-    recencies = np.array([_dt_to_ts(it.get("last_seen_at")) for it in facts], dtype=float)
-
-    query_emb = await emb.encode([query_text])
-    corpus_emb = await emb.encode(texts)
-    sims = cosine_similarity(query_emb, corpus_emb)[0]
-
-    sims_norm = _normalize(np.asarray(sims, dtype=float))
-    conf_norm = _normalize(confidences)
-    rec_norm = _normalize(recencies)
-
-    scores = alpha * sims_norm + beta * conf_norm + gamma * rec_norm
-    logger.debug(f"{query_text}, {sims_norm}, {conf_norm}, {rec_norm}, {scores}")
-    top_idx = scores.argsort()[::-1][:k]
-    return [facts[i] for i in top_idx]
 
 
 async def hybrid_rank_episodic(
-    query_text: str,
+    query: QueryContext,
     episodes: list[dict[str, Any]],
     *,
     k: int,
-    alpha: float = ALPHA_SIM,
-    beta: float = BETA_WEIGHT,
-    gamma: float = GAMMA_RECENCY,
+    profile: RankProfile = DEFAULT_PROFILE,
 ) -> list[dict[str, Any]]:
     if not episodes or k <= 0:
         return []
 
-    texts = [str(it.get("summary", "")) for it in episodes]
-    importances = np.array([float(it.get("importance", 0.0)) for it in episodes], dtype=float)
-    recencies = np.array([_dt_to_ts(it.get("created_at")) for it in episodes], dtype=float)
-
-    query_emb = await emb.encode([query_text])
-    corpus_emb = await emb.encode(texts)
-    sims = cosine_similarity(query_emb, corpus_emb)[0]
+    return await _hybrid_rank(
+        query,
+        episodes,
+        texts=[episode_text(it.get("summary")) for it in episodes],
+        weights=np.fromiter((it.get("importance", 0.0) for it in episodes), dtype=np.float32, count=len(episodes)),
+        recency=np.fromiter((_dt_to_ts(it.get("created_at")) for it in episodes), dtype=np.float64, count=len(episodes)),
+        k=k,
+        profile=profile,
+    )
 
-    sims_norm = _normalize(np.asarray(sims, dtype=float))
-    imp_norm = _normalize(importances)
-    rec_norm = _normalize(recencies)
 
-    scores = alpha * sims_norm + beta * imp_norm + gamma * rec_norm
-    logger.debug(f"{query_text}, {sims_norm}, {imp_norm}, {rec_norm}, {scores}")
-    top_idx = scores.argsort()[::-1][:k]
-    return [episodes[i] for i in top_idx]
+# ---------- 3 ОБЁРТКИ ДЛЯ memory_read ----------
 
+def _since_dt(epi: dict[str, Any]) -> Optional[datetime]:
+    if epi["since_days"] is not None and epi["since_days"] > 0:
+        return datetime.now(timezone.utc) - timedelta(days=int(epi["since_days"]))
+    return None
 
-# ---------- 3 ОБЁРТКИ ДЛЯ memory_read ----------
 
 async def get_core_for_context(
     *,
     core_limit: int = 50,
 ) -> list[dict[str, Any]]:
+    if core_facts_cache.ready:
+        return core_facts_cache.top(core_limit)
     async with session_factory() as session:
         return await select_core_facts_repo(session, limit=core_limit)
 
@@ -242,11 +322,19 @@ async def get_extended_for_context(
     query_text: str,
     req: dict[str, Any],
     candidate_limit: int = 200,
+    query: Optional[QueryContext] = None,
 ) -> list[dict[str, Any]]:
     ext = req["extended"]
     if not ext["need"] or ext["k"] <= 0:
         return []
 
+    # ANN по всей памяти (фильтры запроса — пост-фильтром), дополняет SQL-выборку "последних N"
+    ann_ids: list[int] = []
+    if query_text.strip() and index_ready():
+        query = query or QueryContext(query_text)
+        query_vec = (await query.embedding())[0]
+        ann_ids = search_extended_ids(query_vec, ext, MEMORY_INDEX_CANDIDATES)
+
     async with session_factory() as session:
         candidates = await select_extended_candidates_repo(
             session,
@@ -256,12 +344,16 @@ async def get_extended_for_context(
             prefer_recent=ext["prefer_recent"],
             candidate_limit=candidate_limit,
         )
+        known = {c["id"] for c in candidates}
+        missing_ids = [i for i in ann_ids if i not in known]
+        if missing_ids:
+            candidates = _merge_candidates(candidates, await select_facts_by_ids_repo(session, missing_ids))
 
     # если запроса по смыслу нет — просто берем первые k (они уже отсортированы SQL-ом)
     if not query_text.strip():
-        return candidates[: ext["k"]]
+        return [_strip_embedding(c) for c in candidates[: ext["k"]]]
 
-    return await hybrid_rank_facts(query_text, candidates, k=ext["k"])
+    return await hybrid_rank_facts(query or QueryContext(query_text), candidates, k=ext["k"])
 
 
 async def get_episodic_for_context(
@@ -269,14 +361,19 @@ async def get_episodic_for_context(
     query_text: str,
     req: dict[str, Any],
     candidate_limit: int = 300,
+    query: Optional[QueryContext] = None,
 ) -> list[dict[str, Any]]:
     epi = req["episodic"]
     if not epi["need"] or epi["k"] <= 0:
         return []
 
-    since_dt = None
-    if epi["since_days"] is not None and epi["since_days"] > 0:
-        since_dt = datetime.now(timezone.utc) - timedelta(days=int(epi["since_days"]))
+    since_dt = _since_dt(epi)
+
+    ann_ids: list[int] = []
+    if query_text.strip() and index_ready():
+        query = query or QueryContext(query_text)
+        query_vec = (await query.embedding())[0]
+        ann_ids = search_episodic_ids(query_vec, epi, MEMORY_INDEX_CANDIDATES, since_dt=since_dt)
 
     async with session_factory() as session:
         candidates = await select_episodic_candidates_repo(
@@ -287,38 +384,203 @@ async def get_episodic_for_context(
             prefer_recent=epi["prefer_recent"],
             candidate_limit=candidate_limit,
         )
+        known = {c["id"] for c in candidates}
+        missing_ids = [i for i in ann_ids if i not in known]
+        if missing_ids:
+            candidates = _merge_candidates(candidates, await select_episodes_by_ids_repo(session, missing_ids))
 
     if not query_text.strip():
-        return candidates[: epi["k"]]
+        return [_strip_embedding(c) for c in candidates[: epi["k"]]]
+
+    return await hybrid_rank_episodic(query or QueryContext(query_text), candidates, k=epi["k"])
+
+
+async def get_memory_for_context(
+    *,
+    query_text: str,
+    req: dict[str, Any],
+    core_limit: int = 50,
+    extended_limit: int = 200,
+    episodic_limit: int = 300,
+    query: Optional[QueryContext] = None,
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]], list[dict[str, Any]]]:
+    """
+    То же, что три get_*_for_context вместе, но кандидаты всех веток (и добор по ANN)
+    приходят одним SQL-запросом на одном соединении. Ранжирование — как раньше.
+    Возвращает (core, extended, episodic).
+    """
+    ext, epi = req["extended"], req["episodic"]
+    need_ext = ext["need"] and ext["k"] > 0
+    need_epi = epi["need"] and epi["k"] > 0
+    since_dt = _since_dt(epi)
+    has_query = bool(query_text.strip())
+
+    # ANN считаем до запроса: его id уходят в тот же UNION ALL
+    ext_ids: list[int] = []
+    epi_ids: list[int] = []
+    if has_query and index_ready() and (need_ext or need_epi):
+        query = query or QueryContext(query_text)
+        query_vec = (await query.embedding())[0]
+        if need_ext:
+            ext_ids = search_extended_ids(query_vec, ext, MEMORY_INDEX_CANDIDATES)
+        if need_epi:
+            epi_ids = search_episodic_ids(query_vec, epi, MEMORY_INDEX_CANDIDATES, since_dt=since_dt)
+
+    # core-факты — из кэша процесса, в SQL их ветку добавляем, только пока кэш не загружен
+    core_cached = core_facts_cache.ready
+
+    async with session_factory() as session:
+        rows = await select_context_candidates_repo(
+            session,
+            core_limit=0 if core_cached else core_limit,
+            extended=dict(
+                subjects=ext["subjects"] or None,
+                predicates=ext["predicates"] or None,
+                min_confidence=ext["min_confidence"],
+                prefer_recent=ext["prefer_recent"],
+                candidate_limit=extended_limit,
+            ) if need_ext else None,
+            episodic=dict(
+                event_types=epi["event_types"] or None,
+                since_dt=since_dt,
+                min_importance=epi["min_importance"],
+                prefer_recent=epi["prefer_recent"],
+                candidate_limit=episodic_limit,
+            ) if need_epi else None,
+            extended_ids=ext_ids,
+            episodic_ids=epi_ids,
+        )
+
+    if core_cached:
+        rows["core"] = core_facts_cache.top(core_limit)
+
+    ext_candidates = _merge_candidates(rows["extended"], rows["extended_ids"])
+    epi_candidates = _merge_candidates(rows["episodic"], rows["episodic_ids"])
+
+    if not has_query:
+        return (
+            rows["core"],
+            [_strip_embedding(c) for c in ext_candidates[: ext["k"]]] if need_ext else [],
+            [_strip_embedding(c) for c in epi_candidates[: epi["k"]]] if need_epi else [],
+        )
 
-    return await hybrid_rank_episodic(query_text, candidates, k=epi["k"])
+    query = query or QueryContext(query_text)
+    extended, episodic = await asyncio.gather(
+        hybrid_rank_facts(query, ext_candidates, k=ext["k"] if need_ext else 0),
+        hybrid_rank_episodic(query, epi_candidates, k=epi["k"] if need_epi else 0),
+    )
+    return rows["core"], extended, episodic
 
 
 async def add_memory_fact(clean_facts: list[dict[str, Any]]) -> None:
+    if not clean_facts:
+        return
+
+    # повтор canonical_key в одном батче — остаётся последний (как при апсертах подряд),
+    # эмбеддинг для перезаписанных дублей не считаем
+    clean_facts = list({f["canonical_key"]: f for f in clean_facts}.values())
+
+    # эмбеддинги считаем одним батчем до открытия сессии, чтобы не держать соединение
+    vectors = prepare_embeddings(await encode_texts([fact_text(f["predicate"], f["value"]) for f in clean_facts]))
+
     async with session_factory() as session:
-        for f in clean_facts:
-            await add_memory_fact_repo(
-                session,
-                tier=f["tier"],
-                subject=f["subject"],
-                predicate=f["predicate"],
-                value=f["value"],
-                canonical_key=f["canonical_key"],
-                confidence=f["confidence"],
-            )
+        rows = await add_memory_facts_repo(
+            session,
+            [{**f, "embedding": _pack(vec)} for f, vec in zip(clean_facts, vectors)],
+        )
         await session.commit()
 
+    # tier берём из БД: апсерт по canonical_key его не меняет
+    written: list[tuple[int, np.ndarray, dict[str, Any]]] = [
+        (row["id"], vec, {**f, "tier": row["tier"], "last_seen_at": row["last_seen_at"]})
+        for f, vec, row in zip(clean_facts, vectors, rows)
+    ]
+
+    # write-through: core-факты в кэше процесса обновляются сразу после коммита
+    for fact_id, _, f in written:
+        if f["tier"] == "core":
+            core_facts_cache.upsert(fact_id, f)
+
+    bump_catalog_version()
+    await index_facts(written)
+
 async def add_episodic_memory(clean_episodes: list[dict[str, Any]], source_chat_id, source_message_id) -> None:
+    if not clean_episodes:
+        return
+
+    source_chat_id = source_chat_id if isinstance(source_chat_id, int) else None
+    source_message_id = source_message_id if isinstance(source_message_id, int) else None
+
+    vectors = prepare_embeddings(await encode_texts([episode_text(ep["summary"]) for ep in clean_episodes]))
+
     async with session_factory() as session:
-        for ep in clean_episodes:
-            await add_episodic_memory_repo(
-                session,
-                event_type=ep["event_type"],
-                summary=ep["summary"],
-                content=ep["content"],
-                importance=ep["importance"],
-                source_chat_id=source_chat_id if isinstance(source_chat_id, int) else None,
-                source_message_id=source_message_id if isinstance(source_message_id, int) else None,
-            )
+        ids = await add_episodic_memories_repo(
+            session,
+            [
+                {
+                    **ep,
+                    "source_chat_id": source_chat_id,
+                    "source_message_id": source_message_id,
+                    # ключ идемпотентности — на эпизод: иначе второй эпизод хода перезапишет первый
+                    "source_part": part,
+                    "embedding": _pack(vec),
+                }
+                for part, (ep, vec) in enumerate(zip(clean_episodes, vectors))
+            ],
+        )
         await session.commit()
-    
\ No newline at end of file
+
+    now = datetime.now(timezone.utc)
+    written: list[tuple[int, np.ndarray, dict[str, Any]]] = [
+        (episode_id, vec, {**ep, "created_at": now})
+        for episode_id, vec, ep in zip(ids, vectors, clean_episodes)
+    ]
+
+    bump_catalog_version()
+    await index_episodes(written)
+
+
+async def backfill_embeddings(batch_size: int = 64) -> dict[str, int]:
+    """
+    Досчитывает эмбеддинги для строк, записанных до появления колонки embedding.
+    Идёт батчами, пока есть строки с embedding IS NULL. Возвращает сколько обновлено.
+    """
+    done = {"facts": 0, "episodic": 0}
+
+    while True:
+        async with session_factory() as session:
+            rows = await select_facts_without_embedding_repo(session, limit=batch_size)
+        if not rows:
+            break
+        embeddings = pack_vectors(
+            await encode_texts([fact_text(r["predicate"], r["value"]) for r in rows]),
+            EMBEDDING_STORAGE_DTYPE,
+            EMBEDDING_STORAGE_DIM,
+        )
+        async with session_factory() as session:
+            await set_fact_embeddings_repo(session, [(r["id"], e) for r, e in zip(rows, embeddings)])
+            await session.commit()
+        done["facts"] += len(rows)
+
+    while True:
+        async with session_factory() as session:
+            rows = await select_episodes_without_embedding_repo(session, limit=batch_size)
+        if not rows:
+            break
+        embeddings = pack_vectors(
+            await encode_texts([episode_text(r["summary"]) for r in rows]),
+            EMBEDDING_STORAGE_DTYPE,
+            EMBEDDING_STORAGE_DIM,
+        )
+        async with session_factory() as session:
+            await set_episode_embeddings_repo(session, [(r["id"], e) for r, e in zip(rows, embeddings)])
+            await session.commit()
+        done["episodic"] += len(rows)
+
+    if done["facts"] or done["episodic"]:
+        logger.info(f"Embeddings backfill: {done}")
+        # бэкфилл идёт мимо index_facts/index_episodes — проще перечитать индекс целиком
+        if index_ready():
+            await load_memory_index()
+
+    return done
@@ -3,12 +3,22 @@ from io import BytesIO
 from aiogram import Bot
 from aiogram.types import PhotoSize
 
+from app.services.blob_store import blob_store
+
 
 def bytes_to_data_url(raw: bytes, mime: str = "image/jpeg") -> str:
     b64 = base64.b64encode(raw).decode("utf-8")
     return f"data:{mime};base64,{b64}"
 
 async def download_photo(bot: Bot, photo: PhotoSize) -> str:
+    """
+    Кладёт фото в blob store и возвращает ссылку blob://... (не data URL):
+    в чекпоинт попадает только она. То же фото (file_unique_id) повторно не качаем.
+    """
+    ref = await blob_store.lookup(photo.file_unique_id)
+    if ref is not None:
+        return ref
+
     photo_file = await bot.get_file(photo.file_id)
 
     buf = BytesIO()
@@ -16,6 +26,4 @@ async def download_photo(bot: Bot, photo: PhotoSize) -> str:
     await bot.download(photo_file, destination=buf)
 
     raw = buf.getvalue()
-    data_url = bytes_to_data_url(raw, mime="image/jpeg")
-
-    return data_url
\ No newline at end of file
+    return await blob_store.put(raw, mime="image/jpeg", alias=photo.file_unique_id)
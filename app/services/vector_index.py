@@ -0,0 +1,333 @@
+import threading
+from typing import Any, Callable, Iterable, Optional
+
+import numpy as np
+
+from app.services.vectors import StorageDtype, compact_dot, dequantize, l2_normalize, quantize
+
+
+def _kmeans(data: np.ndarray, nlist: int, iters: int, seed: int = 0) -> np.ndarray:
+    """Сферический k-means (косинус) — центроиды для IVF."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+
+    for _ in range(iters):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        counts = np.bincount(assign, minlength=nlist)
+
+        # пустые кластеры пересаживаем на случайные точки
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            sums[empty] = data[rng.choice(len(data), empty.size)]
+
+        centroids = l2_normalize(sums)
+
+    return centroids
+
+
+class VectorIndex:
+    """
+    Приближённый поиск ближайших соседей (IVF на NumPy) по нормализованным векторам.
+
+    - Пока записей меньше train_threshold — точный перебор (flat), это и так быстро.
+    - После обучения: центроиды k-means, у каждой строки свой список; поиск смотрит
+      nprobe ближайших списков и расширяет пробу, если пост-фильтр выкинул слишком много.
+    - add/remove инкрементальные: новая строка сразу попадает в ближайший список.
+    - С каждой записью хранится meta (dict) для пост-фильтра `allow(meta)`.
+    - dtype="float16"|"int8" — векторы хранятся и скорятся в компактной форме (в 2/4 раза меньше RAM).
+
+    Все методы потокобезопасны: train() можно гонять в потоке, поиск при этом работает.
+    """
+    def __init__(
+        self,
+        *,
+        nprobe: int = 8,
+        train_threshold: int = 4096,
+        kmeans_iters: int = 10,
+        sample_size: int = 20000,
+        dtype: StorageDtype = "float32",
+    ):
+        self.dtype = dtype
+        self.nprobe = max(1, int(nprobe))
+        self.train_threshold = max(1, int(train_threshold))
+        self.kmeans_iters = kmeans_iters
+        self.sample_size = sample_size
+
+        self._lock = threading.Lock()
+        self._dim: Optional[int] = None
+        self._size = 0                                  # занятые строки (включая удалённые)
+        self._vecs = np.empty((0, 0), dtype=np.float32)
+        self._scales: Optional[np.ndarray] = None       # только для int8
+        self._ids = np.empty(0, dtype=np.int64)
+        self._alive = np.empty(0, dtype=bool)
+        self._meta: list[Optional[dict[str, Any]]] = []
+        self._row_of: dict[int, int] = {}
+
+        self._centroids: Optional[np.ndarray] = None
+        self._assign = np.empty(0, dtype=np.int32)
+        self._lists: list[list[int]] = []
+        self._list_cache: dict[int, np.ndarray] = {}
+        self._trained_on = 0
+        self._touched: Optional[set[int]] = None       # строки, изменённые во время train()
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._dim
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    def nbytes(self) -> int:
+        """Память под векторы (без meta и списков)."""
+        used = self._vecs[: self._size].nbytes
+        if self._scales is not None:
+            used += self._scales[: self._size].nbytes
+        return used
+
+    def _row_vecs(self, vecs: np.ndarray, scales: Optional[np.ndarray], rows) -> np.ndarray:
+        return dequantize(vecs[rows], scales[rows] if scales is not None else None)
+
+    # ---------- запись ----------
+
+    def _grow(self, need: int) -> None:
+        cap = self._vecs.shape[0]
+        if need <= cap:
+            return
+        new_cap = max(need, cap * 2, 256)
+
+        vecs = np.zeros((new_cap, self._dim), dtype=self._vecs.dtype)
+        vecs[: self._size] = self._vecs[: self._size]
+        if self._scales is not None:
+            scales = np.ones(new_cap, dtype=np.float32)
+            scales[: self._size] = self._scales[: self._size]
+            self._scales = scales
+        ids = np.zeros(new_cap, dtype=np.int64)
+        ids[: self._size] = self._ids[: self._size]
+        alive = np.zeros(new_cap, dtype=bool)
+        alive[: self._size] = self._alive[: self._size]
+        assign = np.full(new_cap, -1, dtype=np.int32)
+        assign[: self._size] = self._assign[: self._size]
+
+        self._vecs, self._ids, self._alive, self._assign = vecs, ids, alive, assign
+
+    def _unlist(self, row: int) -> None:
+        lst = int(self._assign[row])
+        if self._centroids is not None and lst >= 0:
+            self._lists[lst].remove(row)
+            self._list_cache.pop(lst, None)
+        self._assign[row] = -1
+
+    def _enlist(self, row: int) -> None:
+        if self._centroids is None:
+            return
+        lst = int(np.argmax(self._centroids @ self._row_vecs(self._vecs, self._scales, row)))
+        self._assign[row] = lst
+        self._lists[lst].append(row)
+        self._list_cache.pop(lst, None)
+
+    def add(self, item_id: int, vec: Any, meta: Optional[dict[str, Any]] = None) -> bool:
+        """Добавляет или заменяет вектор по id. False — если размерность не совпала."""
+        vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+
+        with self._lock:
+            if self._dim is None:
+                self._dim = int(vec.shape[0])
+                data, scales = quantize(np.zeros((0, self._dim), dtype=np.float32), self.dtype)
+                self._vecs = data
+                self._scales = scales
+            if vec.shape[0] != self._dim:
+                return False
+
+            row = self._row_of.get(item_id)
+            if row is None:
+                self._grow(self._size + 1)
+                row = self._size
+                self._size += 1
+                self._row_of[item_id] = row
+                self._ids[row] = item_id
+                self._meta.append(meta)
+            else:
+                self._unlist(row)
+                self._meta[row] = meta
+
+            data, scales = quantize(vec[None, :], self.dtype)
+            self._vecs[row] = data[0]
+            if self._scales is not None:
+                self._scales[row] = scales[0]
+            self._alive[row] = True
+            self._enlist(row)
+
+            if self._touched is not None:
+                self._touched.add(row)
+
+        return True
+
+    def add_many(self, items: Iterable[tuple[int, Any, Optional[dict[str, Any]]]]) -> int:
+        return sum(1 for item_id, vec, meta in items if self.add(item_id, vec, meta))
+
+    def remove(self, item_id: int) -> None:
+        with self._lock:
+            row = self._row_of.pop(item_id, None)
+            if row is None:
+                return
+            self._unlist(row)
+            self._alive[row] = False
+            self._meta[row] = None
+            if self._touched is not None:
+                self._touched.add(row)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.__init__(
+                nprobe=self.nprobe,
+                train_threshold=self.train_threshold,
+                kmeans_iters=self.kmeans_iters,
+                sample_size=self.sample_size,
+                dtype=self.dtype,
+            )
+
+    # ---------- обучение ----------
+
+    def needs_training(self) -> bool:
+        n = len(self._row_of)
+        if n < self.train_threshold:
+            return False
+        return self._centroids is None or n >= 2 * self._trained_on
+
+    def train(self) -> None:
+        """
+        Обучает центроиды и перераскладывает строки по спискам.
+        Тяжёлая часть идёт без блокировки на снимке; строки, изменённые
+        за это время, раскладываются заново уже под локом.
+        """
+        with self._lock:
+            size = self._size
+            rows = np.flatnonzero(self._alive[:size])
+            if rows.size == 0:
+                return
+            vecs, scales = self._vecs, self._scales
+            rng = np.random.default_rng(0)
+            pick = rows if rows.size <= self.sample_size else rng.choice(rows, self.sample_size, replace=False)
+            sample = self._row_vecs(vecs, scales, pick)
+            self._touched = set()
+
+        nlist = max(1, min(int(np.sqrt(rows.size)), sample.shape[0]))
+        centroids = _kmeans(sample, nlist, self.kmeans_iters)
+
+        assign = np.full(size, -1, dtype=np.int32)
+        for start in range(0, size, 8192):
+            chunk = self._row_vecs(vecs, scales, slice(start, min(start + 8192, size)))
+            assign[start: start + chunk.shape[0]] = np.argmax(chunk @ centroids.T, axis=1)
+
+        with self._lock:
+            touched = self._touched or set()
+            self._touched = None
+
+            full = np.full(self._vecs.shape[0], -1, dtype=np.int32)
+            full[:size] = assign
+            late = touched | set(range(size, self._size))
+            for row in late:
+                full[row] = int(np.argmax(centroids @ self._row_vecs(self._vecs, self._scales, row)))
+
+            alive = np.flatnonzero(self._alive[: self._size])
+            full[np.setdiff1d(np.arange(self._size), alive)] = -1
+
+            order = alive[np.argsort(full[alive], kind="stable")]
+            counts = np.bincount(full[alive], minlength=nlist)
+            lists = [chunk.tolist() for chunk in np.split(order, np.cumsum(counts)[:-1])]
+
+            self._centroids = centroids
+            self._assign = full
+            self._lists = lists
+            self._list_cache = {}
+            self._trained_on = len(self._row_of)
+
+    # ---------- поиск ----------
+
+    def _list_rows(self, lst: int) -> np.ndarray:
+        arr = self._list_cache.get(lst)
+        if arr is None:
+            arr = np.asarray(self._lists[lst], dtype=np.int64)
+            self._list_cache[lst] = arr
+        return arr
+
+    def _scores(self, rows, query: np.ndarray) -> np.ndarray:
+        return compact_dot(self._vecs[rows], self._scales[rows] if self._scales is not None else None, query)
+
+    def _topk(
+        self,
+        rows: np.ndarray,
+        scores: np.ndarray,
+        k: int,
+        allow: Optional[Callable[[dict[str, Any]], bool]],
+        allow_ids: Optional[set[int]],
+    ) -> list[tuple[int, float]]:
+        if rows.size == 0:
+            return []
+
+        if allow is None and allow_ids is None:
+            kk = min(k, rows.size)
+            part = np.argpartition(-scores, kk - 1)[:kk]
+            idx = part[np.argsort(-scores[part])]
+        else:
+            idx = np.argsort(-scores)
+
+        out: list[tuple[int, float]] = []
+        for i in idx:
+            if scores[i] == -np.inf:
+                break
+            row = rows[i]
+            item_id = int(self._ids[row])
+            if allow_ids is not None and item_id not in allow_ids:
+                continue
+            if allow is not None and not allow(self._meta[row] or {}):
+                continue
+            out.append((item_id, float(scores[i])))
+            if len(out) >= k:
+                break
+        return out
+
+    def search(
+        self,
+        query: Any,
+        k: int,
+        *,
+        allow: Optional[Callable[[dict[str, Any]], bool]] = None,
+        allow_ids: Optional[set[int]] = None,
+        nprobe: Optional[int] = None,
+    ) -> list[tuple[int, float]]:
+        """
+        Возвращает до k пар (id, cosine) по убыванию близости.
+        allow — пост-фильтр по meta, allow_ids — белый список id.
+        """
+        if k <= 0:
+            return []
+
+        query = l2_normalize(np.asarray(query, dtype=np.float32).reshape(-1))
+
+        with self._lock:
+            if not self._row_of or query.shape[0] != self._dim:
+                return []
+
+            if self._centroids is None:
+                # flat: скорим непрерывный блок целиком (без fancy-index копии), удалённые -> -inf
+                scores = self._scores(slice(0, self._size), query)
+                scores[~self._alive[: self._size]] = -np.inf
+                return self._topk(np.arange(self._size), scores, k, allow, allow_ids)
+
+            nlist = self._centroids.shape[0]
+            probe = min(nprobe or self.nprobe, nlist)
+            order = np.argsort(-(self._centroids @ query))
+
+            while True:
+                rows = np.concatenate([self._list_rows(int(lst)) for lst in order[:probe]])
+                found = self._topk(rows, self._scores(rows, query), k, allow, allow_ids)
+                if len(found) >= k or probe >= nlist:
+                    return found
+                probe = min(probe * 2, nlist)
@@ -0,0 +1,126 @@
+from typing import Any, Iterable, Literal, Optional
+
+import numpy as np
+
+
+# Формат blob-а в БД: 1 байт тега + данные (little-endian).
+# Тег оставляет место под другие форматы хранения без миграций.
+_TAG_F32 = 0
+_TAG_F16 = 1
+_TAG_I8 = 2      # + float32 scale перед данными
+
+StorageDtype = Literal["float32", "float16", "int8"]
+
+
+def l2_normalize(mat: np.ndarray) -> np.ndarray:
+    mat = np.asarray(mat, dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    norms[norms < 1e-12] = 1.0
+    return mat / norms
+
+
+def reduce_dim(mat: Any, dim: Optional[int] = None) -> np.ndarray:
+    """
+    Matryoshka-усечение: первые dim компонент и повторная нормализация.
+    dim=None — без усечения, только нормализация.
+    """
+    mat = np.asarray(mat, dtype=np.float32)
+    if dim is not None and 0 < dim < mat.shape[-1]:
+        mat = mat[..., :dim]
+    return l2_normalize(mat)
+
+
+def quantize(mat: Any, dtype: StorageDtype = "float32") -> tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Компактная форма нормализованных векторов.
+    int8 — симметричная квантизация со своим scale на строку: vec ≈ data * scale.
+    Возвращает (data, scales|None).
+    """
+    mat = np.asarray(mat, dtype=np.float32)
+    if dtype == "float16":
+        return mat.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(mat).max(axis=-1) / 127.0
+        scales[scales < 1e-12] = 1.0
+        data = np.clip(np.rint(mat / scales[..., None]), -127, 127).astype(np.int8)
+        return data, scales.astype(np.float32)
+    return mat, None
+
+
+def dequantize(data: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    out = np.asarray(data, dtype=np.float32)
+    if scales is not None:
+        out = out * scales[..., None]
+    return out
+
+
+# строк на блок в compact_dot: буфер float32 на блок — единицы МБ при любом размере матрицы
+_DOT_BLOCK = 1024
+
+
+def compact_dot(data: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray, block: int = _DOT_BLOCK) -> np.ndarray:
+    """
+    Скоры data @ query по компактной форме: float16/int8 переводятся в float32 блоками
+    фиксированного размера через один переиспользуемый буфер, а не копией всей матрицы.
+    Для int8 масштаб применяется к готовым скалярам, а не к матрице.
+    """
+    query = np.asarray(query, dtype=np.float32)
+    if data.dtype == np.float32:
+        sims = data @ query
+    else:
+        n = data.shape[0]
+        sims = np.empty(n, dtype=np.float32)
+        buf = np.empty((min(block, n), data.shape[1]), dtype=np.float32)
+        for start in range(0, n, block):
+            stop = min(start + block, n)
+            chunk = buf[: stop - start]
+            np.copyto(chunk, data[start:stop])
+            np.matmul(chunk, query, out=sims[start:stop])
+    if scales is not None:
+        sims *= scales
+    return sims
+
+
+def pack_vector(vec: Any, dtype: StorageDtype = "float32") -> bytes:
+    """
+    Упаковывает один вектор (уже нормализованный) в bytes для колонки embedding.
+    """
+    arr = np.asarray(vec, dtype=np.float32).reshape(-1)
+    if dtype == "float16":
+        return bytes([_TAG_F16]) + arr.astype("<f2").tobytes()
+    if dtype == "int8":
+        data, scales = quantize(arr[None, :], "int8")
+        return bytes([_TAG_I8]) + scales.astype("<f4").tobytes() + data.tobytes()
+    return bytes([_TAG_F32]) + arr.astype("<f4").tobytes()
+
+
+def unpack_vector(blob: Optional[bytes], dim: Optional[int] = None) -> Optional[np.ndarray]:
+    """
+    Обратное к pack_vector (любой формат -> float32). Возвращает None, если blob пустой,
+    битый или размерность не совпадает с ожидаемой (например, сменили модель или EMBEDDING_STORAGE_DIM).
+    """
+    if not blob:
+        return None
+    blob = bytes(blob)
+    tag, payload = blob[0], len(blob) - 1
+
+    if tag == _TAG_F32 and payload % 4 == 0:
+        vec = np.frombuffer(blob, dtype="<f4", offset=1).astype(np.float32)
+    elif tag == _TAG_F16 and payload % 2 == 0:
+        vec = np.frombuffer(blob, dtype="<f2", offset=1).astype(np.float32)
+    elif tag == _TAG_I8 and payload > 4:
+        scale = np.frombuffer(blob, dtype="<f4", count=1, offset=1)[0]
+        vec = np.frombuffer(blob, dtype=np.int8, offset=5).astype(np.float32) * scale
+    else:
+        return None
+
+    if dim is not None and vec.shape[0] != dim:
+        return None
+    return vec
+
+
+def pack_vectors(mat: Iterable[Any], dtype: StorageDtype = "float32", dim: Optional[int] = None) -> list[bytes]:
+    rows = list(mat)
+    if not rows:
+        return []
+    return [pack_vector(v, dtype) for v in reduce_dim(np.asarray(rows), dim)]
@@ -0,0 +1,18 @@
+from app.core import get_logger
+from app.db.migrations import migrate_schema
+from app.services.service_db import backfill_embeddings
+
+logger = get_logger(__name__)
+
+
+async def main():
+    try:
+        await migrate_schema()
+        done = await backfill_embeddings()
+        print(f"Пересчитано эмбеддингов: {done}")
+    except Exception:
+        logger.exception("Ошибка в пересчёте эмбеддингов")
+
+if __name__ == "__main__":
+    import asyncio
+    asyncio.run(main())
@@ -8,22 +8,70 @@ if sys.platform.startswith("win"):
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 
 from app.agent.build_graph import build_graph
+from app.agent.nodes.memory_write import memory_write_handler
 from app.core import CHECKPOINT_DB_URI as DB_URI
+from app.core import MEMORY_CORE_RECONCILE_S, get_logger
+from app.db.migrations import migrate_schema
 from app.gateway.bot.bot import start_telegram_bot
+from app.gateway.bot.mailbox import log_dispatcher_stats
+from app.llm.client import get_chat_model
+from app.llm.embedding import prewarm_embedding_model
+from app.llm.scheduler import PRIORITY_BACKGROUND, log_llm_scheduler_stats, with_priority
+from app.services.core_cache import load_core_facts, reconcile_core_facts
+from app.services.memory_index import load_memory_index
+from app.services.memory_queue import log_memory_queue_stats, memory_write_queue, setup_memory_queue
+from app.services.service_db import backfill_embeddings, build_memory_catalog
+
+logger = get_logger(__name__)
+
+async def run_backfill():
+    # фоновая задача: её падение не должно ронять TaskGroup с ботом
+    try:
+        await backfill_embeddings()
+    except Exception:
+        logger.exception("Ошибка в пересчёте эмбеддингов")
+
+
+async def run_memory_queue():
+    # воркер очереди memory_write: его падение тоже не должно ронять бота
+    try:
+        await memory_write_queue.run(
+            memory_write_handler(with_priority(get_chat_model(profile="cold"), PRIORITY_BACKGROUND))
+        )
+    except Exception:
+        logger.exception("Ошибка в очереди записи памяти")
 
 
 async def main():
     async with AsyncPostgresSaver.from_conn_string(DB_URI) as checkpointer:
         await checkpointer.setup()
 
+        # колонки embedding и прочее — до load_memory_index / run_backfill, которые их читают
+        await migrate_schema()
+        await setup_memory_queue()
+
         graph_app = build_graph(checkpointer=checkpointer)
 
+        await asyncio.gather(
+            prewarm_embedding_model(),
+            load_memory_index(),
+            build_memory_catalog(),
+            load_core_facts(),
+        )
+
         png_bytes = graph_app.get_graph().draw_mermaid_png()
         with open("graph.png", "wb") as f:
             f.write(png_bytes)
 
         async with asyncio.TaskGroup() as tg:
             tg.create_task(start_telegram_bot(graph_app))
+            tg.create_task(run_backfill())
+            tg.create_task(run_memory_queue())
+            tg.create_task(log_memory_queue_stats())
+            tg.create_task(log_dispatcher_stats())
+            tg.create_task(log_llm_scheduler_stats())
+            if MEMORY_CORE_RECONCILE_S > 0:
+                tg.create_task(reconcile_core_facts(MEMORY_CORE_RECONCILE_S))
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
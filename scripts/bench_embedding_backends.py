@@ -0,0 +1,110 @@
+"""
+Скорость и согласие по косинусу CPU-бэкендов эмбеддинг-модели (EMBEDDING_BACKEND /
+EMBEDDING_QUANTIZE) относительно torch fp32.
+
+    python -m scripts.bench_embedding_backends                      # тексты памяти из БД
+    python -m scripts.bench_embedding_backends --texts memory.txt   # по одному тексту на строку
+    python -m scripts.bench_embedding_backends --backends torch onnx onnx-int8 openvino
+
+Первый запуск onnx/openvino экспортирует модель в EMBEDDING_EXPORT_DIR — это время
+в замер не входит. cos — косинус с эталонным вектором torch (mean/min по текстам),
+recall@k — совпадение top-k соседей внутри корпуса с эталоном.
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from app.core import EMBEDDING_EXPORT_DIR, EMBEDDING_MODEL, EMBEDDING_TORCH_THREADS
+from app.llm.embedding import load_sentence_transformer
+from app.services.vectors import l2_normalize
+
+
+async def _memory_texts(limit: int) -> list[str]:
+    from sqlalchemy import select
+
+    from app.db.session import session_factory
+    from app.models.model import EpisodicMemory, MemoryFacts
+    from app.services.service_db import episode_text, fact_text
+
+    async with session_factory() as session:
+        facts = await session.execute(select(MemoryFacts.predicate, MemoryFacts.value).limit(limit))
+        episodes = await session.execute(select(EpisodicMemory.summary).limit(limit))
+        texts = [fact_text(p, v) for p, v in facts.all()]
+        texts += [episode_text(s) for (s,) in episodes.all()]
+    return [t for t in texts if t.strip()]
+
+
+def _load_texts(path: str | None, limit: int) -> list[str]:
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()][:limit]
+    return asyncio.run(_memory_texts(limit))
+
+
+def _encode(model, texts: list[str], batch_size: int, repeats: int) -> tuple[np.ndarray, float]:
+    model.encode(texts[:batch_size], batch_size=batch_size)  # прогрев
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        vecs = model.encode(texts, batch_size=batch_size)
+        best = min(best, time.perf_counter() - t0)
+    return l2_normalize(vecs), best
+
+
+def _recall(base: np.ndarray, other: np.ndarray, k: int) -> float:
+    k = min(k, len(base) - 1)
+    if k <= 0:
+        return 1.0
+    truth = np.argsort(-(base @ base.T), axis=1)[:, 1: k + 1]
+    found = np.argsort(-(other @ other.T), axis=1)[:, 1: k + 1]
+    return float(np.mean([len(set(t) & set(f)) / k for t, f in zip(truth, found)]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--texts", default=None)
+    parser.add_argument("--limit", type=int, default=2000)
+    parser.add_argument("--backends", nargs="*", default=["torch", "onnx", "onnx-int8", "openvino"])
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=EMBEDDING_TORCH_THREADS)
+    parser.add_argument("--export-dir", default=EMBEDDING_EXPORT_DIR)
+    args = parser.parse_args()
+
+    texts = _load_texts(args.texts, args.limit)
+    if not texts:
+        raise SystemExit("Нет текстов для замера")
+
+    print(f"model={args.model} texts={len(texts)} batch={args.batch_size} threads={args.threads}")
+    print(f"{'backend':>10} {'texts/s':>9} {'x torch':>8} {'cos mean':>9} {'cos min':>8} {'recall@k':>9}")
+
+    base_vecs = None
+    base_time = None
+    for name in ["torch", *[b for b in args.backends if b != "torch"]]:
+        backend, _, suffix = name.partition("-")
+        model = load_sentence_transformer(
+            args.model,
+            args.threads,
+            backend=backend,
+            quantize=suffix == "int8",
+            export_dir=args.export_dir,
+        )
+        if getattr(model, "backend", "torch") != backend:
+            name += "(torch)"  # экспорт не удался, load_sentence_transformer откатился на torch
+        vecs, seconds = _encode(model, texts, args.batch_size, args.repeats)
+
+        if base_vecs is None:
+            base_vecs, base_time = vecs, seconds
+        cos = np.sum(base_vecs * vecs, axis=1)
+        print(
+            f"{name:>10} {len(texts) / seconds:>9.1f} {base_time / seconds:>7.2f}x "
+            f"{cos.mean():>9.4f} {cos.min():>8.4f} {_recall(base_vecs, vecs, args.k):>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
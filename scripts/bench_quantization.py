@@ -0,0 +1,82 @@
+"""
+Recall vs скорость/память для режимов хранения эмбеддингов (EMBEDDING_STORAGE_DTYPE /
+EMBEDDING_STORAGE_DIM) относительно float32 полной размерности.
+
+    python -m scripts.bench_quantization                       # синтетика
+    python -m scripts.bench_quantization --texts memory.txt --model <EMBEDDING_MODEL>
+
+На синтетике Matryoshka-усечение выглядит хуже, чем на реальной модели:
+у случайных векторов "важные" компоненты не собраны в начале. Для решений
+по EMBEDDING_STORAGE_DIM гоняйте на своих текстах (по одному на строку).
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.vector_index import VectorIndex
+from app.services.vectors import l2_normalize, reduce_dim
+
+
+def _synthetic(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    centers = l2_normalize(rng.normal(size=(max(8, n // 250), dim)))
+    points = centers[rng.integers(0, len(centers), n)] + 0.6 * rng.normal(size=(n, dim)) / np.sqrt(dim)
+    return l2_normalize(points)
+
+
+def _encode_texts(path: str, model_name: str) -> np.ndarray:
+    from sentence_transformers import SentenceTransformer
+
+    with open(path, encoding="utf-8") as f:
+        texts = [line.strip() for line in f if line.strip()]
+    return l2_normalize(SentenceTransformer(model_name).encode(texts, batch_size=64))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dims", type=int, nargs="*", default=[256, 128])
+    parser.add_argument("--texts", default=None)
+    parser.add_argument("--model", default=None)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.texts:
+        data = _encode_texts(args.texts, args.model)
+    else:
+        data = _synthetic(args.n, args.dim, rng)
+
+    n, full_dim = data.shape
+    query_rows = rng.integers(0, n, min(args.queries, n))
+    queries = l2_normalize(data[query_rows] + 0.2 * rng.normal(size=(len(query_rows), full_dim)) / np.sqrt(full_dim))
+
+    # эталон — точный поиск float32 на полной размерности
+    truth = [set(np.argsort(-(data @ q))[: args.k].tolist()) for q in queries]
+
+    print(f"N={n} full_dim={full_dim} k={args.k} (точный перебор, без IVF)")
+    print(f"{'mode':>8} {'dim':>5} {'MB':>8} {'x less':>7} {'ms/query':>9} {'recall@k':>9}")
+
+    base_bytes = None
+    for dim in [None, *args.dims]:
+        stored = reduce_dim(data, dim)
+        q_red = reduce_dim(queries, dim)
+        for dtype in ("float32", "float16", "int8"):
+            index = VectorIndex(train_threshold=n + 1, dtype=dtype)
+            index.add_many((i, v, None) for i, v in enumerate(stored))
+
+            found = [index.search(q, args.k) for q in q_red[:5]]  # прогрев
+            t0 = time.perf_counter()
+            found = [index.search(q, args.k) for q in q_red]
+            ms = (time.perf_counter() - t0) / len(q_red) * 1000
+
+            recall = np.mean([len(truth[i] & {j for j, _ in res}) / args.k for i, res in enumerate(found)])
+            nbytes = index.nbytes()
+            base_bytes = base_bytes or nbytes
+            print(f"{dtype:>8} {dim or full_dim:>5} {nbytes / 1e6:>8.1f} {base_bytes / nbytes:>6.1f}x {ms:>9.3f} {recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
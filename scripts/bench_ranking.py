@@ -0,0 +1,78 @@
+"""
+Микро-бенчмарк гибридного ранжирования: старый путь (sklearn cosine_similarity
+на float64 + полный argsort) против app/services/ranking.py.
+
+    python -m scripts.bench_ranking [--dim 384] [--k 30]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.ranking import DEFAULT_PROFILE, RankProfile, rank
+from app.services.vectors import l2_normalize
+
+
+def _legacy_normalize(arr: np.ndarray) -> np.ndarray:
+    arr_min = float(arr.min())
+    arr_max = float(arr.max())
+    if arr_max - arr_min < 1e-8:
+        return np.full_like(arr, 0.5, dtype=float)
+    return (arr - arr_min) / (arr_max - arr_min)
+
+
+def legacy_rank(query, corpus, weights, recency, k, profile=DEFAULT_PROFILE):
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    sims = cosine_similarity(query, corpus)[0]
+    scores = (
+        profile.alpha * _legacy_normalize(np.asarray(sims, dtype=float))
+        + profile.beta * _legacy_normalize(np.asarray(weights, dtype=float))
+        + profile.gamma * _legacy_normalize(np.asarray(recency, dtype=float))
+    )
+    return scores.argsort()[::-1][:k]
+
+
+def _timeit(fn, repeat: int) -> float:
+    fn()  # прогрев
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=30)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[300, 10_000, 100_000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    profiles = (DEFAULT_PROFILE, RankProfile(0.5, 0.2, 0.3), RankProfile(0.9, 0.05, 0.05))
+
+    print(f"{'N':>8} {'legacy ms':>10} {'engine ms':>10} {'speedup':>8} {'batched 4q x 3p ms':>19} {'same top-k':>10}")
+    for n in args.sizes:
+        corpus = l2_normalize(rng.normal(size=(n, args.dim)))
+        query = l2_normalize(rng.normal(size=(1, args.dim)))
+        queries = l2_normalize(rng.normal(size=(4, args.dim)))
+        weights = rng.random(n).astype(np.float32)
+        recency = 1.7e9 + rng.random(n) * 1e7
+        repeat = max(3, int(2e6 / n))
+
+        try:
+            legacy_ms = _timeit(lambda: legacy_rank(query, corpus, weights, recency, args.k), repeat)
+            same = set(legacy_rank(query, corpus, weights, recency, args.k).tolist()) == set(
+                rank(query, corpus, weights, recency, k=args.k)[0, 0].tolist()
+            )
+        except ImportError:
+            legacy_ms, same = float("nan"), None
+
+        engine_ms = _timeit(lambda: rank(query, corpus, weights, recency, k=args.k), repeat)
+        batched_ms = _timeit(lambda: rank(queries, corpus, weights, recency, k=args.k, profiles=profiles), repeat)
+
+        print(f"{n:>8} {legacy_ms:>10.3f} {engine_ms:>10.3f} {legacy_ms / engine_ms:>7.1f}x {batched_ms:>19.3f} {str(same):>10}")
+
+
+if __name__ == "__main__":
+    main()
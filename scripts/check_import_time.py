@@ -0,0 +1,82 @@
+"""
+Бюджет времени импорта (python -X importtime) для точек входа.
+
+    python -m scripts.check_import_time            # проверка, exit 1 при превышении
+    python -m scripts.check_import_time --top 15   # + самые тяжёлые модули
+
+Каждый модуль импортируется в отдельном свежем интерпретаторе. Кроме времени
+проверяется, что тяжёлые зависимости (torch, sentence_transformers, sklearn,
+langchain_ollama) не подтягиваются на импорте — они должны грузиться лениво
+(get_embedding_model / get_chat_model) или через явный prewarm.
+"""
+import argparse
+import subprocess
+import sys
+
+# модуль -> бюджет, мс (с запасом под холодный кэш диска)
+BUDGETS_MS = {
+    "app.models.model": 800,          # init_db.py
+    "app.repository.repo": 900,
+    "app.llm.client": 300,
+    "app.llm.embedding": 400,
+    "app.services.service_db": 1200,  # backfill_embeddings.py и оффлайн-скрипты
+}
+
+FORBIDDEN = ("torch", "sentence_transformers", "sklearn", "langchain_ollama", "transformers")
+
+
+def measure(module: str) -> tuple[float, list[tuple[float, str]]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+
+    rows: list[tuple[float, str]] = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        try:
+            rows.append((int(cumulative.strip()) / 1000, name.strip()))
+        except ValueError:
+            continue  # заголовок
+
+    total = next((ms for ms, name in rows if name == module), 0.0)
+    return total, rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=0)
+    parser.add_argument("modules", nargs="*", default=list(BUDGETS_MS))
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        budget = BUDGETS_MS.get(module)
+        try:
+            total, rows = measure(module)
+        except RuntimeError as e:
+            print(f"ERROR {e}")
+            failed = True
+            continue
+
+        heavy = sorted({name.split(".")[0] for _, name in rows if name.split(".")[0] in FORBIDDEN})
+        over = budget is not None and total > budget
+        status = "FAIL" if over or heavy else "ok"
+        failed = failed or status == "FAIL"
+
+        print(f"{status:>4} {module:<28} {total:8.1f} ms  (budget {budget if budget is not None else '-'} ms)")
+        if heavy:
+            print(f"     eager heavy imports: {', '.join(heavy)}")
+        for ms, name in sorted(rows, reverse=True)[1: args.top + 1]:
+            print(f"     {ms:8.1f} ms  {name}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())